@@ -1,18 +1,31 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.middleware import setup_error_handlers
 from src.config import Settings
 from src.routes import health_router,workspace_router,operations_router,prompt_router
+from src.services.singleton import llm_service
 
 
 settings = Settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Own the lifetime of process-wide clients"""
+    llm_service.health.start()
+    yield
+    await llm_service.close()
+
+
 app = FastAPI(
     title=settings.app_name,
     description="A Model Context Protocol server for filesystem operations",
     version=settings.app_version,
-    debug=settings.debug
+    debug=settings.debug,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
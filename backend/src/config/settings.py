@@ -25,17 +25,67 @@ class Settings(BaseSettings):
         ".txt", ".md", ".py", ".js", ".html", ".css", ".json", 
         ".xml", ".yaml", ".yml", ".csv", ".log", ".pdf", ".doc", ".docx"
     ]
+    max_concurrent_operations: int = 16  # File operations run in parallel per worker
+    workspace_registry_path: str = ""  # Defaults to <workspaces_dir>/.registry.sqlite3
+    listing_cache_size: int = 1024  # Directories whose listings are cached
+    tree_walk_concurrency: int = 8  # Directories scanned in parallel by /tree
+    upload_chunk_size: int = 1024 * 1024  # 1MB
+    upload_concurrency: int = 8  # Files written in parallel per upload
+    max_read_bytes: int = 1024 * 1024  # Largest body returned inline by the read operation
+    fsync_writes: bool = True  # Flush writes to disk before reporting success
+    search_index_max_bytes: int = 256 * 1024 * 1024  # Memory for search indexes; least recently searched workspaces are evicted
+    search_index_max_file_size: int = 256 * 1024  # Larger files are scanned on every search instead of indexed
+    search_max_file_size: int = 1024 * 1024  # Larger files are not searched
+    search_index_max_age: float = 30.0  # seconds before an index is checked for other workers' writes
+    search_max_results: int = 50  # Matching lines returned when no limit is given
     
     
     together_api_key: str = ""
+    llm_provider: str = "together"  # together, openai (any OpenAI-compatible server) or stub
+    llm_base_url: str = ""  # Required for openai; overrides the Together endpoint otherwise
+    llm_api_key: str = ""  # For the openai provider; falls back to OPENAI_API_KEY
+    llm_stub_response: str = ""  # Completion returned by the stub provider
     llm_model: str = "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free" 
-    llm_temperature: float = 0.7
+    llm_small_model: str = ""  # Tried first for short prompts; empty disables routing
+    llm_small_model_max_chars: int = 200  # Longer prompts go straight to llm_model
+    llm_escalation_confidence: float = 0.7  # Small model answers below this are retried on llm_model
+    llm_temperature: float = 0.0
     llm_max_tokens: int = 512
     llm_timeout: int = 30
+    llm_response_format: str = "json_schema"  # json_schema, json_object or text
+    llm_max_concurrency: int = 32  # In-flight LLM calls per worker
+    llm_keepalive_connections: int = 20
+    llm_keepalive_expiry: float = 60.0  # seconds
+    llm_context_token_budget: int = 1024  # Workspace summary sent with each prompt; 0 disables it
+    llm_context_snippet_lines: int = 2  # Leading lines of each file included in the summary
+    llm_context_cache_size: int = 256  # Workspaces whose summary is cached
+    llm_context_ttl: int = 60  # seconds
+    llm_deadline: float = 45.0  # seconds; overall limit for a prompt, retries included
+    llm_max_attempts: int = 3
+    llm_retry_backoff: float = 0.25  # seconds; base of the jittered exponential backoff
+    llm_retry_budget_ratio: float = 0.2  # Retries and hedges allowed per request, averaged over all requests
+    llm_breaker_failure_ratio: float = 0.5  # Failure rate that opens the circuit
+    llm_breaker_min_calls: int = 10  # Calls seen before the circuit may open
+    llm_breaker_window: int = 50  # Recent calls the failure rate is measured over
+    llm_breaker_open_seconds: float = 30.0  # Time calls fail fast before a trial call
+    llm_hedge_enabled: bool = False  # Send a second request when the first is slower than usual
+    llm_hedge_percentile: float = 0.95  # Latency percentile after which a hedge is sent
+    llm_hedge_min_delay: float = 1.0  # seconds
+    llm_health_interval: float = 60.0  # seconds between background probes when there is no traffic
+    llm_health_probe_timeout: float = 5.0  # seconds
+    
+    # Prompt result cache (only used when llm_temperature is 0)
+    prompt_cache_enabled: bool = True
+    prompt_cache_max_entries: int = 1024
+    prompt_cache_ttl: int = 3600  # seconds
+    prompt_batch_max_items: int = 500  # Prompts accepted by one /prompt/batch request
+    prompt_batch_concurrency: int = 16  # Prompts of a batch processed at once
+    prompt_rules_enabled: bool = True  # Parse trivial prompts ("delete a.txt") without the LLM
     
     # Security settings
     max_workspace_size: int = 1024 * 1024 * 1024  # 1GB
     max_files_per_workspace: int = 1000
+    usage_reconcile_interval: int = 300  # seconds between re-measuring a workspace from disk
     
     class Config:
         env_file = ".env"
@@ -9,6 +9,7 @@ from .workspace import (
     WorkspaceUploadResponse
 )
 from .prompt import (
+    PromptBatchRequest,
     PromptRequest,
     PromptResponse
 )
@@ -24,6 +25,7 @@ __all__ = [
     "FileOperationType",
     "WorkspaceInfo",
     "WorkspaceUploadResponse",
+    "PromptBatchRequest",
     "PromptRequest",
     "PromptResponse",
     "FileInfo",
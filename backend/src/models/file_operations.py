@@ -11,14 +11,24 @@ class FileOperationType(str, Enum):
     APPEND = "append"
     RENAME = "rename"
     LIST = "list"
+    READ = "read"
+    PATCH = "patch"
+    SEARCH = "search"
 
 
 class FileOperation(BaseModel):
     """Represents a file operation command"""
     operation: FileOperationType
-    path: str = Field(..., description="File path relative to workspace")
-    content: Optional[str] = Field(None, description="File content for create/edit/append operations")
+    path: str = Field(..., description="File path relative to workspace, or the directory to search under")
+    content: Optional[str] = Field(None, description="File content for create/edit/append, or the unified diff or replacement lines for patch")
     new_path: Optional[str] = Field(None, description="New path for rename operations")
+    offset: Optional[int] = Field(None, ge=0, description="First byte to return for read operations")
+    length: Optional[int] = Field(None, ge=0, description="Maximum number of bytes to return for read operations")
+    start_line: Optional[int] = Field(None, ge=1, description="First line (1-based) replaced by a line-range patch")
+    end_line: Optional[int] = Field(None, ge=0, description="Last line replaced by a line-range patch; start_line - 1 inserts")
+    expected: Optional[str] = Field(None, description="Current text of the lines a line-range patch replaces; the patch fails if they differ")
+    query: Optional[str] = Field(None, description="Text to look for in search operations")
+    overwrite: bool = Field(True, description="Whether a create replaces an existing file; if false, the file is left unchanged")
     
     @validator('path')
     def validate_path(cls, v):
@@ -41,6 +51,7 @@ class FileOperationRequest(BaseModel):
     """Request for file operations"""
     workspace_id: str
     operations: List[FileOperation]
+    atomic: bool = Field(False, description="Apply all operations or, if any fails, none of them")
 
 
 class FileOperationResponse(BaseModel):
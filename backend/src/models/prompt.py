@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Any, Dict, List, Optional
 from .file_operations import FileOperation
 
 
@@ -9,6 +9,12 @@ class PromptRequest(BaseModel):
     prompt: str = Field(..., min_length=1, max_length=10000)
 
 
+class PromptBatchRequest(BaseModel):
+    """Many prompts, possibly for different workspaces, processed in one request"""
+    prompts: List[PromptRequest] = Field(..., min_length=1)
+    concurrency: Optional[int] = Field(None, ge=1)  # Capped at the server's prompt_batch_concurrency
+
+
 class PromptResponse(BaseModel):
     """Response from prompt processing"""
     success: bool
@@ -18,4 +24,7 @@ class PromptResponse(BaseModel):
     reasoning: str  # AI reasoning about the prompt
     method: str  
     file_path: str = ""  
-    success_message: str = ""  # Human-readable success message 
\ No newline at end of file
+    success_message: str = ""  # Human-readable success message
+    file_contents: Dict[str, str] = {}  # Text returned by read operations, keyed by path
+    search_results: List[Dict[str, Any]] = []  # Path, line, column and snippet of search matches
+    partial: bool = False  # LLM output was malformed; only the operations recovered from it ran 
\ No newline at end of file
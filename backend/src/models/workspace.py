@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import List, Dict, Any
 
 
 class WorkspaceInfo(BaseModel):
@@ -8,6 +9,7 @@ class WorkspaceInfo(BaseModel):
     path: str
     file_count: int
     created_at: str
+    total_bytes: int = 0
 
 
 class WorkspaceUploadResponse(BaseModel):
@@ -15,4 +17,5 @@ class WorkspaceUploadResponse(BaseModel):
     workspace_id: str
     message: str
     file_count: int
-    workspace_path: str 
\ No newline at end of file
+    workspace_path: str
+    files: List[Dict[str, Any]] = []  # Per-file path, size and outcome 
\ No newline at end of file
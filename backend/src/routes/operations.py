@@ -1,17 +1,24 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 
 from ..models import FileOperationRequest, FileOperationResponse
 from ..services import FileSystemService
+from ..services.singleton import get_file_system_service
 
 router = APIRouter(prefix="/operations", tags=["Operations"])
 
-# Initialize service
-file_system_service = FileSystemService()
-
 
 @router.post("/", response_model=FileOperationResponse)
-async def execute_file_operations(request: FileOperationRequest):
-    """Execute file operations"""
+async def execute_file_operations(
+    request: FileOperationRequest,
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
+    """
+    Execute a batch of file operations directly, without going through the LLM
+    
+    Operations on unrelated paths run concurrently; operations on the same
+    path (or a parent/child of it) run in the order given. With atomic set,
+    a failure in any operation rolls back the whole batch.
+    """
     try:
         # Validate workspace exists
         workspace_info = file_system_service.get_workspace_info(request.workspace_id)
@@ -21,19 +28,26 @@ async def execute_file_operations(request: FileOperationRequest):
         # Execute operations
         results = await file_system_service.execute_operations(
             request.workspace_id, 
-            request.operations
+            request.operations,
+            atomic=request.atomic
         )
         
         # Check for errors
-        errors = [r["message"] for r in results if not r["success"]]
+        errors = [r["message"] for r in results if not r["success"] and not r.get("rolled_back")]
         success = len(errors) == 0
         
         return FileOperationResponse(
             success=success,
-            message=f"Executed {len(request.operations)} operations",
+            message=(
+                f"Rolled back {len(request.operations)} operations"
+                if any(r.get("rolled_back") for r in results)
+                else f"Executed {len(request.operations)} operations"
+            ),
             results=results,
             errors=errors
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to execute operations: {str(e)}") 
\ No newline at end of file
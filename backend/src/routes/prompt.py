@@ -1,10 +1,17 @@
 from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any
+from fastapi.responses import StreamingResponse
+from collections import defaultdict
+from typing import Dict, Any, List
+import asyncio
+import json
+import time
 import logging
 
-from ..models.prompt import PromptRequest, PromptResponse
-from ..services.prompt_processor import PromptProcessor
-from ..services.singleton import file_system_service
+from ..models import FileOperation, FileOperationType
+from ..models.prompt import PromptBatchRequest, PromptRequest, PromptResponse
+from ..services import FileSystemService, PromptProcessor
+from ..services.operation_scheduler import OperationScheduler
+from ..services.singleton import get_file_system_service, get_prompt_processor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -12,183 +19,510 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/prompt", tags=["prompt"])
 
-def get_prompt_processor():
-    return PromptProcessor()
+def _outcome(
+    executed: List[str] = None,
+    errors: List[str] = None,
+    files: List[str] = None,
+    contents: Dict[str, str] = None,
+    matches: List[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    return {
+        "executed": executed or [],
+        "errors": errors or [],
+        "files": files or [],
+        "contents": contents or {},
+        "matches": matches or []
+    }
+
+
+def _is_wildcard(target: str) -> bool:
+    return target == "*" or target == "all" or "all files" in target.lower()
+
+
+async def _delete_all_files(
+    file_system_service: FileSystemService,
+    scheduler: OperationScheduler,
+    workspace_id: str
+) -> Dict[str, List[str]]:
+    """Delete every top-level file, after all previously scheduled operations"""
+    # Acts as a barrier so the listing reflects earlier operations in the batch
+    await scheduler.drain()
+    
+    files_result = await file_system_service.list_files(workspace_id)
+    if not files_result["success"]:
+        return _outcome(errors=["Failed to list files for deletion"])
+    
+    tasks = [
+        scheduler.submit(FileOperation(operation=FileOperationType.DELETE, path=file_info["path"]))
+        for file_info in files_result["files"]
+        if not file_info["is_directory"]  # Only delete files, not directories
+    ]
+    results = await asyncio.gather(*tasks)
+    deleted_count = len([r for r in results if r["success"]])
+    errors_count = len(results) - deleted_count
+    
+    outcome = _outcome()
+    if deleted_count > 0:
+        outcome["executed"].append(f"Deleted {deleted_count} files from workspace")
+    if errors_count > 0:
+        outcome["errors"].append(f"Failed to delete {errors_count} files")
+    return outcome
+
+
+async def _describe_result(
+    file_system_service: FileSystemService,
+    workspace_id: str,
+    op_type: str,
+    target: str,
+    new_name: str,
+    task: asyncio.Task
+) -> Dict[str, List[str]]:
+    """Turn a file operation result into the messages reported to the client"""
+    op_result = await task
+    workspace_path = file_system_service.get_workspace_path(workspace_id)
+    
+    if op_type == "create":
+        if op_result.get("unchanged"):
+            return _outcome(executed=[f"File already exists, left unchanged: {target}"])
+        if op_result["success"]:
+            return _outcome(executed=[f"Created file: {target}"], files=[str((workspace_path / target).absolute())])
+        return _outcome(errors=[f"Failed to create file: {target}"])
+    
+    if op_type == "edit":
+        if op_result["success"]:
+            return _outcome(executed=[f"Edited file: {target}"], files=[str((workspace_path / target).absolute())])
+        return _outcome(errors=[f"Failed to edit file: {target}"])
+    
+    if op_type == "patch":
+        if op_result["success"]:
+            return _outcome(executed=[f"Patched file: {target}"], files=[str((workspace_path / target).absolute())])
+        return _outcome(errors=[f"Failed to patch file {target}: {op_result['message']}"])
+    
+    if op_type == "delete":
+        if op_result["success"]:
+            return _outcome(executed=[f"Deleted file: {target}"])
+        return _outcome(errors=[f"Failed to delete file: {target}"])
+    
+    if op_type == "rename":
+        if op_result["success"]:
+            return _outcome(executed=[f"Renamed {target} to {new_name}"], files=[str((workspace_path / new_name).absolute())])
+        return _outcome(errors=[f"Failed to rename {target} to {new_name}"])
+    
+    if op_type == "list":
+        if op_result["success"]:
+            return _outcome(executed=[f"Listed {len(op_result['files'])} files in workspace"])
+        return _outcome(errors=[f"Failed to list files: {op_result['message']}"])
+    
+    if op_type == "search":
+        if op_result["success"]:
+            matched_files = len({match["path"] for match in op_result["matches"]})
+            return _outcome(
+                executed=[f"Searched for '{op_result['query']}': {len(op_result['matches'])} matches in {matched_files} files"],
+                matches=op_result["matches"]
+            )
+        return _outcome(errors=[f"Failed to search: {op_result['message']}"])
+    
+    if op_type == "read":
+        if op_result["success"]:
+            note = " (truncated)" if op_result["truncated"] else ""
+            return _outcome(executed=[f"Read file: {target}{note}"], contents={target: op_result["content"]})
+        return _outcome(errors=[f"Failed to read file: {target}"])
+    
+    return _outcome()
+
+
+async def _schedule_llm_operation(
+    file_system_service: FileSystemService,
+    scheduler: OperationScheduler,
+    workspace_id: str,
+    operation: Dict[str, Any]
+) -> "asyncio.Future[Dict[str, List[str]]]":
+    """
+    Submit one operation parsed from the LLM response to the batch scheduler
+    
+    Returns:
+        Future resolving to a dictionary with "executed" messages, "errors"
+        the absolute "files" paths the operation created or changed, and the
+        "contents" of files it read or the search "matches" it found
+    """
+    completed = asyncio.get_running_loop().create_future()
+    op_type = operation.get("type")
+    target = operation.get("target") or ""
+    new_name = operation.get("new_name")
+    logger.info(f"Processing operation: {op_type} -> {target}")
+    
+    try:
+        if op_type == "delete" and _is_wildcard(target):
+            outcome = await _delete_all_files(file_system_service, scheduler, workspace_id)
+            completed.set_result(outcome)
+            return completed
+        
+        if op_type == "create":
+            file_operation = FileOperation(
+                operation=FileOperationType.CREATE,
+                path=target,
+                content=operation.get("content", ""),
+                overwrite=operation.get("overwrite", True) is not False
+            )
+        elif op_type == "edit":
+            file_operation = FileOperation(operation=FileOperationType.EDIT, path=target, content=operation.get("content", ""))
+        elif op_type == "patch":
+            # The LLM can't see line numbers, so a line range is only
+            # trusted together with the text it is meant to replace
+            if operation.get("start_line") is not None and operation.get("expected") is None:
+                completed.set_result(_outcome(errors=[f"Line-range patch without the expected text of those lines: {target}"]))
+                return completed
+            file_operation = FileOperation(
+                operation=FileOperationType.PATCH,
+                path=target,
+                content=operation.get("content", ""),
+                start_line=operation.get("start_line"),
+                end_line=operation.get("end_line"),
+                expected=operation.get("expected")
+            )
+        elif op_type == "delete":
+            file_operation = FileOperation(operation=FileOperationType.DELETE, path=target)
+        elif op_type == "rename":
+            if not new_name:
+                completed.set_result(_outcome(errors=[f"Missing new name for rename operation: {target}"]))
+                return completed
+            file_operation = FileOperation(operation=FileOperationType.RENAME, path=target, new_path=new_name)
+        elif op_type == "list":
+            file_operation = FileOperation(operation=FileOperationType.LIST, path=".")
+        elif op_type == "search":
+            file_operation = FileOperation(
+                operation=FileOperationType.SEARCH,
+                path=target if target and not _is_wildcard(target) else ".",
+                query=operation.get("query") or operation.get("content") or ""
+            )
+        elif op_type == "read":
+            file_operation = FileOperation(operation=FileOperationType.READ, path=target)
+        else:
+            completed.set_result(_outcome())
+            return completed
+    except Exception as e:
+        logger.error(f"Error executing operation {operation}: {str(e)}")
+        completed.set_result(_outcome(errors=[f"Error executing operation {operation}: {str(e)}"]))
+        return completed
+    
+    task = scheduler.submit(file_operation)
+    return asyncio.ensure_future(
+        _describe_result(file_system_service, workspace_id, op_type, target, new_name, task)
+    )
+
+
+def _build_prompt_response(
+    result: Dict[str, Any],
+    executed_operations: List[str],
+    errors: List[str],
+    created_files: List[str],
+    file_contents: Dict[str, str] = None,
+    search_results: List[Dict[str, Any]] = None
+) -> PromptResponse:
+    """Summarise executed operations into the API response"""
+    # Create success message and file path
+    file_path = created_files[0] if created_files else ""
+    success_message = ""
+    
+    # Count different types of operations
+    create_count = len([op for op in executed_operations if "Created" in op])
+    edit_count = len([op for op in executed_operations if "Edited" in op or "Patched" in op])
+    delete_count = len([op for op in executed_operations if "Deleted" in op])
+    rename_count = len([op for op in executed_operations if "Renamed" in op])
+    list_count = len([op for op in executed_operations if "Listed" in op])
+    read_count = len([op for op in executed_operations if op.startswith("Read file")])
+    search_count = len([op for op in executed_operations if op.startswith("Searched")])
+    
+    if len(errors) == 0:
+        if create_count > 0:
+            if create_count == 1:
+                success_message = f"✅ Successfully created file: {file_path}"
+            else:
+                success_message = f"✅ Successfully created {create_count} files"
+        elif edit_count > 0:
+            success_message = f"✅ Successfully edited {edit_count} file(s)"
+        elif delete_count > 0:
+            success_message = f"✅ Successfully deleted {delete_count} file(s)"
+        elif rename_count > 0:
+            success_message = f"✅ Successfully renamed {rename_count} file(s)"
+        elif list_count > 0:
+            success_message = "✅ Files listed successfully"
+        elif read_count > 0:
+            success_message = f"✅ Successfully read {read_count} file(s)"
+        elif search_count > 0:
+            success_message = f"✅ Found {len(search_results or [])} matching line(s)"
+        else:
+            success_message = "✅ Operation completed successfully"
+    else:
+        if create_count > 0 or edit_count > 0 or delete_count > 0 or rename_count > 0:
+            success_message = f"⚠️ Operation partially completed with {len(errors)} errors"
+        else:
+            success_message = f"❌ Operation failed with {len(errors)} errors"
+    
+    partial = bool(result.get("partial"))
+    if partial and len(errors) == 0:
+        success_message = (
+            f"⚠️ {success_message.removeprefix('✅ ')} "
+            "(the LLM response was incomplete; some requested operations may be missing)"
+        )
+    
+    response_data = {
+        "success": len(errors) == 0,
+        "operations": executed_operations,
+        "errors": errors,
+        "confidence": result.get("confidence", 0.0),
+        "reasoning": result.get("reasoning", ""),
+        "method": result.get("method", "unknown"),
+        "file_path": file_path,
+        "success_message": success_message,
+        "file_contents": file_contents or {},
+        "search_results": search_results or [],
+        "partial": partial
+    }
+    
+    logger.info(f"Response data: {response_data}")
+    
+    return PromptResponse(**response_data)
+
+
+def _resolve_workspace(file_system_service: FileSystemService, workspace_id: str):
+    """Return the workspace path, or raise 404 if the workspace is unknown"""
+    workspace_info = file_system_service.get_workspace_info(workspace_id)
+    if not workspace_info:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    
+    workspace_path = file_system_service.get_workspace_path(workspace_id)
+    logger.info(f"Workspace path: {workspace_path}")
+    return workspace_path
+
+
+async def _run_prompt(
+    request: PromptRequest,
+    prompt_processor: PromptProcessor,
+    file_system_service: FileSystemService
+) -> PromptResponse:
+    """
+    Process one prompt and execute its operations
+    
+    Raises:
+        HTTPException: Unknown workspace (404) or LLM unavailable (503)
+    """
+    logger.info(f"Processing prompt: {request.prompt} for workspace: {request.workspace_id}")
+    
+    workspace_path = _resolve_workspace(file_system_service, request.workspace_id)
+    
+    # Prompts handled by rules never need the workspace summary
+    result = await prompt_processor.process_prompt(
+        request.prompt,
+        workspace_path,
+        load_summary=lambda: file_system_service.workspace_snapshot(request.workspace_id)
+    )
+    logger.info(f"LLM result: {result}")
+    
+    if result.get("method") == "none" or result.get("error"):
+        raise HTTPException(
+            status_code=503, 
+            detail=f"LLM service unavailable: {result.get('error', 'Unknown error')}"
+        )
+    
+    executed_operations = []
+    errors = []
+    created_files = []
+    file_contents = {}
+    search_results = []
+    
+    # One fsync for all the prompt's writes, made before the response
+    async with file_system_service.grouped_commit(request.workspace_id) as scheduler:
+        pending = [
+            await _schedule_llm_operation(file_system_service, scheduler, request.workspace_id, operation)
+            for operation in result.get("operations", [])
+        ]
+        outcomes = await asyncio.gather(*pending)
+    for outcome in outcomes:
+        executed_operations.extend(outcome["executed"])
+        errors.extend(outcome["errors"])
+        created_files.extend(outcome["files"])
+        file_contents.update(outcome["contents"])
+        search_results.extend(outcome["matches"])
+    
+    return _build_prompt_response(
+        result, executed_operations, errors, created_files, file_contents, search_results
+    )
+
 
 @router.post("/process", response_model=PromptResponse)
 async def process_prompt(
     request: PromptRequest,
-    prompt_processor: PromptProcessor = Depends(get_prompt_processor)
+    prompt_processor: PromptProcessor = Depends(get_prompt_processor),
+    file_system_service: FileSystemService = Depends(get_file_system_service)
 ):
     """
     Process a natural language prompt and execute file operations using LLM
     """
     try:
-        logger.info(f"Processing prompt: {request.prompt} for workspace: {request.workspace_id}")
-        
-        workspace_info = file_system_service.get_workspace_info(request.workspace_id)
-        if not workspace_info:
-            raise HTTPException(status_code=404, detail="Workspace not found")
-        
-        workspace_path = file_system_service.get_workspace_path(request.workspace_id)
-        logger.info(f"Workspace path: {workspace_path}")
-        
-        result = await prompt_processor.process_prompt(request.prompt, workspace_path)
-        logger.info(f"LLM result: {result}")
-        
-        if result.get("method") == "none" or result.get("error"):
-            raise HTTPException(
-                status_code=503, 
-                detail=f"LLM service unavailable: {result.get('error', 'Unknown error')}"
-            )
-        
+        return await _run_prompt(request, prompt_processor, file_system_service)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing prompt: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing prompt: {str(e)}")
+
+@router.post("/process/stream")
+async def process_prompt_stream(
+    request: PromptRequest,
+    prompt_processor: PromptProcessor = Depends(get_prompt_processor),
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
+    """
+    Process a prompt and stream results as NDJSON
+    
+    Each operation is executed as soon as the LLM finishes emitting it and
+    reported as an {"event": "operation"} line; the stream ends with an
+    {"event": "done"} line carrying the usual PromptResponse, or an
+    {"event": "error"} line if the LLM call failed.
+    """
+    logger.info(f"Streaming prompt: {request.prompt} for workspace: {request.workspace_id}")
+    workspace_path = _resolve_workspace(file_system_service, request.workspace_id)
+    
+    async def event_stream():
         executed_operations = []
         errors = []
         created_files = []
+        file_contents = {}
+        search_results = []
+        events: asyncio.Queue = asyncio.Queue()
+        
+        def report(operation: Dict[str, Any], future: asyncio.Future):
+            events.put_nowait({"event": "operation", "operation": operation, "outcome": future.result()})
         
-        for operation in result.get("operations", []):
+        async def produce():
+            # Operations are scheduled as they parse; their results are
+            # reported in completion order while the LLM keeps streaming,
+            # and the done line follows the prompt's one group commit
+            pending = []
+            result = None
             try:
-                op_type = operation.get("type")
-                target = operation.get("target")
-                logger.info(f"Processing operation: {op_type} -> {target}")
-                
-                if op_type == "create":
-                    content = operation.get("content", "")
-                    op_result = await file_system_service.create_file(request.workspace_id, target, content)
-                    if op_result["success"]:
-                        executed_operations.append(f"Created file: {target}")
-                        # Get the full path of the created file
-                        full_path = file_system_service.get_workspace_path(request.workspace_id) / target
-                        created_files.append(str(full_path.absolute()))
-                    else:
-                        errors.append(f"Failed to create file: {target}")
-                
-                elif op_type == "edit":
-                    content = operation.get("content", "")
-                    op_result = await file_system_service.edit_file(request.workspace_id, target, content)
-                    if op_result["success"]:
-                        executed_operations.append(f"Edited file: {target}")
-                        # Get the full path of the edited file
-                        full_path = file_system_service.get_workspace_path(request.workspace_id) / target
-                        created_files.append(str(full_path.absolute()))
-                    else:
-                        errors.append(f"Failed to edit file: {target}")
-                
-                elif op_type == "delete":
-                    # Handle wildcard delete (delete all files in workspace)
-                    if target == "*" or target == "all" or "all files" in target.lower():
-                        # Delete all files in the workspace
-                        workspace_path = file_system_service.get_workspace_path(request.workspace_id)
-                        deleted_count = 0
-                        errors_count = 0
-                        
-                        try:
-                            # List all files in workspace
-                            files_result = await file_system_service.list_files(request.workspace_id)
-                            if files_result["success"]:
-                                for file_info in files_result["files"]:
-                                    if not file_info["is_directory"]:  # Only delete files, not directories
-                                        op_result = await file_system_service.delete_file(request.workspace_id, file_info["path"])
-                                        if op_result["success"]:
-                                            deleted_count += 1
-                                        else:
-                                            errors_count += 1
-                                
-                                if deleted_count > 0:
-                                    executed_operations.append(f"Deleted {deleted_count} files from workspace")
-                                if errors_count > 0:
-                                    errors.append(f"Failed to delete {errors_count} files")
-                            else:
-                                errors.append("Failed to list files for deletion")
-                        except Exception as e:
-                            logger.error(f"Error deleting all files: {str(e)}")
-                            errors.append(f"Error deleting all files: {str(e)}")
-                    else:
-                        # Delete specific file
-                        op_result = await file_system_service.delete_file(request.workspace_id, target)
-                        if op_result["success"]:
-                            executed_operations.append(f"Deleted file: {target}")
+                async with file_system_service.grouped_commit(request.workspace_id) as scheduler:
+                    operations = prompt_processor.stream_operations(
+                        request.prompt,
+                        workspace_path,
+                        load_summary=lambda: file_system_service.workspace_snapshot(request.workspace_id)
+                    )
+                    async for event in operations:
+                        if event["event"] == "operation":
+                            future = await _schedule_llm_operation(
+                                file_system_service, scheduler, request.workspace_id, event["operation"]
+                            )
+                            future.add_done_callback(lambda f, operation=event["operation"]: report(operation, f))
+                            pending.append(future)
                         else:
-                            errors.append(f"Failed to delete file: {target}")
-                
-                elif op_type == "rename":
-                    new_name = operation.get("new_name")
-                    if new_name:
-                        op_result = await file_system_service.rename_file(request.workspace_id, target, new_name)
-                        if op_result["success"]:
-                            executed_operations.append(f"Renamed {target} to {new_name}")
-                            # Get the full path of the renamed file
-                            full_path = file_system_service.get_workspace_path(request.workspace_id) / new_name
-                            created_files.append(str(full_path.absolute()))
-                        else:
-                            errors.append(f"Failed to rename {target} to {new_name}")
-                    else:
-                        errors.append(f"Missing new name for rename operation: {target}")
-                
-                elif op_type == "list":
-                    files_result = await file_system_service.list_files(request.workspace_id)
-                    if files_result["success"]:
-                        executed_operations.append(f"Listed {len(files_result['files'])} files in workspace")
-                    else:
-                        errors.append(f"Failed to list files: {files_result['message']}")
-                        
+                            result = event["result"]
+                    await asyncio.gather(*pending)
             except Exception as e:
-                logger.error(f"Error executing operation {operation}: {str(e)}")
-                errors.append(f"Error executing operation {operation}: {str(e)}")
-        
-        # Create success message and file path
-        file_path = created_files[0] if created_files else ""
-        success_message = ""
+                logger.error(f"Error streaming prompt: {str(e)}")
+                result = {"method": "none", "error": str(e)}
+            events.put_nowait({"event": "result", "result": result or {}})
         
-        # Count different types of operations
-        create_count = len([op for op in executed_operations if "Created" in op])
-        edit_count = len([op for op in executed_operations if "Edited" in op])
-        delete_count = len([op for op in executed_operations if "Deleted" in op])
-        rename_count = len([op for op in executed_operations if "Renamed" in op])
-        list_count = len([op for op in executed_operations if "Listed" in op])
-        
-        if len(errors) == 0:
-            if create_count > 0:
-                if create_count == 1:
-                    success_message = f"✅ Successfully created file: {file_path}"
-                else:
-                    success_message = f"✅ Successfully created {create_count} files"
-            elif edit_count > 0:
-                success_message = f"✅ Successfully edited {edit_count} file(s)"
-            elif delete_count > 0:
-                success_message = f"✅ Successfully deleted {delete_count} file(s)"
-            elif rename_count > 0:
-                success_message = f"✅ Successfully renamed {rename_count} file(s)"
-            elif list_count > 0:
-                success_message = "✅ Files listed successfully"
-            else:
-                success_message = "✅ Operation completed successfully"
-        else:
-            if create_count > 0 or edit_count > 0 or delete_count > 0 or rename_count > 0:
-                success_message = f"⚠️ Operation partially completed with {len(errors)} errors"
-            else:
-                success_message = f"❌ Operation failed with {len(errors)} errors"
-        
-        response_data = {
-            "success": len(errors) == 0,
-            "operations": executed_operations,
-            "errors": errors,
-            "confidence": result.get("confidence", 0.0),
-            "reasoning": result.get("reasoning", ""),
-            "method": result.get("method", "unknown"),
-            "file_path": file_path,
-            "success_message": success_message
-        }
-        
-        logger.info(f"Response data: {response_data}")
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                event = await events.get()
+                if event["event"] == "operation":
+                    outcome = event["outcome"]
+                    executed_operations.extend(outcome["executed"])
+                    errors.extend(outcome["errors"])
+                    created_files.extend(outcome["files"])
+                    file_contents.update(outcome["contents"])
+                    search_results.extend(outcome["matches"])
+                    yield json.dumps({"event": "operation", "operation": event["operation"], **outcome}) + "\n"
+                    continue
+                
+                result = event["result"]
+                if result.get("method") == "none" or (result.get("error") and not executed_operations and not errors):
+                    yield json.dumps({
+                        "event": "error",
+                        "error": f"LLM service unavailable: {result.get('error', 'Unknown error')}"
+                    }) + "\n"
+                    return
+                
+                if result.get("error"):
+                    errors.append(f"LLM stream ended early: {result['error']}")
+                response = _build_prompt_response(
+                    result, executed_operations, errors, created_files, file_contents, search_results
+                )
+                yield json.dumps({"event": "done", **response.dict()}) + "\n"
+                return
+        finally:
+            if not producer.done():
+                producer.cancel()
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+@router.post("/batch")
+async def process_prompt_batch(
+    batch: PromptBatchRequest,
+    prompt_processor: PromptProcessor = Depends(get_prompt_processor),
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
+    """
+    Process many prompts and stream each result as NDJSON when it finishes
+    
+    Prompts run concurrently up to the batch concurrency. Prompts for the
+    same workspace run one after another, in the order given, so each sees
+    the files left by the one before. Every prompt produces one line,
+    {"event": "result", "index": ...} with the usual PromptResponse or
+    {"event": "error", "index": ..., "status_code", "error"}, in completion
+    order; the stream ends with an {"event": "done"} summary line.
+    """
+    settings = prompt_processor.settings
+    if len(batch.prompts) > settings.prompt_batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large: {len(batch.prompts)} prompts (maximum {settings.prompt_batch_max_items})"
+        )
+    concurrency = min(batch.concurrency or settings.prompt_batch_concurrency, settings.prompt_batch_concurrency)
+    logger.info(f"Processing batch of {len(batch.prompts)} prompts with concurrency {concurrency}")
+    
+    async def event_stream():
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(concurrency)
+        workspace_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
         
-        return PromptResponse(**response_data)
+        async def run(index: int, request: PromptRequest) -> Dict[str, Any]:
+            item = {"index": index, "workspace_id": request.workspace_id}
+            # Locks are FIFO and tasks start in index order, which keeps each
+            # workspace's prompts in submission order
+            async with workspace_locks[request.workspace_id], semaphore:
+                try:
+                    response = await _run_prompt(request, prompt_processor, file_system_service)
+                    return {"event": "result", **item, **response.dict()}
+                except HTTPException as e:
+                    return {"event": "error", **item, "status_code": e.status_code, "error": e.detail}
+                except Exception as e:
+                    logger.error(f"Error processing batch prompt {index}: {str(e)}")
+                    return {"event": "error", **item, "status_code": 500, "error": f"Error processing prompt: {str(e)}"}
         
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error processing prompt: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing prompt: {str(e)}")
+        tasks = [asyncio.ensure_future(run(index, request)) for index, request in enumerate(batch.prompts)]
+        succeeded = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                if item["event"] == "result" and item["success"]:
+                    succeeded += 1
+                yield json.dumps(item) + "\n"
+            yield json.dumps({
+                "event": "done",
+                "total": len(tasks),
+                "succeeded": succeeded,
+                "failed": len(tasks) - succeeded,
+                "took_ms": round((time.perf_counter() - started) * 1000, 2)
+            }) + "\n"
+        finally:
+            # Client went away: stop the prompts that haven't finished
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
 
 @router.get("/health")
 async def prompt_health(
@@ -196,18 +530,26 @@ async def prompt_health(
 ):
     """
     Check if the LLM service is healthy
+    
+    Reports the status kept by the background health monitor, so polling
+    this endpoint never calls the provider.
     """
     try:
-        llm_available = await prompt_processor.is_llm_available()
+        llm_health = prompt_processor.llm_health()
+        llm_available = llm_health["available"]
         return {
             "status": "healthy" if llm_available else "unhealthy",
             "llm_available": llm_available,
-            "method": "llm_only"
+            "method": "rules_then_llm" if prompt_processor.settings.prompt_rules_enabled else "llm_only",
+            "llm": llm_health,
+            "cache": prompt_processor.cache_stats(),
+            "resilience": prompt_processor.resilience_stats(),
+            "routing": prompt_processor.routing_stats()
         }
     except Exception as e:
         return {
             "status": "unhealthy",
             "error": str(e),
             "llm_available": False,
-            "method": "llm_only"
+            "method": "rules_then_llm" if prompt_processor.settings.prompt_rules_enabled else "llm_only"
         }
\ No newline at end of file
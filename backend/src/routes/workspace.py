@@ -1,10 +1,17 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-import shutil
-from typing import List
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+import asyncio
+import json
+import tarfile
+import zipfile
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 
 from ..models import WorkspaceUploadResponse, WorkspaceInfo
-from ..services.singleton import file_system_service
+from ..services import FileSystemService
+from ..services.quota import QuotaExceededError
+from ..services.singleton import get_file_system_service
+from ..services.upload_stream import MultipartUploadStream
 
 router = APIRouter(prefix="/workspace", tags=["Workspace"])
 
@@ -12,10 +19,13 @@ class CreateWorkspaceRequest(BaseModel):
     name: str
 
 @router.post("/create", response_model=dict)
-async def create_workspace(request: CreateWorkspaceRequest):
+async def create_workspace(
+    request: CreateWorkspaceRequest,
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
     """Create a new empty workspace"""
     try:
-        workspace_info = file_system_service.create_workspace(request.name)
+        workspace_info = await file_system_service.create_workspace(request.name)
         return {
             "workspace_id": workspace_info.workspace_id,
             "message": f"Workspace '{request.name}' created successfully"
@@ -23,69 +33,305 @@ async def create_workspace(request: CreateWorkspaceRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create workspace: {str(e)}")
 
-@router.post("/upload", response_model=WorkspaceUploadResponse)
+# Boundaries and part headers; generous, since the check only exists to
+# refuse hopeless uploads before reading them
+_MULTIPART_OVERHEAD_PER_FILE = 1024
+
+# The body is parsed by the route itself, so describe it for the docs
+_UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                        "workspace_name": {"type": "string"}
+                    },
+                    "required": ["files", "workspace_name"]
+                }
+            }
+        }
+    }
+}
+
+@router.post("/upload", response_model=WorkspaceUploadResponse, openapi_extra=_UPLOAD_REQUEST_BODY)
 async def upload_workspace(
-    files: List[UploadFile] = File(...),
-    workspace_name: str = Form(...)
+    request: Request,
+    file_system_service: FileSystemService = Depends(get_file_system_service)
 ):
-    """Upload a folder to create a new workspace"""
+    """
+    Upload a folder to create a new workspace
+    
+    The multipart body is parsed as it arrives and every file is written
+    while it streams in, instead of the whole body being spooled first. An
+    upload whose Content-Length already exceeds the workspace limits is
+    refused before anything is read; otherwise it is cut off (413) as soon
+    as it crosses them.
+    """
+    settings = file_system_service.settings
+    max_body_size = settings.max_workspace_size + settings.max_files_per_workspace * _MULTIPART_OVERHEAD_PER_FILE
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_body_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Upload of {content_length} bytes exceeds the workspace size limit of {settings.max_workspace_size} bytes"
+        )
+    
     try:
-        workspace_info = file_system_service.create_workspace(workspace_name)
+        # Named once the workspace_name field has been read, which may
+        # come after the files
+        workspace_info = await file_system_service.create_workspace("")
         workspace_path = file_system_service.get_workspace_path(workspace_info.workspace_id)
-        file_count = 0
-        for uploaded_file in files:
-            if uploaded_file.filename:
-                file_path = workspace_path / uploaded_file.filename
-                file_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(file_path, "wb") as buffer:
-                    shutil.copyfileobj(uploaded_file.file, buffer)
-                file_count += 1
+        form = MultipartUploadStream(request.headers, request.stream())
+        try:
+            results = await file_system_service.save_uploads(workspace_info.workspace_id, form.uploads())
+        except QuotaExceededError as e:
+            await file_system_service.delete_workspace(workspace_info.workspace_id)
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            await file_system_service.delete_workspace(workspace_info.workspace_id)
+            raise HTTPException(status_code=400, detail=str(e))
+        except BaseException:
+            await asyncio.shield(file_system_service.delete_workspace(workspace_info.workspace_id))
+            raise
+        
+        workspace_name = form.fields.get("workspace_name")
+        if not workspace_name or not results:
+            await file_system_service.delete_workspace(workspace_info.workspace_id)
+            raise HTTPException(status_code=422, detail="workspace_name and at least one file are required")
+        
+        workspace_info.name = workspace_name
+        file_count = len([r for r in results if r["success"]])
+        rejected_count = len(results) - file_count
         workspace_info.file_count = file_count
-        file_system_service.workspaces[workspace_info.workspace_id] = workspace_info
+        workspace_info.total_bytes = sum(r["size"] for r in results if r["success"])
+        await file_system_service.save_workspace_info(workspace_info)
+        message = f"Workspace '{workspace_name}' created with {file_count} files"
+        if rejected_count:
+            message += f" ({rejected_count} rejected)"
         return WorkspaceUploadResponse(
             workspace_id=workspace_info.workspace_id,
-            message=f"Workspace '{workspace_name}' created with {file_count} files",
+            message=message,
             file_count=file_count,
-            workspace_path=str(workspace_path)
+            workspace_path=str(workspace_path),
+            files=results
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload workspace: {str(e)}")
 
-@router.get("/{workspace_id}", response_model=WorkspaceInfo)
-def get_workspace_info(workspace_id: str):
-    """Get information about a workspace"""
+@router.post("/import", response_model=WorkspaceUploadResponse)
+async def import_workspace_archive(
+    archive: UploadFile = File(..., description="A .zip, .tar.gz, .tgz or .tar archive"),
+    workspace_name: str = Form(...),
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
+    """Create a new workspace from an archive"""
+    try:
+        workspace_info = await file_system_service.create_workspace(workspace_name)
+        workspace_path = file_system_service.get_workspace_path(workspace_info.workspace_id)
+        try:
+            results = await file_system_service.import_archive(
+                workspace_info.workspace_id, archive.file, archive.filename or ""
+            )
+        except QuotaExceededError as e:
+            await file_system_service.delete_workspace(workspace_info.workspace_id)
+            raise HTTPException(status_code=413, detail=str(e))
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            await file_system_service.delete_workspace(workspace_info.workspace_id)
+            raise HTTPException(status_code=400, detail=f"Invalid archive: {str(e)}")
+        
+        file_count = len([r for r in results if r["success"]])
+        rejected_count = len(results) - file_count
+        workspace_info.file_count = file_count
+        workspace_info.total_bytes = sum(r["size"] for r in results if r["success"])
+        await file_system_service.save_workspace_info(workspace_info)
+        message = f"Workspace '{workspace_name}' imported with {file_count} files"
+        if rejected_count:
+            message += f" ({rejected_count} rejected)"
+        return WorkspaceUploadResponse(
+            workspace_id=workspace_info.workspace_id,
+            message=message,
+            file_count=file_count,
+            workspace_path=str(workspace_path),
+            files=results
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to import workspace: {str(e)}")
+
+@router.get("/{workspace_id}/export")
+def export_workspace_archive(
+    workspace_id: str,
+    format: Literal["zip", "tar.gz"] = "zip",
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
+    """Download a workspace as a streamed zip or tar.gz archive"""
     workspace_info = file_system_service.get_workspace_info(workspace_id)
+    if not workspace_info:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    try:
+        chunks = file_system_service.export_archive(workspace_id, format)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    media_type = "application/zip" if format == "zip" else "application/gzip"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{workspace_id}.{format}"'}
+    )
+
+@router.get("/{workspace_id}", response_model=WorkspaceInfo)
+async def get_workspace_info(
+    workspace_id: str,
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
+    """Get information about a workspace, including its current file count and size"""
+    workspace_info = await file_system_service.get_workspace_usage(workspace_id)
     if not workspace_info:
         raise HTTPException(status_code=404, detail="Workspace not found")
     return workspace_info
 
 @router.get("/{workspace_id}/files")
-async def list_workspace_files(workspace_id: str, path: str = ""):
-    """List files in a workspace directory"""
+async def list_workspace_files(
+    workspace_id: str,
+    path: str = "",
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit to list everything"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    sort: Literal["name", "size", "mtime"] = "name",
+    order: Literal["asc", "desc"] = "asc",
+    fields: Literal["full", "name"] = "full",
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
+    """List files in a workspace directory, optionally one page at a time"""
     try:
-        result = await file_system_service.list_files(workspace_id, path)
+        if limit is None and cursor is None and sort == "name" and order == "asc" and fields == "full":
+            result = await file_system_service.list_files(workspace_id, path)
+        else:
+            result = await file_system_service.list_files_page(
+                workspace_id,
+                path,
+                limit=limit,
+                cursor=cursor,
+                sort_by=sort,
+                descending=order == "desc",
+                fields=fields
+            )
         if not result["success"]:
             raise HTTPException(status_code=400, detail=result["message"])
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list files: {str(e)}")
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against the current ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+@router.get("/{workspace_id}/files/content")
+async def read_workspace_file(
+    workspace_id: str,
+    request: Request,
+    path: str = Query(..., description="File path relative to the workspace"),
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
+    """
+    Download a file from a workspace
+    
+    Supports HTTP Range requests (including multiple ranges and If-Range)
+    and conditional requests via ETag/If-None-Match. The body is streamed
+    from disk by FileResponse, which hands the path to the server for
+    zero-copy sendfile when the server supports the ASGI pathsend extension.
+    """
+    if not file_system_service.get_workspace_info(workspace_id):
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    try:
+        full_path, file_stat = file_system_service.stat_file(workspace_id, path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    etag = file_system_service.file_etag(file_stat)
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return FileResponse(
+        full_path,
+        stat_result=file_stat,
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+@router.get("/{workspace_id}/search")
+async def search_workspace(
+    workspace_id: str,
+    q: str = Query(..., min_length=1, description="Text to look for, matched case-insensitively"),
+    path: str = Query("", description="Only search under this directory"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum matching lines to return"),
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
+    """Search the contents of a workspace's files"""
+    if not file_system_service.get_workspace_info(workspace_id):
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    result = await file_system_service.search_files(workspace_id, q, path, limit)
+    if not result["success"]:
+        raise HTTPException(status_code=400, detail=result["message"])
+    return result
+
+@router.get("/{workspace_id}/tree")
+def walk_workspace_tree(
+    workspace_id: str,
+    path: str = "",
+    max_depth: Optional[int] = Query(None, ge=1, description="1 lists only the directory itself"),
+    include: List[str] = Query([], description="Glob patterns an entry must match to be returned"),
+    exclude: List[str] = Query([], description="Glob patterns to skip; matching directories are not descended"),
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
+    """Recursively list a workspace directory, streamed as NDJSON"""
+    if not file_system_service.get_workspace_info(workspace_id):
+        raise HTTPException(status_code=404, detail="Workspace not found")
+    try:
+        entries = file_system_service.walk_files(workspace_id, path, max_depth, include, exclude)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def ndjson():
+        async for entry in entries:
+            yield json.dumps(entry) + "\n"
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 @router.delete("/{workspace_id}")
-def delete_workspace(workspace_id: str):
+async def delete_workspace(
+    workspace_id: str,
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
     """Delete a workspace and all its files"""
     try:
         workspace_info = file_system_service.get_workspace_info(workspace_id)
         if not workspace_info:
             raise HTTPException(status_code=404, detail="Workspace not found")
-        workspace_path = file_system_service.get_workspace_path(workspace_id)
-        if workspace_path.exists():
-            shutil.rmtree(workspace_path)
-        del file_system_service.workspaces[workspace_id]
+        await file_system_service.delete_workspace(workspace_id)
         return {"message": f"Workspace {workspace_id} deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete workspace: {str(e)}")
 
 @router.get("/", response_model=List[WorkspaceInfo])
-def list_workspaces():
+def list_workspaces(
+    file_system_service: FileSystemService = Depends(get_file_system_service)
+):
     """List all workspaces"""
     return list(file_system_service.workspaces.values()) 
\ No newline at end of file
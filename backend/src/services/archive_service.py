@@ -0,0 +1,242 @@
+import os
+import stat
+import asyncio
+import logging
+import tarfile
+import zipfile
+import threading
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .quota import UploadQuota
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = ("zip", "tar.gz")
+
+
+class ArchiveMemberRejected(Exception):
+    """A single archive member failed validation and was skipped"""
+
+
+class _ExportCancelled(Exception):
+    """The consumer of an export stream went away"""
+
+
+def detect_format(filename: str, source: BinaryIO) -> str:
+    """Work out whether an uploaded archive is a zip or a tarball"""
+    lowered = (filename or "").lower()
+    if lowered.endswith(".zip"):
+        return "zip"
+    if lowered.endswith((".tar.gz", ".tgz", ".tar")):
+        return "tar"
+    if zipfile.is_zipfile(source):
+        source.seek(0)
+        return "zip"
+    source.seek(0)
+    return "tar"
+
+
+def _iter_members(source: BinaryIO, archive_format: str) -> Iterator[Tuple[str, int, Optional[BinaryIO]]]:
+    """
+    Yield (name, declared size, reader) for each member, in archive order
+
+    reader is None for anything that isn't a regular file (directories,
+    symlinks, devices), which callers skip.
+    """
+    if archive_format == "zip":
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                mode = info.external_attr >> 16
+                if info.is_dir() or stat.S_ISLNK(mode):
+                    yield info.filename, 0, None
+                    continue
+                with archive.open(info) as reader:
+                    yield info.filename, info.file_size, reader
+    else:
+        # Stream mode reads members sequentially without seeking
+        with tarfile.open(fileobj=source, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile():
+                    yield member.name, 0, None
+                    continue
+                yield member.name, member.size, archive.extractfile(member)
+
+
+def extract_archive(
+    source: BinaryIO,
+    archive_format: str,
+    resolve_target: Callable[[str], Path],
+    quota: UploadQuota,
+    max_file_size: int,
+    chunk_size: int = 1024 * 1024
+) -> List[Dict[str, Any]]:
+    """
+    Stream-extract an archive member by member
+
+    resolve_target maps a member name to its destination, raising
+    ArchiveMemberRejected for unsafe or disallowed names. Sizes are counted
+    from the bytes actually decompressed, not the archive headers, so a
+    lying or oversized member is cut off as soon as it crosses the limit.
+
+    Raises:
+        QuotaExceededError: The workspace limits were reached
+    """
+    results = []
+    for name, declared_size, reader in _iter_members(source, archive_format):
+        if reader is None:
+            continue
+        try:
+            target = resolve_target(name)
+            if declared_size > max_file_size:
+                raise ArchiveMemberRejected(f"File exceeds the {max_file_size} byte limit")
+        except ArchiveMemberRejected as e:
+            results.append({"path": name, "success": False, "size": 0, "message": str(e)})
+            continue
+
+        quota.reserve_file()
+        written = 0
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(target, "wb") as destination:
+                while chunk := reader.read(chunk_size):
+                    if written + len(chunk) > max_file_size:
+                        raise ArchiveMemberRejected(f"File exceeds the {max_file_size} byte limit")
+                    quota.consume(len(chunk))
+                    written += len(chunk)
+                    destination.write(chunk)
+        except ArchiveMemberRejected as e:
+            target.unlink(missing_ok=True)
+            quota.release_file(written)
+            results.append({"path": name, "success": False, "size": 0, "message": str(e)})
+            continue
+        except BaseException:
+            target.unlink(missing_ok=True)
+            raise
+
+        results.append({"path": name, "success": True, "size": written, "message": "Extracted"})
+    return results
+
+
+class _ChunkWriter:
+    """
+    Write-only, unseekable file object that hands fixed-size chunks to an
+    asyncio queue from a worker thread
+
+    Deliberately has no tell()/seek(), so zipfile switches to streaming mode
+    (data descriptors) instead of seeking back to patch headers.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        chunks: asyncio.Queue,
+        slots: threading.Semaphore,
+        cancelled: threading.Event,
+        chunk_size: int
+    ):
+        self._loop = loop
+        self._chunks = chunks
+        self._slots = slots
+        self._cancelled = cancelled
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self._chunk_size:
+            self.put(bytes(self._buffer[:self._chunk_size]))
+            del self._buffer[:self._chunk_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def finish(self):
+        if self._buffer:
+            self.put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def put(self, item):
+        # A free slot is needed per queued chunk, so the writer blocks while
+        # the consumer is behind, which bounds memory use
+        while not self._slots.acquire(timeout=0.5):
+            if self._cancelled.is_set():
+                raise _ExportCancelled()
+        if self._cancelled.is_set():
+            raise _ExportCancelled()
+        try:
+            self._loop.call_soon_threadsafe(self._chunks.put_nowait, item)
+        except RuntimeError:
+            # Event loop already closed
+            raise _ExportCancelled()
+
+
+def _iter_files(root: Path) -> Iterator[Tuple[Path, str]]:
+    """Regular files under root with their archive names; symlinks are skipped"""
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = Path(directory) / filename
+            if path.is_symlink() or not path.is_file():
+                continue
+            yield path, path.relative_to(root).as_posix()
+
+
+def _write_archive(root: Path, archive_format: str, writer: _ChunkWriter):
+    if archive_format == "zip":
+        with zipfile.ZipFile(writer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for path, arcname in _iter_files(root):
+                archive.write(path, arcname)
+    else:
+        with tarfile.open(fileobj=writer, mode="w|gz") as archive:
+            for path, arcname in _iter_files(root):
+                archive.add(path, arcname, recursive=False)
+    writer.finish()
+
+
+async def stream_archive(root: Path, archive_format: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """
+    Yield a zip or tar.gz of root as it is being written
+
+    The archive is produced in a worker thread and handed over through an
+    asyncio queue limited to a few chunks, so memory use doesn't depend on
+    the workspace size. Only the writer occupies a thread; waiting for
+    chunks does not. Closing the generator early stops the worker within
+    half a second.
+    """
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unsupported archive format: {archive_format}")
+
+    done = object()
+    chunks: asyncio.Queue = asyncio.Queue()
+    slots = threading.Semaphore(8)
+    cancelled = threading.Event()
+    writer = _ChunkWriter(asyncio.get_running_loop(), chunks, slots, cancelled, chunk_size)
+
+    def produce():
+        try:
+            _write_archive(root, archive_format, writer)
+            writer.put(done)
+        except _ExportCancelled:
+            pass
+        except Exception as e:
+            logger.error(f"Archive export of {root} failed: {e}")
+            try:
+                writer.put(e)
+            except _ExportCancelled:
+                pass
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while True:
+            item = await chunks.get()
+            slots.release()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        await producer
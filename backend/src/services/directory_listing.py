@@ -0,0 +1,256 @@
+import os
+import json
+import stat
+import heapq
+import base64
+import asyncio
+import fnmatch
+import logging
+from datetime import datetime
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ListingEntry(NamedTuple):
+    """One directory entry, captured with a single stat call"""
+    name: str
+    is_directory: bool
+    size: Optional[int]
+    mtime: float
+    modified_at: str
+    is_symlink: bool = False
+
+
+def iter_directory(path: Path) -> Iterator[ListingEntry]:
+    """Yield the entries of a directory with one stat per entry"""
+    with os.scandir(path) as iterator:
+        for entry in iterator:
+            try:
+                entry_stat = entry.stat()
+            except OSError:
+                # Broken symlink or entry removed mid-scan
+                continue
+            is_directory = stat.S_ISDIR(entry_stat.st_mode)
+            yield ListingEntry(
+                name=entry.name,
+                is_directory=is_directory,
+                size=None if is_directory else entry_stat.st_size,
+                mtime=entry_stat.st_mtime,
+                modified_at=datetime.fromtimestamp(entry_stat.st_mtime).isoformat(),
+                is_symlink=entry.is_symlink()
+            )
+
+
+def scan_directory(path: Path) -> Tuple[int, List[ListingEntry]]:
+    """
+    Read a whole directory
+
+    Returns the directory's own mtime (ns) alongside its entries so callers
+    can tell later whether the listing is still current.
+    """
+    dir_mtime = os.stat(path).st_mtime_ns
+    return dir_mtime, list(iter_directory(path))
+
+
+# Every key ends with the name, which is unique within a directory, so the
+# ordering is total and a cursor identifies exactly one position
+SORT_KEYS: Dict[str, Callable[[ListingEntry], Tuple]] = {
+    "name": lambda entry: (entry.name,),
+    "size": lambda entry: (entry.size if entry.size is not None else -1, entry.name),
+    "mtime": lambda entry: (entry.mtime, entry.name),
+}
+
+
+def encode_cursor(sort_by: str, descending: bool, key: Tuple) -> str:
+    """Opaque cursor pointing just past the given sort key"""
+    payload = json.dumps({"s": sort_by, "d": descending, "k": list(key)})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort_by: str, descending: bool) -> Tuple:
+    """Return the sort key stored in a cursor, checking it matches the request"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        key = tuple(payload["k"])
+        matches = payload["s"] == sort_by and payload["d"] == descending
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not matches:
+        raise ValueError("Cursor was issued for a different sort order")
+    return key
+
+
+def select_page(
+    entries: Iterable[ListingEntry],
+    limit: Optional[int],
+    sort_by: str = "name",
+    descending: bool = False,
+    after: Optional[Tuple] = None
+) -> Tuple[List[ListingEntry], Optional[Tuple]]:
+    """
+    Pick one page of entries in sort order
+
+    Uses a bounded heap, so memory is O(limit) however many entries the
+    iterable yields. Returns the page and the key to resume after, or None
+    when this is the last page.
+    """
+    sort_key = SORT_KEYS[sort_by]
+    if after is not None:
+        if descending:
+            entries = (entry for entry in entries if sort_key(entry) < after)
+        else:
+            entries = (entry for entry in entries if sort_key(entry) > after)
+
+    if limit is None:
+        return sorted(entries, key=sort_key, reverse=descending), None
+
+    select = heapq.nlargest if descending else heapq.nsmallest
+    page = select(limit + 1, entries, key=sort_key)
+    if len(page) <= limit:
+        return page, None
+    page = page[:limit]
+    return page, sort_key(page[-1])
+
+
+class DirectoryListingCache:
+    """
+    Per-directory listing cache
+
+    An entry is reused while the directory's mtime is unchanged. Writes made
+    through FileSystemService invalidate explicitly, which also covers file
+    size changes that don't touch the directory mtime. Scans run in a worker
+    thread so large directories don't block the event loop.
+    """
+
+    def __init__(self, max_directories: int = 1024):
+        self.max_directories = max_directories
+        self._entries: "OrderedDict[Path, Tuple[int, List[ListingEntry]]]" = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def peek(self, path: Path) -> Optional[List[ListingEntry]]:
+        """Return the cached entries if they are still current, without scanning"""
+        cached = self._entries.get(path)
+        if cached is None:
+            return None
+        try:
+            current_mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        if current_mtime != cached[0]:
+            return None
+        self._entries.move_to_end(path)
+        self.hits += 1
+        return cached[1]
+
+    async def list(self, path: Path) -> List[ListingEntry]:
+        """Return the entries of a directory, scanning only when stale"""
+        cached = self.peek(path)
+        if cached is not None:
+            return cached
+
+        self.misses += 1
+        generation = self._generation
+        dir_mtime, entries = await asyncio.to_thread(scan_directory, path)
+        # Skip storing if a write invalidated anything while we were scanning
+        if generation == self._generation and self.max_directories > 0:
+            self._entries[path] = (dir_mtime, entries)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_directories:
+                self._entries.popitem(last=False)
+        return entries
+
+    def invalidate(self, path: Path):
+        """Forget a single directory"""
+        self._generation += 1
+        self._entries.pop(path, None)
+
+    def invalidate_tree(self, path: Path):
+        """Forget a directory and everything cached beneath it"""
+        self._generation += 1
+        for cached_path in [p for p in self._entries if p == path or path in p.parents]:
+            del self._entries[cached_path]
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring"""
+        return {"directories": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def _matches(patterns: List[str], relative_path: str, name: str) -> bool:
+    return any(
+        fnmatch.fnmatchcase(relative_path, pattern) or fnmatch.fnmatchcase(name, pattern)
+        for pattern in patterns
+    )
+
+
+async def walk_tree(
+    root: Path,
+    root_relative: str = "",
+    max_depth: Optional[int] = None,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    concurrency: int = 8,
+    buffer_size: int = 1024
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Recursively walk a directory, yielding entries as they are found
+
+    Directories are scanned concurrently in worker threads. Results pass
+    through a bounded queue, so a slow consumer applies backpressure and the
+    tree is never held in memory as a whole. Patterns are shell globs matched
+    against the workspace-relative path or the bare name; excluded
+    directories are not descended into, and include only filters what is
+    yielded. Symlinked directories are reported but not followed.
+    """
+    include = include or []
+    exclude = exclude or []
+    done = object()
+    directories: asyncio.Queue = asyncio.Queue()
+    output: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+    directories.put_nowait((root, root_relative, 1))
+
+    async def worker():
+        while True:
+            directory, relative_dir, depth = await directories.get()
+            try:
+                entries = await asyncio.to_thread(lambda: list(iter_directory(directory)))
+                prefix = f"{relative_dir}/" if relative_dir else ""
+                for entry in entries:
+                    relative_path = prefix + entry.name
+                    if exclude and _matches(exclude, relative_path, entry.name):
+                        continue
+                    if not include or _matches(include, relative_path, entry.name):
+                        await output.put({
+                            "name": entry.name,
+                            "path": relative_path,
+                            "is_directory": entry.is_directory,
+                            "size": entry.size,
+                            "modified_at": entry.modified_at,
+                            "depth": depth
+                        })
+                    if entry.is_directory and not entry.is_symlink and (max_depth is None or depth < max_depth):
+                        directories.put_nowait((directory / entry.name, relative_path, depth + 1))
+            except OSError as e:
+                logger.warning(f"Skipping unreadable directory {directory}: {e}")
+            finally:
+                directories.task_done()
+
+    async def finish():
+        await directories.join()
+        await output.put(done)
+
+    tasks = [asyncio.ensure_future(worker()) for _ in range(max(1, concurrency))]
+    tasks.append(asyncio.ensure_future(finish()))
+    try:
+        while True:
+            item = await output.get()
+            if item is done:
+                break
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
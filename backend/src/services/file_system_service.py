@@ -1,32 +1,89 @@
 import os
+import stat
+import time
 import shutil
+import asyncio
 import aiofiles
 import uuid
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from ..models import FileOperation, FileInfo, WorkspaceInfo, FileOperationType
+from typing import List, Dict, Any, AsyncIterable, AsyncIterator, Iterable, Optional, Tuple, Union
+from ..config import Settings
+from ..models import FileOperation, WorkspaceInfo, FileOperationType
+from ..utils import sanitize_path, validate_file_extension
+from .quota import QuotaExceededError, UploadQuota
+from .archive_service import ArchiveMemberRejected, detect_format, extract_archive, stream_archive
+from .operation_scheduler import OperationScheduler
+from .patch_service import line_range_edit, parse_unified_diff, patch_to_temp
+from .transaction import Transaction, fsync_directory, write_atomic
+from .search_index import SearchIndexCache
+from .workspace_snapshot import SnapshotCache, build_snapshot
+from .workspace_registry import WorkspaceRegistry, measure_tree
+from .directory_listing import (
+    DirectoryListingCache,
+    ListingEntry,
+    iter_directory,
+    select_page,
+    encode_cursor,
+    decode_cursor,
+    walk_tree
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+
+async def _as_async_iterable(items: Union[Iterable[Any], AsyncIterable[Any]]) -> AsyncIterator[Any]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
 class FileSystemService:
     """Service for handling file system operations"""
     
-    def __init__(self, base_workspace_dir: str = "workspaces"):
+    def __init__(
+        self,
+        base_workspace_dir: str = "workspaces",
+        max_concurrent_operations: int = 16,
+        registry_path: Optional[str] = None,
+        listing_cache_size: int = 1024,
+        tree_walk_concurrency: int = 8,
+        settings: Optional[Settings] = None
+    ):
+        self.settings = settings or Settings()
         self.base_workspace_dir = Path(base_workspace_dir)
         self.base_workspace_dir.mkdir(exist_ok=True)
-        self.workspaces: Dict[str, WorkspaceInfo] = {}
+        # Persistent and shared between worker processes
+        self.workspaces = WorkspaceRegistry(
+            Path(registry_path) if registry_path else self.base_workspace_dir / ".registry.sqlite3",
+            self.base_workspace_dir
+        )
+        # Shared by every batch so concurrent requests can't oversubscribe the disk
+        self._operation_semaphore = asyncio.Semaphore(max_concurrent_operations)
+        self._listing_cache = DirectoryListingCache(listing_cache_size)
+        self.tree_walk_concurrency = tree_walk_concurrency
+        self._search_indexes = SearchIndexCache(
+            self.settings.search_index_max_bytes,
+            self.settings.search_max_file_size,
+            self.settings.search_index_max_file_size,
+            self.settings.search_index_max_age
+        )
+        self._snapshots = SnapshotCache(self.settings.llm_context_cache_size, self.settings.llm_context_ttl)
         logger.info(f"FileSystemService initialized with base directory: {self.base_workspace_dir.absolute()}")
     
     def get_workspace_path(self, workspace_id: str) -> Path:
         """Get the absolute path for a workspace"""
         workspace_path = self.base_workspace_dir / workspace_id
-        logger.info(f"Getting workspace path for {workspace_id}: {workspace_path.absolute()}")
+        logger.debug(f"Getting workspace path for {workspace_id}: {workspace_path.absolute()}")
         return workspace_path
     
-    def create_workspace(self, name: str) -> WorkspaceInfo:
+    async def create_workspace(self, name: str) -> WorkspaceInfo:
         """Create a new workspace"""
         workspace_id = str(uuid.uuid4())
         workspace_path = self.get_workspace_path(workspace_id)
@@ -41,14 +98,29 @@ class FileSystemService:
             created_at=datetime.now().isoformat()
         )
         
-        self.workspaces[workspace_id] = workspace_info
-        logger.info(f"Added workspace to memory: {workspace_id}")
+        await self.save_workspace_info(workspace_info)
+        logger.info(f"Added workspace to registry: {workspace_id}")
         return workspace_info
     
+    async def save_workspace_info(self, workspace_info: WorkspaceInfo):
+        """Record a workspace's information in the registry"""
+        await self.workspaces.write(self.workspaces.__setitem__, workspace_info.workspace_id, workspace_info)
+    
     def get_workspace_info(self, workspace_id: str) -> Optional[WorkspaceInfo]:
         """Get workspace information"""
         return self.workspaces.get(workspace_id)
     
+    async def delete_workspace(self, workspace_id: str):
+        """Delete a workspace's files and its registry entry"""
+        workspace_path = self.get_workspace_path(workspace_id)
+        if workspace_path.exists():
+            await asyncio.to_thread(shutil.rmtree, workspace_path)
+        # The caches belong to the event loop, so they are cleared here and
+        # not in the rmtree thread
+        self._drop_workspace_caches(workspace_id)
+        await self.workspaces.write(self.workspaces.pop, workspace_id, None)
+        logger.info(f"Deleted workspace: {workspace_id}")
+    
     def validate_workspace_path(self, workspace_id: str, file_path: str) -> Path:
         """Validate and return safe file path within workspace"""
         workspace_path = self.get_workspace_path(workspace_id)
@@ -62,19 +134,178 @@ class FileSystemService:
         
         return full_path
     
-    async def create_file(self, workspace_id: str, file_path: str, content: str) -> Dict[str, Any]:
-        """Create a new file"""
+    @staticmethod
+    def _file_size(full_path: Path) -> Optional[int]:
+        """Size of an existing regular file, or None"""
+        try:
+            return full_path.stat().st_size if full_path.is_file() else None
+        except OSError:
+            return None
+    
+    async def _claim_usage(self, workspace_id: str, bytes_delta: int, files_delta: int) -> bool:
+        """One reserve_usage attempt on the registry's writer thread"""
+        claim = asyncio.ensure_future(self.workspaces.write(
+            self.workspaces.reserve_usage, workspace_id, bytes_delta, files_delta,
+            self.settings.max_workspace_size, self.settings.max_files_per_workspace
+        ))
+        try:
+            return await asyncio.shield(claim)
+        except asyncio.CancelledError:
+            # The UPDATE still runs on the writer thread; hand back what it claimed
+            if await claim:
+                await self._release_usage(workspace_id, bytes_delta, files_delta)
+            raise
+    
+    async def _reserve_usage(self, workspace_id: str, bytes_delta: int, files_delta: int):
+        """
+        Claim quota for a write before making it
+        
+        Raises:
+            QuotaExceededError: The write would exceed max_workspace_size or
+                max_files_per_workspace
+        """
+        if await self._claim_usage(workspace_id, bytes_delta, files_delta):
+            return
+        
+        # No row updated: either over quota, or a workspace the registry has
+        # not adopted yet (looking it up rehydrates it)
+        workspace_info = await self.workspaces.write(self.get_workspace_info, workspace_id)
+        if workspace_info is None:
+            return
+        if await self._claim_usage(workspace_id, bytes_delta, files_delta):
+            return
+        max_files = self.settings.max_files_per_workspace
+        if files_delta > 0 and workspace_info.file_count + files_delta > max_files:
+            raise QuotaExceededError(f"Workspace file limit of {max_files} files exceeded")
+        raise QuotaExceededError(f"Workspace size limit of {self.settings.max_workspace_size} bytes exceeded")
+    
+    async def _release_usage(self, workspace_id: str, bytes_delta: int, files_delta: int):
+        """Undo a reservation, or record space freed by a delete"""
+        await self.workspaces.write(self.workspaces.adjust_usage, workspace_id, -bytes_delta, -files_delta)
+    
+    async def reconcile_usage(self, workspace_id: str):
+        """Re-measure a workspace's file count and size from disk"""
+        workspace_path = self.get_workspace_path(workspace_id)
+        file_count, total_bytes = await asyncio.to_thread(measure_tree, workspace_path)
+        await self.workspaces.write(self.workspaces.set_usage, workspace_id, total_bytes, file_count)
+        logger.info(f"Reconciled usage for {workspace_id}: {file_count} files, {total_bytes} bytes")
+    
+    async def get_workspace_usage(self, workspace_id: str) -> Optional[WorkspaceInfo]:
+        """
+        Workspace information with current file_count and total_bytes
+        
+        Usage comes from the ledger that every mutation updates, so this is a
+        single lookup; it is re-measured from disk at most once per
+        usage_reconcile_interval to correct drift from changes made outside
+        this service.
+        """
+        workspace_info = self.get_workspace_info(workspace_id)
+        if workspace_info is None:
+            return None
+        if time.time() - self.workspaces.reconciled_at(workspace_id) > self.settings.usage_reconcile_interval:
+            await self.reconcile_usage(workspace_id)
+            workspace_info = self.get_workspace_info(workspace_id)
+        return workspace_info
+    
+    def _invalidate_caches(self, workspace_id: str, full_path: Path, tree: bool = False):
+        """Drop cached listings made stale by a write to full_path and queue it for re-indexing"""
+        workspace_root = self.get_workspace_path(workspace_id).resolve()
+        self._search_indexes.mark_dirty(workspace_id, full_path.relative_to(workspace_root).as_posix())
+        self._snapshots.invalidate(workspace_id)
+        if tree:
+            self._listing_cache.invalidate_tree(full_path)
+        # Ancestors list the changed entry's size or their own subdirectory mtimes
+        for directory in full_path.parents:
+            self._listing_cache.invalidate(directory)
+            if directory == workspace_root:
+                break
+    
+    def _drop_workspace_caches(self, workspace_id: str):
+        """Forget everything cached about a workspace after a bulk change"""
+        self._listing_cache.invalidate_tree(self.get_workspace_path(workspace_id).resolve())
+        self._search_indexes.drop(workspace_id)
+        self._snapshots.invalidate(workspace_id)
+    
+    async def workspace_snapshot(self, workspace_id: str) -> str:
+        """
+        Compact summary of a workspace's files for the LLM prompt
+        
+        Lists paths and sizes, then the first lines of files, until
+        llm_context_token_budget is spent. The result is cached until the
+        workspace changes, and rebuilding it reuses the listing cache, so
+        only directories that changed are scanned again.
+        """
+        token_budget = self.settings.llm_context_token_budget
+        if token_budget <= 0:
+            return ""
+        
+        cached = self._snapshots.get(workspace_id)
+        if cached is not None:
+            return cached
+        
+        generation = self._snapshots.generation
+        snapshot = await build_snapshot(
+            self.get_workspace_path(workspace_id).resolve(),
+            self._listing_cache.list,
+            token_budget,
+            self.settings.llm_context_snippet_lines
+        )
+        self._snapshots.set(workspace_id, snapshot, generation)
+        return snapshot
+    
+    def begin_transaction(self) -> Transaction:
+        """Start an undo log for a batch of operations"""
+        return Transaction(self.base_workspace_dir / ".trash", durable=self.settings.fsync_writes)
+    
+    async def _write_file(self, full_path: Path, content: str, transaction: Optional[Transaction]):
+        """Replace a file atomically, fsyncing now or at transaction commit"""
+        durable = transaction is None and self.settings.fsync_writes
+        await asyncio.to_thread(write_atomic, full_path, content.encode('utf-8'), durable)
+        if transaction is not None:
+            transaction.mark_written(full_path)
+    
+    async def create_file(
+        self,
+        workspace_id: str,
+        file_path: str,
+        content: str,
+        transaction: Optional[Transaction] = None,
+        overwrite: bool = True
+    ) -> Dict[str, Any]:
+        """Create a new file; an existing one is replaced, or left alone if overwrite is False"""
         try:
             logger.info(f"Creating file: {file_path} in workspace: {workspace_id}")
             full_path = self.validate_workspace_path(workspace_id, file_path)
             logger.info(f"Full path for file: {full_path.absolute()}")
             
-            # Ensure parent directory exists
-            full_path.parent.mkdir(parents=True, exist_ok=True)
-            logger.info(f"Ensured parent directory exists: {full_path.parent.absolute()}")
+            old_size = self._file_size(full_path)
+            if old_size is not None and not overwrite:
+                return {
+                    "operation": "create",
+                    "path": file_path,
+                    "success": True,
+                    "unchanged": True,
+                    "message": f"File {file_path} already exists; left unchanged"
+                }
+            bytes_delta = len(content.encode('utf-8')) - (old_size or 0)
+            files_delta = 0 if old_size is not None else 1
+            await self._reserve_usage(workspace_id, bytes_delta, files_delta)
             
-            async with aiofiles.open(full_path, 'w', encoding='utf-8') as f:
-                await f.write(content)
+            try:
+                if transaction is not None:
+                    if old_size is None:
+                        transaction.record_create(full_path)
+                    else:
+                        transaction.record_overwrite(full_path)
+                # Ensure parent directory exists
+                full_path.parent.mkdir(parents=True, exist_ok=True)
+                logger.info(f"Ensured parent directory exists: {full_path.parent.absolute()}")
+                
+                await self._write_file(full_path, content, transaction)
+            except BaseException:
+                await self._release_usage(workspace_id, bytes_delta, files_delta)
+                raise
+            self._invalidate_caches(workspace_id, full_path)
             
             logger.info(f"File created successfully: {full_path.absolute()}")
             logger.info(f"File exists after creation: {full_path.exists()}")
@@ -94,7 +325,13 @@ class FileSystemService:
                 "message": f"Failed to create file: {str(e)}"
             }
     
-    async def edit_file(self, workspace_id: str, file_path: str, content: str) -> Dict[str, Any]:
+    async def edit_file(
+        self,
+        workspace_id: str,
+        file_path: str,
+        content: str,
+        transaction: Optional[Transaction] = None
+    ) -> Dict[str, Any]:
         """Edit an existing file"""
         try:
             full_path = self.validate_workspace_path(workspace_id, file_path)
@@ -107,8 +344,17 @@ class FileSystemService:
                     "message": f"File {file_path} does not exist"
                 }
             
-            async with aiofiles.open(full_path, 'w', encoding='utf-8') as f:
-                await f.write(content)
+            bytes_delta = len(content.encode('utf-8')) - (self._file_size(full_path) or 0)
+            await self._reserve_usage(workspace_id, bytes_delta, 0)
+            
+            try:
+                if transaction is not None:
+                    transaction.record_overwrite(full_path)
+                await self._write_file(full_path, content, transaction)
+            except BaseException:
+                await self._release_usage(workspace_id, bytes_delta, 0)
+                raise
+            self._invalidate_caches(workspace_id, full_path)
             
             return {
                 "operation": "edit",
@@ -124,7 +370,93 @@ class FileSystemService:
                 "message": f"Failed to edit file: {str(e)}"
             }
     
-    async def append_to_file(self, workspace_id: str, file_path: str, content: str) -> Dict[str, Any]:
+    async def patch_file(
+        self,
+        workspace_id: str,
+        file_path: str,
+        content: str,
+        start_line: Optional[int] = None,
+        end_line: Optional[int] = None,
+        transaction: Optional[Transaction] = None,
+        expected: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Apply a unified diff, or a line-range replacement, to an existing file
+        
+        Args:
+            workspace_id: Workspace containing the file
+            file_path: File path relative to the workspace
+            content: The unified diff, or the replacement lines when
+                start_line is given
+            start_line: First line (1-based) of a line-range replacement
+            end_line: Last line replaced, inclusive; defaults to start_line
+            expected: Current text of the replaced lines, checked before a
+                line-range replacement; diff hunks are always checked
+            
+        Returns:
+            Operation result; the file is left unchanged if any hunk fails
+        """
+        try:
+            full_path = self.validate_workspace_path(workspace_id, file_path)
+            
+            if not full_path.is_file():
+                return {
+                    "operation": "patch",
+                    "path": file_path,
+                    "success": False,
+                    "message": f"File {file_path} does not exist"
+                }
+            
+            if start_line is not None:
+                edits = [line_range_edit(start_line, end_line, content, expected)]
+            else:
+                edits = parse_unified_diff(content)
+            
+            # Streams through a temporary file, so memory use follows the
+            # size of the hunks rather than the file
+            old_size = full_path.stat().st_size
+            durable = transaction is None and self.settings.fsync_writes
+            temp_path = await asyncio.to_thread(patch_to_temp, full_path, edits, durable)
+            try:
+                bytes_delta = temp_path.stat().st_size - old_size
+                await self._reserve_usage(workspace_id, bytes_delta, 0)
+                try:
+                    if transaction is not None:
+                        transaction.record_overwrite(full_path)
+                    os.replace(temp_path, full_path)
+                except BaseException:
+                    await self._release_usage(workspace_id, bytes_delta, 0)
+                    raise
+            finally:
+                temp_path.unlink(missing_ok=True)
+            if transaction is not None:
+                transaction.mark_written(full_path)
+            elif durable:
+                await asyncio.to_thread(fsync_directory, full_path.parent)
+            self._invalidate_caches(workspace_id, full_path)
+            
+            return {
+                "operation": "patch",
+                "path": file_path,
+                "success": True,
+                "message": f"Patched file {file_path} ({len(edits)} hunk(s))",
+                "hunks": len(edits)
+            }
+        except Exception as e:
+            return {
+                "operation": "patch",
+                "path": file_path,
+                "success": False,
+                "message": f"Failed to patch file {file_path}: {str(e)}"
+            }
+    
+    async def append_to_file(
+        self,
+        workspace_id: str,
+        file_path: str,
+        content: str,
+        transaction: Optional[Transaction] = None
+    ) -> Dict[str, Any]:
         """Append content to an existing file"""
         try:
             full_path = self.validate_workspace_path(workspace_id, file_path)
@@ -137,8 +469,23 @@ class FileSystemService:
                     "message": f"File {file_path} does not exist"
                 }
             
-            async with aiofiles.open(full_path, 'a', encoding='utf-8') as f:
-                await f.write(content)
+            bytes_delta = len(content.encode('utf-8'))
+            await self._reserve_usage(workspace_id, bytes_delta, 0)
+            
+            try:
+                if transaction is not None:
+                    transaction.record_append(full_path)
+                async with aiofiles.open(full_path, 'a', encoding='utf-8') as f:
+                    await f.write(content)
+                    if transaction is None and self.settings.fsync_writes:
+                        await f.flush()
+                        await asyncio.to_thread(os.fsync, f.fileno())
+                if transaction is not None:
+                    transaction.mark_written(full_path)
+            except BaseException:
+                await self._release_usage(workspace_id, bytes_delta, 0)
+                raise
+            self._invalidate_caches(workspace_id, full_path)
             
             return {
                 "operation": "append",
@@ -154,7 +501,12 @@ class FileSystemService:
                 "message": f"Failed to append to file: {str(e)}"
             }
     
-    async def delete_file(self, workspace_id: str, file_path: str) -> Dict[str, Any]:
+    async def delete_file(
+        self,
+        workspace_id: str,
+        file_path: str,
+        transaction: Optional[Transaction] = None
+    ) -> Dict[str, Any]:
         """Delete a file or directory"""
         try:
             full_path = self.validate_workspace_path(workspace_id, file_path)
@@ -167,16 +519,27 @@ class FileSystemService:
                     "message": f"File {file_path} does not exist"
                 }
             
-            if full_path.is_file():
+            is_file = full_path.is_file()
+            if is_file:
+                freed_files, freed_bytes = 1, full_path.stat().st_size
+            else:
+                freed_files, freed_bytes = await asyncio.to_thread(measure_tree, full_path)
+            
+            if transaction is not None:
+                # Kept in the transaction's trash until commit
+                transaction.remove(full_path)
+            elif is_file:
                 full_path.unlink()
             else:
                 shutil.rmtree(full_path)
+            await self._release_usage(workspace_id, freed_bytes, freed_files)
+            self._invalidate_caches(workspace_id, full_path, tree=not is_file)
             
             return {
                 "operation": "delete",
                 "path": file_path,
                 "success": True,
-                "message": f"{'File' if full_path.is_file() else 'Directory'} {file_path} deleted successfully"
+                "message": f"{'File' if is_file else 'Directory'} {file_path} deleted successfully"
             }
         except Exception as e:
             return {
@@ -186,7 +549,13 @@ class FileSystemService:
                 "message": f"Failed to delete {file_path}: {str(e)}"
             }
     
-    async def rename_file(self, workspace_id: str, old_path: str, new_path: str) -> Dict[str, Any]:
+    async def rename_file(
+        self,
+        workspace_id: str,
+        old_path: str,
+        new_path: str,
+        transaction: Optional[Transaction] = None
+    ) -> Dict[str, Any]:
         """Rename a file or directory"""
         try:
             old_full_path = self.validate_workspace_path(workspace_id, old_path)
@@ -210,10 +579,15 @@ class FileSystemService:
                     "message": f"Target path {new_path} already exists"
                 }
             
+            if transaction is not None:
+                transaction.record_rename(old_full_path, new_full_path)
+            
             # Ensure parent directory exists
             new_full_path.parent.mkdir(parents=True, exist_ok=True)
             
             old_full_path.rename(new_full_path)
+            self._invalidate_caches(workspace_id, old_full_path, tree=True)
+            self._invalidate_caches(workspace_id, new_full_path, tree=True)
             
             return {
                 "operation": "rename",
@@ -231,44 +605,203 @@ class FileSystemService:
                 "message": f"Failed to rename {old_path}: {str(e)}"
             }
     
+    def stat_file(self, workspace_id: str, file_path: str) -> Tuple[Path, os.stat_result]:
+        """
+        Resolve a workspace file for reading
+        
+        Raises:
+            ValueError: The path escapes the workspace
+            FileNotFoundError: The path is missing or not a regular file
+        """
+        full_path = self.validate_workspace_path(workspace_id, file_path)
+        try:
+            file_stat = full_path.stat()
+        except OSError:
+            raise FileNotFoundError(f"File {file_path} does not exist")
+        if not stat.S_ISREG(file_stat.st_mode):
+            raise FileNotFoundError(f"{file_path} is not a file")
+        return full_path, file_stat
+    
+    @staticmethod
+    def file_etag(file_stat: os.stat_result) -> str:
+        """Strong validator that changes whenever the file is rewritten or replaced"""
+        return f'"{file_stat.st_ino:x}-{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}"'
+    
+    async def read_file(
+        self,
+        workspace_id: str,
+        file_path: str,
+        offset: int = 0,
+        length: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Read a byte range of a file as text
+        
+        At most max_read_bytes are returned; "truncated" tells the caller
+        whether more of the file follows the returned range. Large files are
+        better fetched through the content route, which streams them.
+        """
+        try:
+            full_path, file_stat = self.stat_file(workspace_id, file_path)
+        except FileNotFoundError as e:
+            return {
+                "operation": "read",
+                "path": file_path,
+                "success": False,
+                "message": str(e)
+            }
+        
+        try:
+            max_read_bytes = self.settings.max_read_bytes
+            length = max_read_bytes if length is None else min(length, max_read_bytes)
+            
+            def read_range() -> bytes:
+                with open(full_path, 'rb') as f:
+                    f.seek(offset)
+                    return f.read(length)
+            
+            data = await asyncio.to_thread(read_range)
+            return {
+                "operation": "read",
+                "path": file_path,
+                "success": True,
+                "message": f"Read {len(data)} bytes from {file_path}",
+                "content": data.decode('utf-8', errors='replace'),
+                "offset": offset,
+                "size": file_stat.st_size,
+                "truncated": offset + len(data) < file_stat.st_size,
+                "etag": self.file_etag(file_stat)
+            }
+        except Exception as e:
+            return {
+                "operation": "read",
+                "path": file_path,
+                "success": False,
+                "message": f"Failed to read file {file_path}: {str(e)}"
+            }
+    
+    def _directory_error(self, full_path: Path, directory_path: str) -> Optional[Dict[str, Any]]:
+        """Result to return when directory_path can't be listed, else None"""
+        if not full_path.exists():
+            return {
+                "operation": "list",
+                "path": directory_path,
+                "success": False,
+                "message": f"Directory {directory_path} does not exist"
+            }
+        
+        if not full_path.is_dir():
+            return {
+                "operation": "list",
+                "path": directory_path,
+                "success": False,
+                "message": f"{directory_path} is not a directory"
+            }
+        return None
+    
+    def _format_entries(
+        self,
+        workspace_id: str,
+        full_path: Path,
+        entries: Iterable[ListingEntry],
+        fields: str = "full"
+    ) -> List[Dict[str, Any]]:
+        """Render listing entries in the FileInfo shape, optionally names only"""
+        relative_dir = full_path.relative_to(self.get_workspace_path(workspace_id).resolve())
+        prefix = "" if relative_dir == Path(".") else f"{relative_dir}{os.sep}"
+        if fields == "name":
+            return [
+                {"name": entry.name, "path": prefix + entry.name, "is_directory": entry.is_directory}
+                for entry in entries
+            ]
+        return [
+            {
+                "name": entry.name,
+                "path": prefix + entry.name,
+                "is_directory": entry.is_directory,
+                "size": entry.size,
+                "modified_at": entry.modified_at
+            }
+            for entry in entries
+        ]
+    
     async def list_files(self, workspace_id: str, directory_path: str = "") -> Dict[str, Any]:
         """List files in a directory"""
         try:
             full_path = self.validate_workspace_path(workspace_id, directory_path)
+            error = self._directory_error(full_path, directory_path)
+            if error:
+                return error
             
-            if not full_path.exists():
-                return {
-                    "operation": "list",
-                    "path": directory_path,
-                    "success": False,
-                    "message": f"Directory {directory_path} does not exist"
-                }
+            entries = await self._listing_cache.list(full_path)
+            files = self._format_entries(workspace_id, full_path, entries)
             
-            if not full_path.is_dir():
-                return {
-                    "operation": "list",
-                    "path": directory_path,
-                    "success": False,
-                    "message": f"{directory_path} is not a directory"
-                }
+            return {
+                "operation": "list",
+                "path": directory_path,
+                "success": True,
+                "message": f"Listed {len(files)} items in {directory_path}",
+                "files": files
+            }
+        except Exception as e:
+            return {
+                "operation": "list",
+                "path": directory_path,
+                "success": False,
+                "message": f"Failed to list directory: {str(e)}"
+            }
+    
+    async def list_files_page(
+        self,
+        workspace_id: str,
+        directory_path: str = "",
+        limit: Optional[int] = 100,
+        cursor: Optional[str] = None,
+        sort_by: str = "name",
+        descending: bool = False,
+        fields: str = "full"
+    ) -> Dict[str, Any]:
+        """
+        List one page of a directory in a stable order
+        
+        Args:
+            workspace_id: Workspace to list
+            directory_path: Directory relative to the workspace
+            limit: Maximum entries to return (None for all)
+            cursor: next_cursor from the previous page
+            sort_by: "name", "size" or "mtime"; ties are broken by name
+            descending: Reverse the sort order
+            fields: "full" for FileInfo fields, "name" for name/path/is_directory only
             
-            files = []
-            for item in full_path.iterdir():
-                file_info = FileInfo(
-                    name=item.name,
-                    path=str(item.relative_to(self.get_workspace_path(workspace_id))),
-                    is_directory=item.is_dir(),
-                    size=item.stat().st_size if item.is_file() else None,
-                    modified_at=datetime.fromtimestamp(item.stat().st_mtime).isoformat()
+        Returns:
+            List result with the page in "files" and a "next_cursor" that is
+            None on the last page
+        """
+        try:
+            full_path = self.validate_workspace_path(workspace_id, directory_path)
+            error = self._directory_error(full_path, directory_path)
+            if error:
+                return error
+            
+            after = decode_cursor(cursor, sort_by, descending) if cursor else None
+            cached = self._listing_cache.peek(full_path)
+            if cached is not None:
+                page, last_key = select_page(cached, limit, sort_by, descending, after)
+            else:
+                # Stream the scan through a bounded heap rather than
+                # materialising a directory of any size
+                page, last_key = await asyncio.to_thread(
+                    select_page, iter_directory(full_path), limit, sort_by, descending, after
                 )
-                files.append(file_info.dict())
+            files = self._format_entries(workspace_id, full_path, page, fields)
             
             return {
                 "operation": "list",
                 "path": directory_path,
                 "success": True,
                 "message": f"Listed {len(files)} items in {directory_path}",
-                "files": files
+                "files": files,
+                "next_cursor": encode_cursor(sort_by, descending, last_key) if last_key else None
             }
         except Exception as e:
             return {
@@ -278,31 +811,358 @@ class FileSystemService:
                 "message": f"Failed to list directory: {str(e)}"
             }
     
-    async def execute_operations(self, workspace_id: str, operations: List[FileOperation]) -> List[Dict[str, Any]]:
-        """Execute multiple file operations"""
-        results = []
+    async def _save_upload(
+        self,
+        workspace_id: str,
+        upload: Any,
+        quota: UploadQuota
+    ) -> Dict[str, Any]:
+        """Write one upload, closing it even if rejected so a streamed body isn't left waiting on it"""
+        try:
+            return await self._write_upload(workspace_id, upload, quota)
+        finally:
+            await upload.close()
+    
+    async def _write_upload(
+        self,
+        workspace_id: str,
+        upload: Any,
+        quota: UploadQuota
+    ) -> Dict[str, Any]:
+        """Stream one uploaded file to disk in chunks, enforcing size limits as it goes"""
+        relative_path = sanitize_path(upload.filename or "")
+        if not relative_path:
+            return {"path": upload.filename, "success": False, "size": 0, "message": "Invalid file name"}
+        if not validate_file_extension(relative_path):
+            return {"path": relative_path, "success": False, "size": 0, "message": "File extension not allowed"}
         
-        for operation in operations:
+        full_path = self.validate_workspace_path(workspace_id, relative_path)
+        quota.reserve_file()
+        written = 0
+        
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            async with aiofiles.open(full_path, 'wb') as f:
+                while chunk := await upload.read(self.settings.upload_chunk_size):
+                    if written + len(chunk) > self.settings.max_file_size:
+                        raise ValueError(f"File exceeds the {self.settings.max_file_size} byte limit")
+                    quota.consume(len(chunk))
+                    written += len(chunk)
+                    await f.write(chunk)
+        except ValueError as e:
+            full_path.unlink(missing_ok=True)
+            quota.release_file(written)
+            logger.warning(f"Rejected upload {relative_path}: {str(e)}")
+            return {"path": relative_path, "success": False, "size": 0, "message": str(e)}
+        except BaseException:
+            full_path.unlink(missing_ok=True)
+            raise
+        
+        logger.debug(f"Uploaded {relative_path} ({written} bytes)")
+        return {"path": relative_path, "success": True, "size": written, "message": "Uploaded"}
+    
+    async def save_uploads(
+        self,
+        workspace_id: str,
+        uploads: Union[Iterable[Any], AsyncIterable[Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Write uploaded files into a workspace concurrently
+        
+        Each upload must provide a filename and async read(size) and close()
+        methods (e.g. FastAPI's UploadFile). uploads may be an async iterable,
+        such as MultipartUploadStream.uploads(), in which case each file is
+        written while the rest of the request is still arriving. Files are
+        copied in upload_chunk_size chunks with at most upload_concurrency in
+        flight. Files that are too large or have a disallowed extension are
+        rejected individually.
+        
+        Returns:
+            One result per upload with its path, size and outcome
+        
+        Raises:
+            QuotaExceededError: The workspace size or file limit was hit; all
+                in-flight writes are cancelled and their partial files removed
+            ValueError: A streamed body turned out not to be valid multipart
+        """
+        quota = UploadQuota(self.settings.max_workspace_size, self.settings.max_files_per_workspace)
+        slots = asyncio.Semaphore(self.settings.upload_concurrency)
+        
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = []
+                # Waiting for a free writer before pulling the next upload
+                # paces a streamed body to the disk, and a failing writer
+                # cancels this loop, so the rest of the body is never read.
+                # The slot is taken after the pull because the previous
+                # file's last bytes arrive during it.
+                async for upload in _as_async_iterable(uploads):
+                    await slots.acquire()
+                    task = group.create_task(self._save_upload(workspace_id, upload, quota))
+                    task.add_done_callback(lambda _: slots.release())
+                    tasks.append(task)
+        except* (QuotaExceededError, ValueError) as errors:
+            raise errors.exceptions[0]
+        return [task.result() for task in tasks]
+    
+    async def import_archive(self, workspace_id: str, source: Any, filename: str) -> List[Dict[str, Any]]:
+        """
+        Extract a zip or tar(.gz) archive into a workspace
+        
+        Members are streamed straight to disk one at a time in a worker
+        thread. Each member name passes the same checks as an upload (path
+        sanitising, workspace containment, extension and size limits);
+        failing members are skipped and reported. Symlinks, devices and
+        other non-regular members are ignored.
+        
+        Raises:
+            QuotaExceededError: The workspace size or file limit was hit
+        """
+        quota = UploadQuota(self.settings.max_workspace_size, self.settings.max_files_per_workspace)
+        
+        def resolve_target(name: str) -> Path:
+            relative_path = sanitize_path(name)
+            if not relative_path:
+                raise ArchiveMemberRejected("Invalid file name")
+            if not validate_file_extension(relative_path):
+                raise ArchiveMemberRejected("File extension not allowed")
+            try:
+                return self.validate_workspace_path(workspace_id, relative_path)
+            except ValueError as e:
+                raise ArchiveMemberRejected(str(e))
+        
+        def extract() -> List[Dict[str, Any]]:
+            archive_format = detect_format(filename, source)
+            return extract_archive(
+                source,
+                archive_format,
+                resolve_target,
+                quota,
+                self.settings.max_file_size,
+                self.settings.upload_chunk_size
+            )
+        
+        results = await asyncio.to_thread(extract)
+        self._drop_workspace_caches(workspace_id)
+        return results
+    
+    def export_archive(self, workspace_id: str, archive_format: str = "zip") -> AsyncIterator[bytes]:
+        """Stream a workspace as a zip or tar.gz archive without buffering it"""
+        workspace_path = self.get_workspace_path(workspace_id)
+        if not workspace_path.is_dir():
+            raise ValueError(f"Workspace {workspace_id} does not exist")
+        return stream_archive(workspace_path.resolve(), archive_format)
+    
+    async def search_files(
+        self,
+        workspace_id: str,
+        query: str,
+        directory_path: str = "",
+        limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Search file contents for a literal, case-insensitive string
+        
+        Args:
+            workspace_id: Workspace to search
+            query: Text to look for
+            directory_path: Only search under this directory
+            limit: Maximum matching lines; defaults to search_max_results
+            
+        Returns:
+            Operation result with "matches" holding path, line, column and
+            snippet for each matching line
+        """
+        try:
+            if not query:
+                return {
+                    "operation": "search",
+                    "path": directory_path,
+                    "success": False,
+                    "message": "Search query must not be empty"
+                }
+            
+            full_path = self.validate_workspace_path(workspace_id, directory_path)
+            workspace_root = self.get_workspace_path(workspace_id).resolve()
+            scope = full_path.relative_to(workspace_root).as_posix()
+            index = self._search_indexes.get(workspace_id, workspace_root)
+            
+            started = time.perf_counter()
+            result = await index.search(query, "" if scope == "." else scope, limit or self.settings.search_max_results)
+            self._search_indexes.trim()
+            took_ms = round((time.perf_counter() - started) * 1000, 2)
+            
+            return {
+                "operation": "search",
+                "path": directory_path,
+                "query": query,
+                "success": True,
+                "message": f"Found {len(result['matches'])} matches for '{query}'",
+                "took_ms": took_ms,
+                **result
+            }
+        except Exception as e:
+            return {
+                "operation": "search",
+                "path": directory_path,
+                "success": False,
+                "message": f"Failed to search for '{query}': {str(e)}"
+            }
+    
+    def walk_files(
+        self,
+        workspace_id: str,
+        directory_path: str = "",
+        max_depth: Optional[int] = None,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Recursively list a workspace directory as an async stream of entries
+        
+        Raises:
+            ValueError: If the path is outside the workspace or not a directory
+        """
+        full_path = self.validate_workspace_path(workspace_id, directory_path)
+        error = self._directory_error(full_path, directory_path)
+        if error:
+            raise ValueError(error["message"])
+        
+        relative_dir = full_path.relative_to(self.get_workspace_path(workspace_id).resolve())
+        return walk_tree(
+            full_path,
+            "" if relative_dir == Path(".") else relative_dir.as_posix(),
+            max_depth=max_depth,
+            include=include,
+            exclude=exclude,
+            concurrency=self.tree_walk_concurrency
+        )
+    
+    async def execute_operation(
+        self,
+        workspace_id: str,
+        operation: FileOperation,
+        transaction: Optional[Transaction] = None
+    ) -> Dict[str, Any]:
+        """Execute a single file operation, recording it in transaction if given"""
+        try:
             if operation.operation == FileOperationType.CREATE:
-                result = await self.create_file(workspace_id, operation.path, operation.content or "")
+                return await self.create_file(
+                    workspace_id, operation.path, operation.content or "", transaction, operation.overwrite
+                )
             elif operation.operation == FileOperationType.EDIT:
-                result = await self.edit_file(workspace_id, operation.path, operation.content or "")
+                return await self.edit_file(workspace_id, operation.path, operation.content or "", transaction)
             elif operation.operation == FileOperationType.APPEND:
-                result = await self.append_to_file(workspace_id, operation.path, operation.content or "")
+                return await self.append_to_file(workspace_id, operation.path, operation.content or "", transaction)
             elif operation.operation == FileOperationType.DELETE:
-                result = await self.delete_file(workspace_id, operation.path)
+                return await self.delete_file(workspace_id, operation.path, transaction)
             elif operation.operation == FileOperationType.RENAME:
-                result = await self.rename_file(workspace_id, operation.path, operation.new_path or "")
+                return await self.rename_file(workspace_id, operation.path, operation.new_path or "", transaction)
+            elif operation.operation == FileOperationType.PATCH:
+                return await self.patch_file(
+                    workspace_id,
+                    operation.path,
+                    operation.content or "",
+                    operation.start_line,
+                    operation.end_line,
+                    transaction,
+                    operation.expected
+                )
             elif operation.operation == FileOperationType.LIST:
-                result = await self.list_files(workspace_id, operation.path)
+                return await self.list_files(workspace_id, operation.path)
+            elif operation.operation == FileOperationType.SEARCH:
+                return await self.search_files(workspace_id, operation.query or "", operation.path)
+            elif operation.operation == FileOperationType.READ:
+                return await self.read_file(workspace_id, operation.path, operation.offset or 0, operation.length)
             else:
-                result = {
+                return {
                     "operation": operation.operation.value,
                     "path": operation.path,
                     "success": False,
                     "message": f"Unknown operation: {operation.operation}"
                 }
-            
-            results.append(result)
+        except Exception as e:
+            logger.error(f"Operation {operation.operation.value} on {operation.path} failed: {str(e)}")
+            return {
+                "operation": operation.operation.value,
+                "path": operation.path,
+                "success": False,
+                "message": f"Failed to execute operation: {str(e)}"
+            }
+    
+    def create_scheduler(self, workspace_id: str, transaction: Optional[Transaction] = None) -> OperationScheduler:
+        """Create a dependency-aware executor for a batch of operations in a workspace"""
+        return OperationScheduler(
+            lambda operation: self.execute_operation(workspace_id, operation, transaction),
+            self._operation_semaphore
+        )
+    
+    @asynccontextmanager
+    async def grouped_commit(self, workspace_id: str) -> AsyncIterator[OperationScheduler]:
+        """
+        A scheduler whose writes are fsynced together when the block exits
         
-        return results 
\ No newline at end of file
+        For batches that need one group commit but not atomicity, such as
+        the operations of a prompt. On exit, including cancellation, running
+        operations finish before the commit.
+        """
+        transaction = self.begin_transaction()
+        scheduler = self.create_scheduler(workspace_id, transaction)
+        
+        async def commit():
+            await scheduler.drain()
+            await asyncio.to_thread(transaction.commit)
+        
+        try:
+            yield scheduler
+        finally:
+            await asyncio.shield(commit())
+    
+    async def execute_operations(
+        self,
+        workspace_id: str,
+        operations: List[FileOperation],
+        atomic: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute multiple file operations, running independent paths concurrently
+        
+        The batch is fsynced once at the end rather than once per file. With
+        atomic set, any failed operation rolls back the whole batch and every
+        result that had succeeded is marked "rolled_back".
+        """
+        transaction = self.begin_transaction()
+        scheduler = self.create_scheduler(workspace_id, transaction)
+        for operation in operations:
+            scheduler.submit(operation)
+        
+        try:
+            results = await scheduler.gather()
+        except BaseException:
+            # Cancelled: let running operations finish before undoing them
+            await asyncio.shield(scheduler.drain())
+            if atomic:
+                await self._rollback(workspace_id, transaction)
+            else:
+                await asyncio.to_thread(transaction.commit)
+            raise
+        
+        if atomic and not all(result["success"] for result in results):
+            await self._rollback(workspace_id, transaction)
+            for result in results:
+                if result["success"]:
+                    result["success"] = False
+                    result["rolled_back"] = True
+                    result["message"] = f"{result['message']} (rolled back)"
+            return results
+        
+        await asyncio.to_thread(transaction.commit)
+        return results
+    
+    async def _rollback(self, workspace_id: str, transaction: Transaction):
+        """Undo a transaction and resync the caches and usage ledger with the disk"""
+        failures = await asyncio.to_thread(transaction.rollback)
+        if failures:
+            logger.error(f"Rollback in workspace {workspace_id} left {failures} operations applied")
+        self._drop_workspace_caches(workspace_id)
+        await self.reconcile_usage(workspace_id)
@@ -0,0 +1,136 @@
+import os
+import logging
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Optional
+
+import httpx
+from together import AsyncTogether, DefaultAsyncHttpxClient
+
+from ..config import Settings
+
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ("together", "openai", "stub")
+
+STUB_RESPONSE = '{"operations": [], "confidence": 1.0, "reasoning": "Stub backend"}'
+
+
+class LLMBackend(ABC):
+    """
+    Where completions come from
+
+    LLMService owns prompts, parsing, routing and resilience; a backend
+    only has to answer chat completion requests. create_completion takes
+    the keyword arguments of the OpenAI chat completions API and returns
+    an object shaped like its response (or an async iterator of chunks
+    when stream=True).
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def create_completion(self, **params) -> Any:
+        ...
+
+    @abstractmethod
+    async def probe(self):
+        """Raise if the backend can't currently serve requests; should spend no tokens"""
+
+    async def close(self):
+        pass
+
+
+class ChatCompletionsBackend(LLMBackend):
+    """Together AI, or any server speaking the OpenAI chat completions API"""
+
+    def __init__(self, name: str, client: AsyncTogether):
+        self.name = name
+        self.client = client
+
+    async def create_completion(self, **params) -> Any:
+        return await self.client.chat.completions.create(**params)
+
+    async def probe(self):
+        # Raw response, since providers disagree on the model list's shape
+        await self.client.get("/models", cast_to=httpx.Response)
+
+    async def close(self):
+        await self.client.close()
+
+
+class StubBackend(LLMBackend):
+    """Returns the same completion for every prompt; for tests and offline runs"""
+
+    name = "stub"
+
+    def __init__(self, response: str = STUB_RESPONSE):
+        self.response = response
+
+    async def _chunks(self) -> AsyncIterator[Any]:
+        for start in range(0, len(self.response), 16):
+            delta = SimpleNamespace(content=self.response[start:start + 16])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    async def create_completion(self, stream: bool = False, **params) -> Any:
+        if stream:
+            return self._chunks()
+        message = SimpleNamespace(content=self.response)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    async def probe(self):
+        pass
+
+
+def create_backend(settings: Settings) -> Optional[LLMBackend]:
+    """
+    Build the backend selected by settings.llm_provider
+
+    Returns:
+        The backend, or None when it can't be configured (e.g. no API key),
+        in which case LLM features are disabled
+    """
+    provider = settings.llm_provider
+    if provider == "stub":
+        logger.info("LLM service using the stub backend")
+        return StubBackend(settings.llm_stub_response or STUB_RESPONSE)
+    if provider not in PROVIDERS:
+        logger.error(f"Unknown LLM provider {provider!r}; expected one of {', '.join(PROVIDERS)}")
+        return None
+
+    if provider == "together":
+        api_key = os.getenv("TOGETHER_API_KEY")
+        if not api_key:
+            logger.warning("TOGETHER_API_KEY not found. LLM features will be disabled.")
+            return None
+    else:
+        if not settings.llm_base_url:
+            logger.warning("LLM_BASE_URL not set for the openai provider. LLM features will be disabled.")
+            return None
+        # Local servers usually ignore the key, but the client requires one
+        api_key = settings.llm_api_key or os.getenv("OPENAI_API_KEY") or "none"
+
+    try:
+        # One keep-alive pool per process, so only the first prompt pays
+        # for the TLS handshake
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_concurrency,
+                max_keepalive_connections=settings.llm_keepalive_connections,
+                keepalive_expiry=settings.llm_keepalive_expiry
+            )
+        )
+        client = AsyncTogether(
+            api_key=api_key,
+            base_url=settings.llm_base_url or None,
+            timeout=settings.llm_timeout,
+            # Retries are handled by LLMService against a shared budget
+            max_retries=0,
+            http_client=http_client
+        )
+    except Exception as e:
+        logger.error(f"Failed to initialize LLM: {e}")
+        return None
+
+    logger.info(f"LLM service initialized with the {provider} backend using model: {settings.llm_model}")
+    return ChatCompletionsBackend(provider, client)
@@ -0,0 +1,107 @@
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .resilience import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class LLMHealthMonitor:
+    """
+    Keep an up-to-date view of whether the LLM provider is usable
+
+    Real traffic is the main signal: the circuit breaker already sees the
+    outcome of every completion. A cheap probe (listing models, no tokens
+    spent) runs in the background only when there has been no successful
+    traffic for a whole interval, so an idle server still notices outages
+    and recoveries. status() just reads the stored state, which makes
+    health checks free however often they are polled.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[], Awaitable[Any]],
+        breaker: CircuitBreaker,
+        interval: float = 60.0,
+        probe_timeout: float = 5.0
+    ):
+        self.probe = probe
+        self.breaker = breaker
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        self._probe_ok: Optional[bool] = None
+        self._probed_at: Optional[float] = None
+        self._probe_latency: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def check(self) -> bool:
+        """Run the probe now and store its outcome"""
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(self.probe_timeout):
+                await self.probe()
+            self._probe_ok = True
+            self._last_error = None
+        except Exception as e:
+            self._probe_ok = False
+            self._last_error = str(e) or type(e).__name__
+            logger.warning(f"LLM health probe failed: {self._last_error}")
+        self._probed_at = time.monotonic()
+        self._probe_latency = self._probed_at - started
+        return self.status()["available"]
+
+    def _traffic_is_recent(self) -> bool:
+        last_success = self.breaker.last_success_at
+        return last_success is not None and time.monotonic() - last_success < self.interval
+
+    async def _run(self):
+        while True:
+            if not self._traffic_is_recent():
+                await self.check()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start probing in the background; call from a running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Current availability without any I/O
+
+        A successful real call newer than the last probe overrides a failed
+        probe; an open circuit overrides everything.
+        """
+        last_success = self.breaker.last_success_at
+        traffic_newer = last_success is not None and (self._probed_at is None or last_success > self._probed_at)
+        if self.breaker.state == "open":
+            available, source = False, "circuit"
+        elif traffic_newer:
+            available, source = True, "traffic"
+        elif self._probe_ok is not None:
+            available, source = self._probe_ok, "probe"
+        else:
+            available, source = False, "none"
+
+        now = time.monotonic()
+        return {
+            "available": available,
+            "source": source,
+            "last_probe_seconds_ago": round(now - self._probed_at, 1) if self._probed_at is not None else None,
+            "last_probe_ms": round(self._probe_latency * 1000, 1) if self._probe_latency is not None else None,
+            "last_success_seconds_ago": round(now - last_success, 1) if last_success is not None else None,
+            "last_error": self._last_error,
+            "monitoring": self._task is not None and not self._task.done()
+        }
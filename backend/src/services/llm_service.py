@@ -1,40 +1,200 @@
-import os
-import re
+import asyncio
 import logging
-from typing import Optional, Dict, Any
-from tenacity import retry, stop_after_attempt, wait_exponential
-from together import Together
+from typing import Optional, Dict, Any, AsyncIterator, List
+from together import APIConnectionError, BadRequestError, InternalServerError, RateLimitError
 from dotenv import load_dotenv
 
 from ..config import Settings
+from .llm_backends import LLMBackend, create_backend
+from .response_parser import RESPONSE_SCHEMA, parse_llm_response, validate_operations
+from .llm_health import LLMHealthMonitor
+from .resilience import CircuitBreaker, CircuitOpenError, ResilientCaller, RetryBudget
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Failures that say the provider is unhealthy; APITimeoutError is an
+# APIConnectionError. Anything else (bad request, auth) is not retried.
+RETRYABLE_ERRORS = (APIConnectionError, RateLimitError, InternalServerError)
+
 class LLMService:
-    """Service for LLM operations using Together AI"""
+    """
+    Service for LLM operations
+    
+    Completions come from a pluggable backend (Together AI, any OpenAI
+    compatible server, or a stub). When a small model is configured, short
+    prompts try it first and escalate to the main model only if its answer
+    is unusable or unsure.
+    """
     
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, backend: Optional[LLMBackend] = None):
         self.settings = settings
-        self.client = None
-        self._initialize_llm()
+        # Caps in-flight completions per worker so a burst of prompts can't
+        # exhaust sockets or the provider's rate limit
+        self._semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+        # Models that turned structured output down; they get plain text
+        self._text_only_models = set()
+        # Shared by every request, so a provider incident fails fast instead
+        # of each request retrying into it
+        self.resilience = ResilientCaller(
+            breaker=CircuitBreaker(
+                failure_ratio=settings.llm_breaker_failure_ratio,
+                min_calls=settings.llm_breaker_min_calls,
+                window=settings.llm_breaker_window,
+                open_seconds=settings.llm_breaker_open_seconds
+            ),
+            budget=RetryBudget(ratio=settings.llm_retry_budget_ratio),
+            retryable=RETRYABLE_ERRORS,
+            max_attempts=settings.llm_max_attempts,
+            backoff=settings.llm_retry_backoff,
+            deadline=settings.llm_deadline,
+            hedge=settings.llm_hedge_enabled,
+            hedge_percentile=settings.llm_hedge_percentile,
+            hedge_min_delay=settings.llm_hedge_min_delay
+        )
+        self.health = LLMHealthMonitor(
+            self._probe,
+            self.resilience.breaker,
+            interval=settings.llm_health_interval,
+            probe_timeout=settings.llm_health_probe_timeout
+        )
+        self.small_model_calls = 0
+        self.escalations = 0
+        self.backend = backend if backend is not None else create_backend(settings)
+    
+    async def close(self):
+        """Stop health monitoring and close the backend's connection pool"""
+        await self.health.stop()
+        if self.backend:
+            await self.backend.close()
+            self.backend = None
+            logger.info("LLM client connection pool closed")
+    
+    def _build_prompt(self, prompt: str, context: Dict[str, Any] = None) -> str:
+        """Create a structured prompt for the LLM"""
+        context = context or {}
+        workspace_summary = context.get('workspace_summary')
+        existing_files = f"""
+        Existing files (path, size, first lines):
+        {workspace_summary}
+        """ if workspace_summary else ""
+        return f"""
+        You are a file system assistant. Parse this user request and extract file operations:
+        
+        User Request: "{prompt}"
+        Workspace Path: {context.get('workspace_path', 'unknown')}
+        {existing_files}        
+        Respond in this exact JSON format:
+        {{
+            "operations": [
+                {{
+                    "type": "create|edit|patch|delete|rename|list|read|search",
+                    "target": "filename or pattern",
+                    "content": "file content (for create/edit), or a unified diff (for patch)",
+                    "query": "text to find in file contents (for search)",
+                    "new_name": "new filename (for rename)",
+                    "description": "what this operation does"
+                }}
+            ],
+            "confidence": 0.0-1.0,
+            "reasoning": "why these operations were chosen"
+        }}
+        
+        Use the exact paths of existing files. To change part of an existing
+        file whose lines are shown above, use patch with a unified diff: @@
+        hunk headers, and the unchanged lines around each change as context.
+        A hunk whose removed or context lines don't match the file is
+        rejected, so copy them exactly. Otherwise use edit with the whole
+        new content.
+        Only include operations that are clearly requested. Be conservative.
+        """
+    
+    def _response_format(self, model: str) -> Optional[Dict[str, Any]]:
+        """Structured-output request for the configured mode; None means plain text"""
+        mode = "text" if model in self._text_only_models else self.settings.llm_response_format
+        if mode == "json_schema":
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": "file_operations", "schema": RESPONSE_SCHEMA}
+            }
+        if mode == "json_object":
+            return {"type": "json_object"}
+        return None
     
-    def _initialize_llm(self):
-        """Initialize the LLM with Together AI"""
+    async def _create_completion(self, structured_prompt: str, model: str, **kwargs):
+        """
+        Request a completion for the structured prompt from model
+        
+        JSON mode is used when configured. A model that rejects
+        response_format is retried once without it, and later requests skip
+        it, so an unsupported model costs one extra round trip per process.
+        """
+        params = dict(
+            model=model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": structured_prompt
+                }
+            ],
+            temperature=self.settings.llm_temperature,
+            max_tokens=self.settings.llm_max_tokens,
+            **kwargs
+        )
+        response_format = self._response_format(model)
+        if response_format is None:
+            return await self.backend.create_completion(**params)
+        
         try:
-            api_key = os.getenv("TOGETHER_API_KEY")
-            if not api_key:
-                logger.warning("TOGETHER_API_KEY not found. LLM features will be disabled.")
-                return
-            
-            self.client = Together(api_key=api_key)
-            logger.info(f"LLM service initialized with Together AI using model: {self.settings.llm_model}")
-        except Exception as e:
-            logger.error(f"Failed to initialize LLM: {e}")
-            self.client = None
+            return await self.backend.create_completion(response_format=response_format, **params)
+        except BadRequestError as e:
+            message = str(e).lower()
+            if not any(term in message for term in ("response_format", "json", "schema")):
+                raise
+            logger.warning(f"{model} rejected {response_format['type']} output, using plain text: {e}")
+            self._text_only_models.add(model)
+            return await self.backend.create_completion(**params)
+    
+    async def _complete(self, structured_prompt: str, model: str):
+        """One completion attempt, holding a concurrency slot only while it runs"""
+        async with self._semaphore:
+            return await self._create_completion(structured_prompt, model)
+    
+    def _route(self, prompt: str) -> List[str]:
+        """Models to try in order: the small model first for short prompts, then the main one"""
+        small_model = self.settings.llm_small_model
+        if (
+            small_model
+            and small_model != self.settings.llm_model
+            and len(prompt) <= self.settings.llm_small_model_max_chars
+        ):
+            return [small_model, self.settings.llm_model]
+        return [self.settings.llm_model]
+    
+    def _escalation_reason(self, result: Dict[str, Any]) -> Optional[str]:
+        """Why a small model's answer can't be used, or None if it can"""
+        if result.get("error"):
+            return result["error"]
+        if result.get("partial"):
+            return "malformed JSON"
+        problems = validate_operations(result["operations"])
+        if problems:
+            return "; ".join(problems)
+        if result["confidence"] < self.settings.llm_escalation_confidence:
+            return f"confidence {result['confidence']:.2f}"
+        return None
+    
+    async def _process_with_model(self, structured_prompt: str, model: str, deadline: float) -> Dict[str, Any]:
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            raise TimeoutError()
+        response = await self.resilience.call(lambda: self._complete(structured_prompt, model), remaining)
+        result = parse_llm_response(response.choices[0].message.content or "")
+        result["method"] = "llm"
+        result["model"] = model
+        return result
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     async def process_prompt(self, prompt: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Process a natural language prompt and return structured operations
@@ -44,103 +204,122 @@ class LLMService:
             context: Additional context (workspace path, etc.)
             
         Returns:
-            Dictionary with parsed operations and confidence
+            Dictionary with parsed operations, confidence and the model
+            that produced them
         """
-        if not self.client:
+        if not self.backend:
             return self._fallback_processing(prompt, context)
         
         try:
-            # Create a structured prompt for the LLM
-            structured_prompt = f"""
-            You are a file system assistant. Parse this user request and extract file operations:
-            
-            User Request: "{prompt}"
-            Workspace Path: {context.get('workspace_path', 'unknown')}
-            
-            Respond in this exact JSON format:
-            {{
-                "operations": [
-                    {{
-                        "type": "create|edit|delete|rename|list",
-                        "target": "filename or pattern",
-                        "content": "file content (for create/edit)",
-                        "new_name": "new filename (for rename)",
-                        "description": "what this operation does"
-                    }}
-                ],
-                "confidence": 0.0-1.0,
-                "reasoning": "why these operations were chosen"
-            }}
-            
-            Only include operations that are clearly requested. Be conservative.
-            """
-            
-            response = self.client.chat.completions.create(
-                model=self.settings.llm_model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": structured_prompt
-                    }
-                ],
-                temperature=self.settings.llm_temperature,
-                max_tokens=self.settings.llm_max_tokens
-            )
-            
-            result_content = response.choices[0].message.content
-            
-            # Try to extract JSON from response
-            json_match = re.search(r'\{.*\}', result_content, re.DOTALL)
-            if json_match:
-                import json
+            structured_prompt = self._build_prompt(prompt, context)
+            models = self._route(prompt)
+            # One deadline for the whole prompt: escalating only gets what
+            # the small model left of it
+            deadline = asyncio.get_running_loop().time() + self.settings.llm_deadline
+            for model in models[:-1]:
+                self.small_model_calls += 1
                 try:
-                    result = json.loads(json_match.group())
-                    result["method"] = "llm"
+                    result = await self._process_with_model(structured_prompt, model, deadline)
+                    reason = self._escalation_reason(result)
+                except CircuitOpenError:
+                    raise
+                except Exception as e:
+                    reason = str(e) or type(e).__name__
+                if reason is None:
                     return result
-                except json.JSONDecodeError:
-                    pass
+                self.escalations += 1
+                logger.info(f"Escalating from {model} to {models[-1]}: {reason}")
             
-            # If JSON parsing fails, return error
-            return {
-                "operations": [],
-                "confidence": 0.0,
-                "reasoning": "Failed to parse LLM response as JSON",
-                "method": "llm",
-                "error": "Invalid JSON response from LLM"
-            }
+            result = await self._process_with_model(structured_prompt, models[-1], deadline)
+            if len(models) > 1:
+                result["escalated"] = True
+            return result
             
+        except CircuitOpenError as e:
+            logger.warning(f"LLM call skipped: {e}")
+            return self._fallback_processing(prompt, context, str(e))
+        except TimeoutError:
+            logger.error(f"LLM processing exceeded the {self.settings.llm_deadline}s deadline")
+            return self._fallback_processing(prompt, context, "LLM request timed out")
         except Exception as e:
             logger.error(f"LLM processing failed: {e}")
             return self._fallback_processing(prompt, context)
     
-    def _fallback_processing(self, prompt: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+    async def stream_prompt(self, prompt: str, context: Dict[str, Any] = None) -> AsyncIterator[str]:
+        """
+        Stream the raw LLM completion for a prompt as it is generated
+        
+        Args:
+            prompt: Natural language prompt describing file operations
+            context: Additional context (workspace path, etc.)
+            
+        Yields:
+            Text deltas of the JSON response
+        
+        Always uses the main model: operations are acted on as they stream,
+        so there is no chance to escalate afterwards.
+        """
+        if not self.backend:
+            raise RuntimeError("LLM service unavailable")
+        
+        # Streams can't be retried or hedged once text has been yielded, but
+        # they still fail fast while the circuit is open and count towards it
+        self.resilience.check()
+        structured_prompt = self._build_prompt(prompt, context)
+        breaker = self.resilience.breaker
+        try:
+            async with self._semaphore:
+                stream = await self._create_completion(structured_prompt, self.settings.llm_model, stream=True)
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        except RETRYABLE_ERRORS:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record_success()
+    
+    def _fallback_processing(
+        self,
+        prompt: str,
+        context: Dict[str, Any] = None,
+        error: str = "LLM service unavailable"
+    ) -> Dict[str, Any]:
         """Fallback when LLM is not available"""
         return {
             "operations": [],
             "confidence": 0.0,
             "reasoning": "LLM service not available",
             "method": "none",
-            "error": "LLM service unavailable"
+            "error": error
         }
     
+    def resilience_stats(self) -> Dict[str, Any]:
+        """Circuit breaker state, retry budget and hedging counters"""
+        return self.resilience.stats()
+    
+    async def _probe(self):
+        """Cheapest authenticated request the provider offers; spends no tokens"""
+        if not self.backend:
+            raise RuntimeError("LLM service unavailable")
+        await self.backend.probe()
+    
     async def is_available(self) -> bool:
-        """Check if LLM service is available"""
-        if not self.client:
-            return False
-        
-        try:
-            # Simple health check
-            response = self.client.chat.completions.create(
-                model=self.settings.llm_model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": "Hello"
-                    }
-                ],
-                max_tokens=10
-            )
-            return bool(response.choices[0].message.content)
-        except Exception as e:
-            logger.error(f"LLM health check failed: {e}")
-            return False 
\ No newline at end of file
+        """Probe the LLM provider now; health endpoints should use health_status()"""
+        return await self.health.check()
+    
+    def routing_stats(self) -> Dict[str, Any]:
+        """Backend, models, and how often the small model had to escalate"""
+        return {
+            "backend": self.backend.name if self.backend else None,
+            "model": self.settings.llm_model,
+            "small_model": self.settings.llm_small_model or None,
+            "small_model_calls": self.small_model_calls,
+            "escalations": self.escalations
+        }
+    
+    def health_status(self) -> Dict[str, Any]:
+        """Last known availability, as kept up to date by the health monitor"""
+        return self.health.status()
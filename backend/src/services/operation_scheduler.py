@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from pathlib import PurePosixPath
+from typing import List, Dict, Any, Tuple, Callable, Awaitable
+
+from ..models import FileOperation
+
+logger = logging.getLogger(__name__)
+
+PathKey = Tuple[str, ...]
+
+
+def _path_key(path: str) -> PathKey:
+    """Normalise a workspace-relative path; the workspace root is ()"""
+    return tuple(part for part in PurePosixPath(path).parts if part not in ("", "."))
+
+
+def _overlaps(a: PathKey, b: PathKey) -> bool:
+    """True when the paths are equal or one contains the other"""
+    shorter = min(len(a), len(b))
+    return a[:shorter] == b[:shorter]
+
+
+def operation_paths(operation: FileOperation) -> List[PathKey]:
+    """Every path an operation reads or writes"""
+    paths = [_path_key(operation.path)]
+    if operation.new_path:
+        paths.append(_path_key(operation.new_path))
+    return paths
+
+
+class OperationScheduler:
+    """
+    Run a batch of file operations concurrently while preserving order per path
+
+    Each submitted operation waits only for earlier operations that touch the
+    same path or a parent/child of it; operations on disjoint paths run in
+    parallel, bounded by the shared semaphore. Batch latency therefore follows
+    the depth of the dependency graph rather than the number of operations.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[FileOperation], Awaitable[Dict[str, Any]]],
+        semaphore: asyncio.Semaphore
+    ):
+        self._run = run
+        self._semaphore = semaphore
+        self._tasks: List[asyncio.Task] = []
+        self._pending: List[Tuple[List[PathKey], asyncio.Task]] = []
+
+    def submit(self, operation: FileOperation) -> asyncio.Task:
+        """Schedule an operation after every earlier operation it conflicts with"""
+        paths = operation_paths(operation)
+        self._pending = [(p, task) for p, task in self._pending if not task.done()]
+        dependencies = [
+            task for other_paths, task in self._pending
+            if any(_overlaps(a, b) for a in paths for b in other_paths)
+        ]
+
+        task = asyncio.ensure_future(self._run_after(operation, dependencies))
+        self._tasks.append(task)
+        self._pending.append((paths, task))
+        return task
+
+    async def _run_after(self, operation: FileOperation, dependencies: List[asyncio.Task]) -> Dict[str, Any]:
+        if dependencies:
+            await asyncio.gather(*dependencies, return_exceptions=True)
+        async with self._semaphore:
+            return await self._run(operation)
+
+    async def drain(self):
+        """Wait for everything submitted so far"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def gather(self) -> List[Dict[str, Any]]:
+        """Wait for the batch and return results in submission order"""
+        return list(await asyncio.gather(*self._tasks))
@@ -0,0 +1,150 @@
+import re
+import json
+import logging
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_OPERATIONS_KEY = re.compile(r'"operations"\s*:\s*$')
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_CONFIDENCE = re.compile(r'"confidence"\s*:\s*(-?[0-9.]+)')
+_REASONING = re.compile(r'"reasoning"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def loads_lenient(text: str) -> Optional[Any]:
+    """json.loads that also accepts trailing commas; None if the text still doesn't parse"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    repaired = _TRAILING_COMMA.sub(r"\1", text)
+    if repaired != text:
+        try:
+            return json.loads(repaired)
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def extract_fields(text: str) -> Dict[str, Any]:
+    """Pull confidence and reasoning out of a response that isn't valid JSON as a whole"""
+    fields: Dict[str, Any] = {}
+    confidence = _CONFIDENCE.search(text)
+    if confidence:
+        try:
+            fields["confidence"] = float(confidence.group(1))
+        except ValueError:
+            pass
+    reasoning = _REASONING.search(text)
+    if reasoning:
+        decoded = loads_lenient(f'"{reasoning.group(1)}"')
+        fields["reasoning"] = decoded if isinstance(decoded, str) else reasoning.group(1)
+    return fields
+
+
+class OperationStreamParser:
+    """
+    Incrementally parse an LLM response of the form {"operations": [...], ...}
+
+    Text is fed in arbitrary chunks; every object in the "operations" array is
+    returned from feed() as soon as its closing brace arrives, so callers can
+    act on it before the rest of the completion has been generated.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._array_depth: Optional[int] = None
+        self._object_start: Optional[int] = None
+        self._root_start: Optional[int] = None
+        self.operations: List[Dict[str, Any]] = []
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        return self._buffer
+
+    @property
+    def found_json(self) -> bool:
+        """Whether a JSON object has started in the stream"""
+        return self._root_start is not None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk and return the operations it completed"""
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                # Anything before the root object (prose, code fences) is ignored
+                if self._stack:
+                    self._in_string = True
+            elif char == "{":
+                if not self._stack:
+                    self._root_start = i
+                self._stack.append("{")
+                if self._array_depth is not None and len(self._stack) == self._array_depth + 1:
+                    self._object_start = i
+            elif char == "[":
+                if self._stack == ["{"] and _OPERATIONS_KEY.search(buffer[max(0, i - 64):i]):
+                    self._array_depth = 2
+                if self._stack:
+                    self._stack.append("[")
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if char == "}" and self._object_start is not None and len(self._stack) == self._array_depth:
+                    operation = self._decode(buffer[self._object_start:i + 1])
+                    self._object_start = None
+                    if operation is not None:
+                        self.operations.append(operation)
+                        completed.append(operation)
+                elif char == "]" and self._array_depth is not None and len(self._stack) < self._array_depth:
+                    self._array_depth = None
+
+        self._pos = len(buffer)
+        return completed
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Return the full parsed response once the stream has ended
+
+        Operations are always the ones already emitted by feed(); the
+        remaining top-level fields are taken from the root object when it
+        decodes cleanly. Otherwise (the stream was cut off or the JSON is
+        malformed) the result is flagged "partial".
+        """
+        result: Dict[str, Any] = {}
+        if self._root_start is not None:
+            decoded = self._decode(self._buffer[self._root_start:].strip().removesuffix("```"))
+            if decoded is None:
+                # Truncated or malformed; keep whatever fields can be recovered
+                decoded = extract_fields(self._buffer[self._root_start:])
+                result["partial"] = True
+            result.update(decoded)
+
+        result["operations"] = list(self.operations)
+        result.setdefault("confidence", 0.0)
+        result.setdefault("reasoning", "")
+        return result
+
+    @staticmethod
+    def _decode(text: str) -> Optional[Dict[str, Any]]:
+        value = loads_lenient(text)
+        return value if isinstance(value, dict) else None
@@ -0,0 +1,191 @@
+import os
+import re
+import shutil
+import logging
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(Exception):
+    """A patch could not be parsed or does not match the file"""
+
+
+class Edit(NamedTuple):
+    """Replace lines [start, end) (0-based) with new_lines"""
+    start: int
+    end: int
+    new_lines: List[str]
+    expected: Optional[List[str]] = None  # Old lines to verify, without line endings
+    no_newline_at_end: Optional[bool] = None  # None keeps whatever the replaced lines had
+
+
+def parse_unified_diff(diff: str) -> List[Edit]:
+    """
+    Turn the hunks of a unified diff into edits
+
+    File headers and anything else outside a hunk are ignored. Context and
+    removed lines are kept so apply_edits can check the hunk still matches.
+    """
+    edits = []
+    lines = diff.splitlines()
+    i = 0
+    while i < len(lines):
+        match = _HUNK_HEADER.match(lines[i])
+        i += 1
+        if not match:
+            continue
+
+        old_start = int(match.group(1))
+        old_count = int(match.group(2)) if match.group(2) is not None else 1
+        new_count = int(match.group(4)) if match.group(4) is not None else 1
+        expected: List[str] = []
+        new_lines: List[str] = []
+        no_newline = False
+        last_tag = None
+
+        while i < len(lines) and (len(expected) < old_count or len(new_lines) < new_count or lines[i].startswith("\\")):
+            line = lines[i]
+            i += 1
+            if line.startswith("\\"):
+                # "\ No newline at end of file" refers to the line before it
+                if last_tag in (" ", "+"):
+                    no_newline = True
+                continue
+            # Some tools strip the space from blank context lines
+            tag, text = line[:1] or " ", line[1:]
+            if tag == " ":
+                expected.append(text)
+                new_lines.append(text)
+            elif tag == "-":
+                expected.append(text)
+            elif tag == "+":
+                new_lines.append(text)
+            else:
+                raise PatchError(f"Unexpected line in hunk: {line!r}")
+            last_tag = tag
+
+        if len(expected) != old_count or len(new_lines) != new_count:
+            raise PatchError(f"Hunk starting at line {old_start} is truncated")
+
+        # A pure insertion (-N,0) goes after line N
+        start = old_start - 1 if old_count else old_start
+        edits.append(Edit(start, start + old_count, new_lines, expected, no_newline))
+
+    if not edits:
+        raise PatchError("No hunks found in diff")
+    return edits
+
+
+def line_range_edit(
+    start_line: int,
+    end_line: Optional[int],
+    content: str,
+    expected: Optional[str] = None
+) -> Edit:
+    """
+    Replace lines start_line..end_line (1-based, inclusive) with content
+
+    end_line defaults to start_line; end_line = start_line - 1 inserts before
+    start_line without removing anything, and empty content deletes the range.
+    When expected is given, the range must currently hold exactly that text.
+    """
+    end_line = start_line if end_line is None else end_line
+    if start_line < 1 or end_line < start_line - 1:
+        raise PatchError(f"Invalid line range {start_line}-{end_line}")
+    return Edit(
+        start_line - 1,
+        end_line,
+        content.splitlines(),
+        None if expected is None else expected.splitlines()
+    )
+
+
+def apply_edits(source: BinaryIO, destination: BinaryIO, edits: List[Edit], chunk_size: int = 1024 * 1024):
+    """
+    Stream source to destination with the edits applied
+
+    Only the lines inside a hunk are decoded and held in memory; everything
+    between and after hunks is copied through unchanged. New lines use the
+    file's own line ending.
+    """
+    edits = sorted(edits, key=lambda edit: (edit.start, edit.end))
+    for previous, edit in zip(edits, edits[1:]):
+        if edit.start < previous.end:
+            raise PatchError(f"Hunks at lines {previous.start + 1} and {edit.start + 1} overlap")
+
+    line_number = 0
+    newline = b"\n"
+    unterminated = False  # The last line written has no line ending yet
+
+    def write_line(data: bytes):
+        nonlocal unterminated
+        if unterminated:
+            destination.write(newline)
+        destination.write(data)
+        unterminated = not data.endswith(b"\n")
+
+    def read_line(missing_message: str) -> bytes:
+        nonlocal newline, line_number
+        line = source.readline()
+        if not line:
+            raise PatchError(missing_message)
+        if line.endswith(b"\r\n"):
+            newline = b"\r\n"
+        line_number += 1
+        return line
+
+    for edit in edits:
+        while line_number < edit.start:
+            write_line(read_line(f"Line {edit.start + 1} is past the end of the file"))
+
+        old_lines = []
+        old_terminated = True
+        while line_number < edit.end:
+            line = read_line(f"Lines {edit.start + 1}-{edit.end} are past the end of the file")
+            old_terminated = line.endswith(b"\n")
+            old_lines.append(line.rstrip(b"\r\n").decode("utf-8", errors="replace"))
+
+        if edit.expected is not None and old_lines != edit.expected:
+            raise PatchError(f"Hunk at line {edit.start + 1} does not match the file")
+
+        no_newline_at_end = edit.no_newline_at_end
+        if no_newline_at_end is None:
+            no_newline_at_end = not old_terminated
+        for index, text in enumerate(edit.new_lines):
+            last = index == len(edit.new_lines) - 1
+            write_line(text.encode("utf-8") + (b"" if last and no_newline_at_end else newline))
+
+    # Everything after the last hunk is copied verbatim
+    chunk = source.read(chunk_size)
+    if chunk:
+        if unterminated:
+            destination.write(newline)
+        destination.write(chunk)
+        shutil.copyfileobj(source, destination, chunk_size)
+
+
+def patch_to_temp(path: Path, edits: List[Edit], durable: bool = True) -> Path:
+    """
+    Write the patched file to a temporary file beside it
+
+    The caller moves the result into place with os.replace, so readers see
+    either the old or the new file and a failed patch leaves it untouched.
+    """
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".patch")
+    temp_path = Path(temp_name)
+    try:
+        with os.fdopen(fd, "wb") as destination, open(path, "rb") as source:
+            apply_edits(source, destination, edits)
+            if durable:
+                destination.flush()
+                os.fsync(destination.fileno())
+        shutil.copymode(path, temp_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return temp_path
@@ -1,34 +1,107 @@
+import copy
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional, AsyncIterator, Awaitable, Callable
 from .llm_service import LLMService
+from .prompt_cache import PromptCache
+from .single_flight import SingleFlight
+from .operation_stream_parser import OperationStreamParser
+from .response_parser import clean_operations
+from .prompt_rules import match_rules
 from ..config import Settings
 
 logger = logging.getLogger(__name__)
 
 class PromptProcessor:
-    """Process natural language prompts for file operations using LLM only"""
+    """
+    Process natural language prompts for file operations
     
-    def __init__(self):
-        self.settings = Settings()
-        self.llm_service = LLMService(self.settings)
+    Unambiguous single-operation prompts are parsed by rules; everything
+    else goes to the LLM.
+    """
     
-    async def process_prompt(self, prompt: str, workspace_path: str = None) -> Dict[str, Any]:
+    def __init__(self, settings: Optional[Settings] = None, llm_service: Optional[LLMService] = None):
+        self.settings = settings or Settings()
+        self.llm_service = llm_service or LLMService(self.settings)
+        self.prompt_cache = PromptCache(
+            max_entries=self.settings.prompt_cache_max_entries,
+            ttl_seconds=self.settings.prompt_cache_ttl
+        )
+        # Identical prompts for the same workspace share one pending LLM call
+        self.single_flight = SingleFlight()
+        self.rule_hits = 0
+    
+    @property
+    def cache_enabled(self) -> bool:
+        """Replaying cached operations is only safe for deterministic sampling"""
+        return self.settings.prompt_cache_enabled and self.settings.llm_temperature == 0
+    
+    def _match_rules(self, prompt: str) -> Optional[Dict[str, Any]]:
+        """Rule-based result for trivial prompts, or None to ask the LLM"""
+        if not self.settings.prompt_rules_enabled:
+            return None
+        result = match_rules(prompt)
+        if result is not None:
+            self.rule_hits += 1
+            logger.info(f"Prompt handled by rules: {prompt}")
+        return result
+    
+    @staticmethod
+    def _build_context(workspace_path: str = None, workspace_summary: str = "") -> Dict[str, Any]:
+        """What the LLM sees besides the prompt; also the cache fingerprint"""
+        context = {"workspace_path": workspace_path} if workspace_path else {}
+        if workspace_summary:
+            context["workspace_summary"] = workspace_summary
+        return context
+    
+    async def process_prompt(
+        self,
+        prompt: str,
+        workspace_path: str = None,
+        workspace_summary: str = "",
+        load_summary: Optional[Callable[[], Awaitable[str]]] = None
+    ) -> Dict[str, Any]:
         """
         Process a natural language prompt and return structured operations
         
         Args:
             prompt: Natural language prompt describing file operations
             workspace_path: Path to the workspace (optional)
+            workspace_summary: Existing files, as built by
+                FileSystemService.workspace_snapshot (optional)
+            load_summary: Builds workspace_summary instead; only awaited
+                when the prompt goes to the LLM (optional)
             
         Returns:
             Dictionary with parsed operations and metadata
         """
-        context = {"workspace_path": workspace_path} if workspace_path else {}
+        result = self._match_rules(prompt)
+        if result is not None:
+            return result
         
-        try:
+        if load_summary is not None:
+            workspace_summary = await load_summary()
+        context = self._build_context(workspace_path, workspace_summary)
+        
+        request_key = self.prompt_cache.make_key(prompt, context)
+        if self.cache_enabled:
+            cached = self.prompt_cache.get(request_key)
+            if cached is not None:
+                logger.info(f"Prompt cache hit for: {prompt}")
+                cached["method"] = "cache"
+                return cached
+        
+        async def call_llm() -> Dict[str, Any]:
             # Process with LLM only
             result = await self.llm_service.process_prompt(prompt, context)
+            # Salvaged (partial) results aren't worth replaying
+            if self.cache_enabled and result.get("method") == "llm" and not result.get("error") and not result.get("partial"):
+                self.prompt_cache.set(request_key, result)
             return result
+        
+        try:
+            result = await self.single_flight.do(request_key, call_llm)
+            # Coalesced callers each get their own copy of the shared result
+            return copy.deepcopy(result)
             
         except Exception as e:
             logger.error(f"Error processing prompt: {e}")
@@ -39,6 +112,99 @@ class PromptProcessor:
                 "method": "error"
             }
     
+    async def stream_operations(
+        self,
+        prompt: str,
+        workspace_path: str = None,
+        workspace_summary: str = "",
+        load_summary: Optional[Callable[[], Awaitable[str]]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a prompt against the streaming LLM endpoint
+        
+        Args:
+            prompt: Natural language prompt describing file operations
+            workspace_path: Path to the workspace (optional)
+            workspace_summary: Existing files in the workspace (optional)
+            load_summary: Builds workspace_summary instead; only awaited
+                when the prompt goes to the LLM (optional)
+            
+        Yields:
+            {"event": "operation", "operation": {...}} as soon as each
+            operation is parsed, then one {"event": "result", "result": {...}}
+            with the full parsed response
+        """
+        result = self._match_rules(prompt)
+        if result is not None:
+            for operation in result["operations"]:
+                yield {"event": "operation", "operation": operation}
+            yield {"event": "result", "result": result}
+            return
+        
+        if load_summary is not None:
+            workspace_summary = await load_summary()
+        context = self._build_context(workspace_path, workspace_summary)
+        request_key = self.prompt_cache.make_key(prompt, context)
+        
+        if self.cache_enabled:
+            cached = self.prompt_cache.get(request_key)
+            if cached is not None:
+                logger.info(f"Prompt cache hit for: {prompt}")
+                cached["method"] = "cache"
+                for operation in cached.get("operations", []):
+                    yield {"event": "operation", "operation": operation}
+                yield {"event": "result", "result": cached}
+                return
+        
+        parser = OperationStreamParser()
+        try:
+            async for chunk in self.llm_service.stream_prompt(prompt, context):
+                for operation in clean_operations(parser.feed(chunk)):
+                    yield {"event": "operation", "operation": operation}
+        except Exception as e:
+            logger.error(f"Error streaming prompt: {e}")
+            result = parser.finish()
+            result["operations"] = clean_operations(result["operations"])
+            result.update({
+                "method": "llm" if parser.operations else "none",
+                "error": str(e)
+            })
+            yield {"event": "result", "result": result}
+            return
+        
+        result = parser.finish()
+        result["operations"] = clean_operations(result["operations"])
+        result["method"] = "llm"
+        if not parser.found_json:
+            result["error"] = "Invalid JSON response from LLM"
+        elif result.get("partial") and not result["operations"]:
+            result["error"] = "Incomplete JSON response from LLM"
+        elif self.cache_enabled and not result.get("partial"):
+            # Same rule as process_prompt: only complete, cleanly parsed responses
+            self.prompt_cache.set(request_key, result)
+        yield {"event": "result", "result": result}
+    
     async def is_llm_available(self) -> bool:
         """Check if LLM service is available"""
-        return await self.llm_service.is_available() 
\ No newline at end of file
+        return await self.llm_service.is_available()
+    
+    def llm_health(self) -> Dict[str, Any]:
+        """Cached LLM availability; never waits on the provider"""
+        return self.llm_service.health_status()
+    
+    def routing_stats(self) -> Dict[str, Any]:
+        """LLM backend and small/large model routing counters"""
+        return self.llm_service.routing_stats()
+    
+    def resilience_stats(self) -> Dict[str, Any]:
+        """LLM circuit breaker and retry budget state"""
+        return self.llm_service.resilience_stats()
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Prompt cache counters"""
+        return {
+            "enabled": self.cache_enabled,
+            **self.prompt_cache.stats(),
+            "single_flight": self.single_flight.stats(),
+            "rule_hits": self.rule_hits
+        } 
\ No newline at end of file
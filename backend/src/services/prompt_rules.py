@@ -0,0 +1,129 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# A path is either quoted, or a bare token with a file extension, so that
+# "delete everything" or "rename the config" are left to the LLM
+_PATH = r"""(?:"(?P<{0}_dq>[^"]+)"|'(?P<{0}_sq>[^']+)'|`(?P<{0}_bt>[^`]+)`|(?P<{0}_bare>[\w\-./]*\w\.\w+))"""
+_QUERY = r"""(?:"(?P<query_dq>[^"]+)"|'(?P<query_sq>[^']+)'|`(?P<query_bt>[^`]+)`|(?P<query_bare>\S+))"""
+_WORKSPACE = r"(?: (?:in|of) (?:the |this |my )?(?:workspace|directory|folder|project))?"
+_FILE = r"(?: the)?(?: (?:file|files))?"
+
+_POLITE_PREFIX = re.compile(r"^(?:(?:please|can you|could you|would you|kindly)\s+)+", re.IGNORECASE)
+_POLITE_SUFFIX = re.compile(r"[\s,]*(?:please|thanks|thank you)?[\s.!?]*$", re.IGNORECASE)
+
+
+def _path(name: str) -> str:
+    return _PATH.format(name)
+
+
+def _group(match: "re.Match", name: str) -> Optional[str]:
+    for suffix in ("dq", "sq", "bt", "bare"):
+        value = match.group(f"{name}_{suffix}")
+        if value is not None:
+            return value.strip()
+    return None
+
+
+def _list(match: "re.Match") -> Dict[str, Any]:
+    return {"type": "list", "target": ".", "description": "List files in the workspace"}
+
+
+def _delete_all(match: "re.Match") -> Dict[str, Any]:
+    return {"type": "delete", "target": "*", "description": "Delete all files in the workspace"}
+
+
+def _delete(match: "re.Match") -> Dict[str, Any]:
+    target = _group(match, "target")
+    return {"type": "delete", "target": target, "description": f"Delete {target}"}
+
+
+def _rename(match: "re.Match") -> Dict[str, Any]:
+    target, new_name = _group(match, "target"), _group(match, "new")
+    return {"type": "rename", "target": target, "new_name": new_name, "description": f"Rename {target} to {new_name}"}
+
+
+def _read(match: "re.Match") -> Dict[str, Any]:
+    target = _group(match, "target")
+    return {"type": "read", "target": target, "description": f"Read {target}"}
+
+
+def _create_empty(match: "re.Match") -> Dict[str, Any]:
+    # Like touch(1), an existing file keeps its content
+    target = _group(match, "target")
+    return {
+        "type": "create",
+        "target": target,
+        "content": "",
+        "overwrite": False,
+        "description": f"Create empty file {target}"
+    }
+
+
+def _search(match: "re.Match") -> Dict[str, Any]:
+    query = _group(match, "query")
+    scope = _group(match, "target") or "."
+    return {"type": "search", "target": scope, "query": query, "description": f"Search for '{query}'"}
+
+
+_RULES: List[Tuple[str, "re.Pattern", Callable[["re.Match"], Dict[str, Any]]]] = [
+    ("list", re.compile(
+        rf"(?:list|ls)(?: (?:all|the|my|of the))*(?: files| contents)?{_WORKSPACE}"
+        rf"|(?:show|display)(?: me)?(?: (?:all|the|my))* files{_WORKSPACE}"
+        rf"|what files (?:are there|do i have|exist|are in (?:the |this |my )?(?:workspace|directory|folder|project))",
+        re.IGNORECASE
+    ), _list),
+    ("delete_all", re.compile(
+        rf"(?:delete|remove) (?:all|every)(?: (?:the|of the|my))? files{_WORKSPACE}",
+        re.IGNORECASE
+    ), _delete_all),
+    ("delete", re.compile(rf"(?:delete|remove|rm){_FILE} {_path('target')}", re.IGNORECASE), _delete),
+    ("rename", re.compile(
+        rf"(?:rename|move|mv){_FILE} {_path('target')} (?:to|as|into) {_path('new')}",
+        re.IGNORECASE
+    ), _rename),
+    ("read", re.compile(
+        rf"(?:read|show|display|cat|print|open)(?: me)?(?: the)?(?: (?:contents?|text) of)?{_FILE} {_path('target')}",
+        re.IGNORECASE
+    ), _read),
+    ("create", re.compile(
+        rf"(?:create|make|touch)(?: an?| the)?(?: new)?(?: empty| blank)?(?: file)?(?: (?:called|named))? {_path('target')}",
+        re.IGNORECASE
+    ), _create_empty),
+    ("search", re.compile(
+        rf"(?:search(?: for)?|grep(?: for)?|find (?:the )?(?:text|string|word)) {_QUERY}(?: in {_path('target')})?",
+        re.IGNORECASE
+    ), _search),
+]
+
+
+def _normalise(prompt: str) -> str:
+    text = " ".join(prompt.split())
+    text = _POLITE_PREFIX.sub("", text)
+    return _POLITE_SUFFIX.sub("", text)
+
+
+def match_rules(prompt: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse an unambiguous single-operation prompt without the LLM
+
+    Each rule must match the whole prompt (politeness words and trailing
+    punctuation aside), so anything with extra detail, like content to
+    write or more than one step, is left to the LLM.
+
+    Returns:
+        The same structure LLMService.process_prompt produces, with
+        method "rules", or None when no rule applies
+    """
+    text = _normalise(prompt)
+    if not text or len(text) > 300:
+        return None
+    for name, pattern, build in _RULES:
+        match = pattern.fullmatch(text)
+        if match:
+            return {
+                "operations": [build(match)],
+                "confidence": 1.0,
+                "reasoning": f"Matched the '{name}' rule",
+                "method": "rules"
+            }
+    return None
@@ -0,0 +1,38 @@
+import logging
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceededError(Exception):
+    """Raised when a write would take a workspace past its configured limits"""
+
+
+class UploadQuota:
+    """Byte and file budget shared by the concurrent writers of one upload"""
+
+    def __init__(self, max_total_bytes: int, max_files: int, used_bytes: int = 0, used_files: int = 0):
+        self.max_total_bytes = max_total_bytes
+        self.max_files = max_files
+        self.total_bytes = used_bytes
+        self.files = used_files
+
+    def reserve_file(self):
+        """Claim a slot for one more file"""
+        if self.files + 1 > self.max_files:
+            raise QuotaExceededError(f"Workspace file limit of {self.max_files} files exceeded")
+        self.files += 1
+
+    def release_file(self, size: int):
+        """Give back a file slot and its bytes, e.g. after rejecting the file"""
+        self.files -= 1
+        self.total_bytes -= size
+
+    def consume(self, size: int):
+        """Account for bytes about to be written"""
+        if self.total_bytes + size > self.max_total_bytes:
+            raise QuotaExceededError(f"Workspace size limit of {self.max_total_bytes} bytes exceeded")
+        self.total_bytes += size
+
+    def stats(self) -> Dict[str, Any]:
+        return {"files": self.files, "bytes": self.total_bytes}
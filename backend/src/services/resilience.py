@@ -0,0 +1,276 @@
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency that is currently failing"""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a dependency is unhealthy
+
+    Tracks the outcome of the most recent calls. Once at least min_calls are
+    recorded and the failure ratio reaches failure_ratio, the circuit opens
+    and calls are rejected for open_seconds. After that a single trial call
+    is let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(
+        self,
+        failure_ratio: float = 0.5,
+        min_calls: int = 10,
+        window: int = 50,
+        open_seconds: float = 30.0
+    ):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self._outcomes: deque = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self.rejected = 0
+        # time.monotonic() of the latest outcomes, for health reporting
+        self.last_success_at: Optional[float] = None
+        self.last_failure_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.open_seconds:
+            return "open"
+        return "half_open"
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a trial call through"""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def release(self):
+        """A call ended without saying anything about the dependency's health"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.last_success_at = time.monotonic()
+        if self._opened_at is not None:
+            logger.info("Circuit closed after a successful trial call")
+            self._opened_at = None
+            self._outcomes.clear()
+        self._trial_in_flight = False
+        self._outcomes.append(True)
+
+    def record_failure(self):
+        self.last_failure_at = time.monotonic()
+        self._trial_in_flight = False
+        if self._opened_at is not None:
+            # Failed trial: stay open for another period
+            self._opened_at = time.monotonic()
+            return
+        self._outcomes.append(False)
+        failures = self._outcomes.count(False)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_ratio:
+            logger.warning(f"Circuit opened: {failures} of the last {len(self._outcomes)} calls failed")
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "recent_calls": len(self._outcomes),
+            "recent_failures": self._outcomes.count(False),
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 1)
+        }
+
+
+class RetryBudget:
+    """
+    Retries shared by every request, as a fraction of request volume
+
+    Each request deposits ratio tokens and each retry or hedge spends one,
+    so retries can add at most that fraction of extra load however many
+    requests are failing at once. min_tokens keeps a little headroom for
+    low-traffic periods.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.max_tokens = max(max_tokens, min_tokens)
+        self._tokens = min_tokens
+        self.spent = 0
+        self.denied = 0
+
+    def deposit(self):
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self._tokens < 1:
+            self.denied += 1
+            return False
+        self._tokens -= 1
+        self.spent += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"tokens": round(self._tokens, 2), "spent": self.spent, "denied": self.denied}
+
+
+class LatencyTracker:
+    """Recent successful call durations, for picking the hedge delay"""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """None until there are enough samples to be meaningful"""
+        if len(self._samples) < 20:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ResilientCaller:
+    """
+    Run calls to a flaky dependency behind a circuit breaker, a shared retry
+    budget, an overall deadline and optional request hedging
+
+    Only exceptions listed as retryable count as dependency failures; others
+    (bad requests, authentication) are raised straight away.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker,
+        budget: RetryBudget,
+        retryable: Tuple[Type[BaseException], ...],
+        max_attempts: int = 3,
+        backoff: float = 0.25,
+        deadline: Optional[float] = None,
+        hedge: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay: float = 1.0
+    ):
+        self.breaker = breaker
+        self.budget = budget
+        self.retryable = retryable
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = LatencyTracker()
+        self.hedges = 0
+
+    def check(self):
+        """Raise CircuitOpenError if calls are currently being rejected"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"LLM circuit open; retry in {self.breaker.retry_after():.0f}s")
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], deadline: Optional[float] = None) -> Any:
+        """
+        Call fn, retrying retryable failures while budget and deadline allow
+        
+        Args:
+            fn: Makes one attempt
+            deadline: Seconds allowed for all attempts, when less than the
+                caller's own deadline (e.g. what is left of a larger one)
+
+        Raises:
+            CircuitOpenError: The circuit is open, so fn was not called
+            TimeoutError: The deadline passed
+        """
+        self.check()
+        self.budget.deposit()
+        if deadline is None or (self.deadline is not None and self.deadline < deadline):
+            deadline = self.deadline
+        try:
+            return await self._call(fn, deadline)
+        except TimeoutError:
+            self.breaker.record_failure()
+            raise
+
+    async def _call(self, fn: Callable[[], Awaitable[Any]], deadline: Optional[float]) -> Any:
+        async with asyncio.timeout(deadline):
+            attempt = 1
+            while True:
+                try:
+                    result = await (self._hedged(fn) if self.hedge else self._timed(fn))
+                except self.retryable as e:
+                    self.breaker.record_failure()
+                    if attempt >= self.max_attempts or not self.budget.withdraw():
+                        raise
+                    self.check()
+                    # Full jitter keeps concurrent retries from arriving in lockstep
+                    delay = random.uniform(0, self.backoff * 2 ** (attempt - 1))
+                    logger.warning(f"LLM call failed ({e}); retry {attempt} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                except BaseException:
+                    # Not the dependency's fault; free a half-open trial slot
+                    self.breaker.release()
+                    raise
+                self.breaker.record_success()
+                return result
+
+    async def _timed(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.perf_counter()
+        result = await fn()
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    async def _hedged(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Start a second copy of the call if the first is slower than usual"""
+        delay = self.latency.percentile(self.hedge_percentile)
+        delay = max(self.hedge_min_delay, delay) if delay is not None else None
+        first = asyncio.ensure_future(self._timed(fn))
+        if delay is None:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or not self.budget.withdraw():
+            return await first
+
+        self.hedges += 1
+        second = asyncio.ensure_future(self._timed(fn))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None or not pending:
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.percentile(0.95)
+        return {
+            "circuit": self.breaker.stats(),
+            "retry_budget": self.budget.stats(),
+            "hedges": self.hedges,
+            "p95_seconds": round(p95, 3) if p95 is not None else None
+        }
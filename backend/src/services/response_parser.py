@@ -0,0 +1,161 @@
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from .operation_stream_parser import OperationStreamParser, extract_fields, loads_lenient
+from .patch_service import PatchError, parse_unified_diff
+
+logger = logging.getLogger(__name__)
+
+OPERATION_TYPES = ["create", "edit", "patch", "delete", "rename", "list", "read", "search"]
+
+# Sent as the response_format schema when the provider supports structured output
+RESPONSE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "operations": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string", "enum": OPERATION_TYPES},
+                    "target": {"type": "string"},
+                    "content": {"type": "string"},
+                    "new_name": {"type": "string"},
+                    "start_line": {"type": "integer"},
+                    "end_line": {"type": "integer"},
+                    "expected": {"type": "string"},
+                    "query": {"type": "string"},
+                    "description": {"type": "string"}
+                },
+                "required": ["type", "target"]
+            }
+        },
+        "confidence": {"type": "number"},
+        "reasoning": {"type": "string"}
+    },
+    "required": ["operations", "confidence", "reasoning"]
+}
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def _first_response_object(text: str) -> Optional[Dict[str, Any]]:
+    """The first complete JSON object in text that has an operations list"""
+    decoder = json.JSONDecoder()
+    position = text.find("{")
+    while position != -1:
+        try:
+            value, _ = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            value = None
+        if isinstance(value, dict) and isinstance(value.get("operations"), list):
+            return value
+        position = text.find("{", position + 1)
+
+    # One outer object with a trailing comma somewhere inside
+    value = loads_lenient(text[text.find("{"):text.rfind("}") + 1])
+    if isinstance(value, dict) and isinstance(value.get("operations"), list):
+        return value
+    return None
+
+
+def clean_operations(operations: List[Any]) -> List[Dict[str, Any]]:
+    """Drop entries that can't be an operation and tidy the rest"""
+    cleaned = []
+    for operation in operations:
+        if not isinstance(operation, dict) or not isinstance(operation.get("type"), str):
+            continue
+        operation = dict(operation)
+        operation["type"] = operation["type"].strip().lower()
+        cleaned.append(operation)
+    return cleaned
+
+
+def _patch_problem(operation: Dict[str, Any]) -> Optional[str]:
+    """Why a patch can't be applied safely, or None; hunks and line ranges must carry the old text"""
+    if operation.get("start_line") is not None:
+        if not isinstance(operation["start_line"], int):
+            return "patch with a non-integer start_line"
+        if not isinstance(operation.get("expected"), str):
+            return "line-range patch without expected"
+        return None
+    try:
+        parse_unified_diff(operation.get("content") or "")
+    except PatchError as e:
+        return f"patch without a usable unified diff ({e})"
+    return None
+
+
+def validate_operations(operations: List[Dict[str, Any]]) -> List[str]:
+    """
+    Check parsed operations against RESPONSE_SCHEMA and the fields each type needs
+
+    Returns:
+        One short message per problem; empty when every operation is usable
+    """
+    problems = []
+    for index, operation in enumerate(operations):
+        op_type = operation["type"]
+        target = operation.get("target")
+        if op_type not in OPERATION_TYPES:
+            problems.append(f"operation {index}: unknown type {op_type!r}")
+        elif op_type not in ("list", "search") and not (isinstance(target, str) and target.strip()):
+            problems.append(f"operation {index}: {op_type} without a target")
+        elif op_type == "rename" and not operation.get("new_name"):
+            problems.append(f"operation {index}: rename without new_name")
+        elif op_type == "search" and not (operation.get("query") or operation.get("content")):
+            problems.append(f"operation {index}: search without a query")
+        elif op_type == "patch":
+            problem = _patch_problem(operation)
+            if problem:
+                problems.append(f"operation {index}: {problem}")
+    return problems
+
+
+def parse_llm_response(text: str) -> Dict[str, Any]:
+    """
+    Parse an LLM completion into {"operations", "confidence", "reasoning"}
+
+    Tries, cheapest first: the whole text as JSON (the JSON-mode case), the
+    first JSON object carrying an operations list (prose or code fences
+    around it), and finally salvaging every well-formed operation object on
+    its own, which copes with truncated output and a single bad entry.
+    Salvaged results are flagged "partial"; "error" is set when the output
+    contains no JSON object at all or nothing could be salvaged from it.
+    """
+    stripped = _CODE_FENCE.sub("", text.strip())
+
+    value = loads_lenient(stripped)
+    if not (isinstance(value, dict) and isinstance(value.get("operations"), list)):
+        value = _first_response_object(stripped)
+
+    if value is not None:
+        result = dict(value)
+        result["operations"] = clean_operations(value["operations"])
+    else:
+        parser = OperationStreamParser()
+        parser.feed(stripped)
+        if not parser.found_json:
+            return {
+                "operations": [],
+                "confidence": 0.0,
+                "reasoning": "Failed to parse LLM response as JSON",
+                "error": "Invalid JSON response from LLM"
+            }
+        result = extract_fields(stripped)
+        result["operations"] = clean_operations(parser.operations)
+        result["partial"] = True
+        if not result["operations"]:
+            # Nothing usable, e.g. cut off inside the first operation
+            result["error"] = "Incomplete JSON response from LLM"
+        logger.warning(f"Salvaged {len(result['operations'])} operations from malformed LLM output")
+
+    try:
+        result["confidence"] = min(1.0, max(0.0, float(result.get("confidence", 0.0))))
+    except (TypeError, ValueError):
+        result["confidence"] = 0.0
+    if not isinstance(result.get("reasoning"), str):
+        result["reasoning"] = str(result.get("reasoning") or "")
+    return result
@@ -0,0 +1,425 @@
+import os
+import time
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SNIPPET_WIDTH = 200
+
+# Rough bookkeeping cost of one posting list (dict slot, key, array header)
+# and of one file (path string, id and stamp entries), for SearchIndex.nbytes
+_TRIGRAM_OVERHEAD = 200
+_FILE_OVERHEAD = 300
+
+
+def _trigrams(data: bytes) -> Set[Tuple[int, int, int]]:
+    return set(zip(data, data[1:], data[2:]))
+
+
+def _is_text(path: Path) -> bool:
+    """Whether a file looks like text, judging by its first 8 KB"""
+    try:
+        with open(path, "rb") as f:
+            return b"\0" not in f.read(8192)
+    except OSError:
+        return False
+
+
+def _contains(file_ids: array, file_id: int) -> bool:
+    """Membership test for a sorted posting array"""
+    position = bisect_left(file_ids, file_id)
+    return position < len(file_ids) and file_ids[position] == file_id
+
+
+def _read_text(path: Path, max_file_size: int) -> Optional[str]:
+    """Text of a file worth indexing, or None for binary, oversized or unreadable files"""
+    try:
+        if path.stat().st_size > max_file_size:
+            return None
+        data = path.read_bytes()
+    except OSError:
+        return None
+    if b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+def _iter_files(root: Path, relative_root: str = "") -> Iterator[Tuple[Path, str]]:
+    """Regular files under root with their workspace-relative paths; symlinks are skipped"""
+    for directory, dirnames, filenames in os.walk(root):
+        relative_dir = os.path.relpath(directory, root)
+        prefix = relative_root if relative_dir == "." else os.path.join(relative_root, relative_dir)
+        for filename in filenames:
+            path = Path(directory) / filename
+            if not path.is_symlink():
+                yield path, Path(prefix, filename).as_posix()
+
+
+def _snippet(line: str, position: int, length: int) -> str:
+    """Trim a long line to a window around the match"""
+    if len(line) <= SNIPPET_WIDTH:
+        return line
+    start = max(0, min(position - (SNIPPET_WIDTH - length) // 2, len(line) - SNIPPET_WIDTH))
+    return line[start:start + SNIPPET_WIDTH]
+
+
+class SearchIndex:
+    """
+    Trigram index over the text files of one workspace
+
+    Every file gets a small integer id, and every three-byte substring of
+    its lower-cased UTF-8 text maps to a sorted array of the ids of the
+    files containing it. A query can only occur in files containing all of
+    its trigrams, so intersecting those arrays narrows thousands of files
+    to a few candidates, which are then scanned for the exact matches.
+
+    Files above max_index_file_size are not indexed but scanned on every
+    search, and an index that would grow past max_bytes gives up on its
+    postings and scans every file, so one workspace can't exhaust memory.
+
+    The index is built on the first search. After that, writes only mark
+    their paths dirty, and dirty paths are re-read before the next search,
+    so the write path never pays for indexing. A re-read file gets a new
+    id; the old one stays in the posting arrays, ignored, until dead ids
+    make up half of them and the arrays are compacted.
+
+    Writes made by other worker processes never reach mark_dirty, so an
+    index can also be marked stale (see SearchIndexCache). The next search
+    then compares every file's size and mtime with what was indexed and
+    re-reads only the files that changed.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_file_size: int = 1024 * 1024,
+        max_index_file_size: int = 256 * 1024,
+        max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.root = root
+        self.max_file_size = max_file_size
+        self.max_index_file_size = max_index_file_size
+        self.max_bytes = max_bytes
+        self._postings: Dict[Tuple[int, int, int], array] = defaultdict(lambda: array("I"))
+        # Indexed by file id; removed files leave None behind until compaction
+        self._paths: List[Optional[str]] = []
+        self._trigram_counts = array("I")
+        self._ids: Dict[str, int] = {}
+        # Ids of files too large to index, which every search scans
+        self._unindexed: Set[int] = set()
+        # Posting entries in total, and those belonging to removed files
+        self._entries = 0
+        self._dead_entries = 0
+        self._overflowed = False
+        self._dirty: Set[str] = set()
+        # (size, mtime_ns) of every file seen, indexed or not, for resync()
+        self._stamps: Dict[str, Tuple[int, int]] = {}
+        self._stale = False
+        self._verified_at = 0.0
+        self._built = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def age(self) -> float:
+        """Seconds since the index was last built or checked against the disk"""
+        return time.monotonic() - self._verified_at
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the index"""
+        return (
+            self._entries * self._trigram_counts.itemsize
+            + len(self._postings) * _TRIGRAM_OVERHEAD
+            + len(self._paths) * _FILE_OVERHEAD
+        )
+
+    def mark_stale(self):
+        """Check every file against the disk before the next search"""
+        if self._built:
+            self._stale = True
+
+    def mark_dirty(self, relative_path: str):
+        """Note that a file or directory changed; it is re-read before the next search"""
+        if self._built:
+            self._dirty.add(relative_path)
+
+    def _add(self, relative_path: str, text: Optional[str]):
+        """Give a file an id and index its text; None means scan it on every search instead"""
+        file_id = len(self._paths)
+        self._paths.append(relative_path)
+        self._ids[relative_path] = file_id
+        if text is None:
+            self._unindexed.add(file_id)
+            self._trigram_counts.append(0)
+            return
+        if self._overflowed:
+            self._trigram_counts.append(0)
+            return
+
+        trigrams = _trigrams(text.lower().encode("utf-8"))
+        for trigram in trigrams:
+            self._postings[trigram].append(file_id)
+        self._trigram_counts.append(len(trigrams))
+        self._entries += len(trigrams)
+        if self.nbytes > self.max_bytes:
+            logger.warning(
+                f"Search index for {self.root} grew past {self.max_bytes} bytes; "
+                f"searches will scan every file instead"
+            )
+            self._overflowed = True
+            self._postings.clear()
+            self._entries = self._dead_entries = 0
+
+    def _remove(self, relative_path: str):
+        file_id = self._ids.pop(relative_path, None)
+        if file_id is None:
+            return
+        self._paths[file_id] = None
+        self._unindexed.discard(file_id)
+        if not self._overflowed:
+            self._dead_entries += self._trigram_counts[file_id]
+
+    def _compact(self):
+        """Drop removed files from the posting arrays, renumbering the rest in order"""
+        renumbered = {}
+        paths = []
+        trigram_counts = array("I")
+        for file_id, relative_path in enumerate(self._paths):
+            if relative_path is not None:
+                renumbered[file_id] = len(paths)
+                paths.append(relative_path)
+                trigram_counts.append(self._trigram_counts[file_id])
+        for trigram in list(self._postings):
+            file_ids = array("I", [renumbered[f] for f in self._postings[trigram] if f in renumbered])
+            if file_ids:
+                self._postings[trigram] = file_ids
+            else:
+                del self._postings[trigram]
+        self._paths = paths
+        self._trigram_counts = trigram_counts
+        self._ids = {relative_path: file_id for file_id, relative_path in enumerate(paths)}
+        self._unindexed = {renumbered[f] for f in self._unindexed}
+        self._entries -= self._dead_entries
+        self._dead_entries = 0
+
+    def _index_file(self, path: Path, relative_path: str):
+        try:
+            stat = path.stat()
+        except OSError:
+            return
+        self._stamps[relative_path] = (stat.st_size, stat.st_mtime_ns)
+        if stat.st_size > self.max_index_file_size:
+            if stat.st_size <= self.max_file_size and _is_text(path):
+                self._add(relative_path, None)
+            return
+        text = _read_text(path, self.max_file_size)
+        if text is not None:
+            self._add(relative_path, text)
+
+    def _index_tree(self, root: Path, relative_root: str = ""):
+        for path, relative_path in _iter_files(root, relative_root):
+            self._index_file(path, relative_path)
+
+    def _build(self):
+        started = time.perf_counter()
+        self._postings.clear()
+        self._paths = []
+        self._trigram_counts = array("I")
+        self._ids = {}
+        self._unindexed = set()
+        self._entries = self._dead_entries = 0
+        self._overflowed = False
+        self._stamps.clear()
+        self._index_tree(self.root)
+        logger.info(
+            f"Indexed {len(self._ids)} files in {self.root} "
+            f"in {(time.perf_counter() - started) * 1000:.0f}ms ({self.nbytes} bytes)"
+        )
+
+    def _reindex(self, relative_paths: Set[str]):
+        """Bring changed files, or whole changed directories, up to date"""
+        for relative_path in relative_paths:
+            prefix = relative_path + "/"
+            for known in [p for p in self._stamps if p == relative_path or p.startswith(prefix)]:
+                self._remove(known)
+                del self._stamps[known]
+
+            full_path = self.root / relative_path
+            if full_path.is_symlink():
+                continue
+            if full_path.is_file():
+                self._index_file(full_path, relative_path)
+            elif full_path.is_dir():
+                self._index_tree(full_path, relative_path)
+
+        dead_files = len(self._paths) - len(self._ids)
+        if self._dead_entries * 2 > self._entries or dead_files > len(self._ids) + 1024:
+            self._compact()
+
+    def _resync(self):
+        """Re-read files whose size or mtime changed, and forget deleted ones"""
+        started = time.perf_counter()
+        seen = set()
+        changed = set()
+        for path, relative_path in _iter_files(self.root):
+            seen.add(relative_path)
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if self._stamps.get(relative_path) != (stat.st_size, stat.st_mtime_ns):
+                changed.add(relative_path)
+        changed.update(p for p in self._stamps if p not in seen)
+        if changed:
+            self._reindex(changed)
+        logger.info(
+            f"Resynced search index for {self.root}: {len(changed)} changed files "
+            f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+
+    def _scan(self, relative_path: str, needle: str, limit: int) -> List[Dict[str, Any]]:
+        """Exact, case-insensitive matches in one candidate file"""
+        text = _read_text(self.root / relative_path, self.max_file_size)
+        if text is None:
+            return []
+        matches = []
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            position = line.lower().find(needle)
+            if position < 0:
+                continue
+            matches.append({
+                "path": relative_path,
+                "line": line_number,
+                "column": position + 1,
+                "snippet": _snippet(line, position, len(needle))
+            })
+            if len(matches) >= limit:
+                break
+        return matches
+
+    def _candidates(self, needle: str) -> List[str]:
+        """Paths of the files that may contain needle"""
+        trigrams = _trigrams(needle.encode("utf-8"))
+        if not trigrams or self._overflowed:
+            # Queries under three bytes can't use the index
+            return list(self._ids)
+        posting_arrays = sorted((self._postings.get(trigram, array("I")) for trigram in trigrams), key=len)
+        file_ids = set(posting_arrays[0])
+        for posting_array in posting_arrays[1:]:
+            if not file_ids:
+                break
+            file_ids = {f for f in file_ids if _contains(posting_array, f)}
+        file_ids |= self._unindexed
+        return [self._paths[f] for f in file_ids if self._paths[f] is not None]
+
+    def _search(self, query: str, scope: str, limit: int) -> Dict[str, Any]:
+        needle = query.lower()
+        candidates = self._candidates(needle)
+        if scope:
+            candidates = [p for p in candidates if p == scope or p.startswith(scope + "/")]
+
+        matches = []
+        truncated = False
+        for relative_path in sorted(candidates):
+            matches.extend(self._scan(relative_path, needle, limit - len(matches)))
+            if len(matches) >= limit:
+                truncated = True
+                break
+        return {
+            "matches": matches,
+            "files_indexed": len(self._ids),
+            "candidates": len(candidates),
+            "truncated": truncated
+        }
+
+    async def search(self, query: str, scope: str = "", limit: int = 50) -> Dict[str, Any]:
+        """
+        Find lines containing query, case-insensitively
+
+        Args:
+            query: Literal text to look for
+            scope: Workspace-relative directory to search under; "" for all
+            limit: Maximum number of matching lines to return
+
+        Returns:
+            Dictionary with "matches" (path, line, column, snippet), the
+            number of files indexed and candidates scanned, and whether the
+            results were cut off at limit
+        """
+        async with self._lock:
+            if not self._built:
+                # Paths written during the build are picked up next time
+                self._built = True
+                self._dirty.clear()
+                self._stale = False
+                self._verified_at = time.monotonic()
+                await asyncio.to_thread(self._build)
+            elif self._stale:
+                # Covers any dirty paths too
+                self._stale = False
+                self._dirty.clear()
+                self._verified_at = time.monotonic()
+                await asyncio.to_thread(self._resync)
+            elif self._dirty:
+                dirty, self._dirty = self._dirty, set()
+                await asyncio.to_thread(self._reindex, dirty)
+            return await asyncio.to_thread(self._search, query, scope, limit)
+
+
+class SearchIndexCache:
+    """
+    Search indexes of recently searched workspaces, within a memory budget
+
+    When the indexes together take more than max_bytes, the least recently
+    searched are evicted. An index not checked against the disk for max_age
+    seconds is resynced before its next search, so files written by other
+    workers show up within that time.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_file_size: int = 1024 * 1024,
+        max_index_file_size: int = 256 * 1024,
+        max_age: float = 30
+    ):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.max_index_file_size = max_index_file_size
+        self.max_age = max_age
+        self._indexes: "OrderedDict[str, SearchIndex]" = OrderedDict()
+
+    def get(self, workspace_id: str, root: Path) -> SearchIndex:
+        """Return the workspace's index, creating an unbuilt one if needed"""
+        index = self._indexes.get(workspace_id)
+        if index is None:
+            index = SearchIndex(root, self.max_file_size, self.max_index_file_size, self.max_bytes)
+            self._indexes[workspace_id] = index
+        elif index.age > self.max_age:
+            index.mark_stale()
+        self._indexes.move_to_end(workspace_id)
+        self.trim()
+        return index
+
+    def trim(self):
+        """Evict the least recently searched indexes until the rest fit in max_bytes"""
+        total = sum(index.nbytes for index in self._indexes.values())
+        while total > self.max_bytes and len(self._indexes) > 1:
+            _, index = self._indexes.popitem(last=False)
+            total -= index.nbytes
+
+    def mark_dirty(self, workspace_id: str, relative_path: str):
+        """Forward a write to the workspace's index, if it has one"""
+        index = self._indexes.get(workspace_id)
+        if index is not None:
+            index.mark_dirty(relative_path)
+
+    def drop(self, workspace_id: str):
+        """Forget a workspace's index entirely; it is rebuilt on the next search"""
+        self._indexes.pop(workspace_id, None)
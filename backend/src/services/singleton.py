@@ -1,5 +1,29 @@
 from .file_system_service import FileSystemService
+from .llm_service import LLMService
+from .prompt_processor import PromptProcessor
 from ..config import Settings
 
 settings = Settings()
-file_system_service = FileSystemService(settings.workspaces_dir) 
\ No newline at end of file
+file_system_service = FileSystemService(
+    settings.workspaces_dir,
+    settings.max_concurrent_operations,
+    settings.workspace_registry_path or None,
+    settings.listing_cache_size,
+    settings.tree_walk_concurrency,
+    settings
+)
+
+# Shared across requests; the LLM client's connection pool is closed by the
+# app lifespan in main.py
+llm_service = LLMService(settings)
+prompt_processor = PromptProcessor(settings, llm_service)
+
+
+def get_file_system_service() -> FileSystemService:
+    """Dependency returning the file system service shared by every router"""
+    return file_system_service
+
+
+def get_prompt_processor() -> PromptProcessor:
+    """Dependency returning the shared prompt processor"""
+    return prompt_processor
@@ -0,0 +1,196 @@
+import os
+import uuid
+import shutil
+import logging
+import tempfile
+import itertools
+from pathlib import Path
+from typing import Callable, List, Set
+
+logger = logging.getLogger(__name__)
+
+# mkstemp creates files as 0600; new files should get the usual umask-based mode
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def fsync_directory(path: Path):
+    """Persist the directory entries of path (creates, renames, unlinks)"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_file(path: Path):
+    """Persist the contents of a file already written without fsync"""
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def write_atomic(path: Path, data: bytes, durable: bool = True):
+    """
+    Replace path with data in one rename
+
+    The data goes to a temporary file in the same directory first, so a
+    crash or cancelled request leaves either the old file or the complete
+    new one, never a truncated one. With durable set, the file and the
+    directory entry are fsynced before returning.
+    """
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            shutil.copymode(path, temp_name)
+        except FileNotFoundError:
+            os.chmod(temp_name, 0o666 & ~_UMASK)
+        os.replace(temp_name, path)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+    if durable:
+        fsync_directory(path.parent)
+
+
+def _missing_ancestors(path: Path) -> List[Path]:
+    """Directories above path that don't exist yet, deepest first"""
+    missing = []
+    parent = path.parent
+    while not parent.exists():
+        missing.append(parent)
+        parent = parent.parent
+    return missing
+
+
+def _remove_path(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def _remove_empty_directories(directories: List[Path]):
+    for directory in directories:
+        try:
+            directory.rmdir()
+        except OSError:
+            pass
+
+
+class Transaction:
+    """
+    Undo log and deferred fsync for a batch of file operations
+
+    Every mutation records how to reverse itself before touching the disk:
+    an overwritten file is hard-linked into a trash directory, a deleted
+    path is moved there instead of being removed, an append remembers the
+    old length and a new path is simply removed again. Nothing is copied,
+    so the log costs one link or rename per operation whatever the file
+    sizes. The trash lives next to the workspaces so every move is a rename
+    on the same filesystem.
+
+    Writes made inside a transaction skip their own fsync; commit() syncs
+    every written file and directory once, at the end of the batch.
+    Rollback covers failed or cancelled operations, not a crash mid-batch.
+    """
+
+    def __init__(self, trash_root: Path, durable: bool = True):
+        self.trash_dir = Path(trash_root) / uuid.uuid4().hex
+        self.durable = durable
+        self._undo: List[Callable[[], None]] = []
+        self._written_files: Set[Path] = set()
+        self._changed_directories: Set[Path] = set()
+        self._backup_names = itertools.count()
+
+    def _backup_path(self) -> Path:
+        self.trash_dir.mkdir(parents=True, exist_ok=True)
+        return self.trash_dir / str(next(self._backup_names))
+
+    def record_create(self, path: Path):
+        """path is about to be created; on rollback remove it and any parent directories made for it"""
+        created_directories = _missing_ancestors(path)
+
+        def undo():
+            _remove_path(path)
+            _remove_empty_directories(created_directories)
+
+        self._undo.append(undo)
+
+    def record_overwrite(self, path: Path):
+        """path is about to be replaced; keep the old inode so rollback can put it back"""
+        backup = self._backup_path()
+        try:
+            os.link(path, backup)
+        except OSError:
+            shutil.copy2(path, backup)
+        self._undo.append(lambda: os.replace(backup, path))
+
+    def record_append(self, path: Path):
+        """path is about to grow; rollback truncates it to its current length"""
+        size = path.stat().st_size
+        self._undo.append(lambda: os.truncate(path, size))
+
+    def record_rename(self, old_path: Path, new_path: Path):
+        """old_path is about to move to new_path"""
+        created_directories = _missing_ancestors(new_path)
+
+        def undo():
+            os.rename(new_path, old_path)
+            _remove_empty_directories(created_directories)
+
+        self._undo.append(undo)
+        self._changed_directories.update((old_path.parent, new_path.parent))
+        if old_path in self._written_files:
+            self._written_files.discard(old_path)
+            self._written_files.add(new_path)
+
+    def remove(self, path: Path):
+        """Delete path by moving it into the trash until commit"""
+        backup = self._backup_path()
+        os.rename(path, backup)
+        self._undo.append(lambda: os.rename(backup, path))
+        self._changed_directories.add(path.parent)
+
+    def mark_written(self, path: Path):
+        """Remember a file written without fsync, to be synced at commit"""
+        self._written_files.add(path)
+        self._changed_directories.add(path.parent)
+
+    def commit(self):
+        """Make the batch durable with one pass of fsyncs and drop the undo log"""
+        if self.durable:
+            for path in self._written_files:
+                try:
+                    fsync_file(path)
+                except FileNotFoundError:
+                    pass  # Written, then deleted or renamed later in the batch
+            for directory in self._changed_directories:
+                try:
+                    fsync_directory(directory)
+                except FileNotFoundError:
+                    pass
+        self._undo.clear()
+        shutil.rmtree(self.trash_dir, ignore_errors=True)
+
+    def rollback(self) -> int:
+        """
+        Undo every recorded mutation, newest first
+
+        Returns:
+            Number of undo steps that could not be applied
+        """
+        failures = 0
+        for undo in reversed(self._undo):
+            try:
+                undo()
+            except OSError as e:
+                failures += 1
+                logger.error(f"Rollback step failed: {e}")
+        self._undo.clear()
+        shutil.rmtree(self.trash_dir, ignore_errors=True)
+        return failures
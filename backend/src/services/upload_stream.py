@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Tuple
+
+try:
+    from python_multipart import MultipartParser
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:
+    # Releases before 0.0.13 install the package as "multipart"
+    from multipart import MultipartParser
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import parse_options_header
+
+logger = logging.getLogger(__name__)
+
+
+class StreamedUpload:
+    """
+    One file of a multipart upload, readable while the request body arrives
+
+    Provides the filename, read(size) and close() that save_uploads expects
+    from an UploadFile. Only a few chunks are buffered, so a slow disk
+    slows the client down instead of filling memory.
+    """
+
+    def __init__(self, filename: str, max_buffered_chunks: int = 4):
+        self.filename = filename
+        self._chunks: "asyncio.Queue[bytes]" = asyncio.Queue(max_buffered_chunks)
+        self._pending = b""
+        self._ended = False
+        self._discarded = False
+
+    async def read(self, size: int = -1) -> bytes:
+        """Up to size bytes (all buffered bytes if negative); b"" once the part has ended"""
+        if not self._pending and not self._ended:
+            chunk = await self._chunks.get()
+            if chunk:
+                self._pending = chunk
+            else:
+                self._ended = True
+        if size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    async def close(self):
+        """Stop reading; the rest of this part is received but thrown away"""
+        self._discarded = True
+        self._pending = b""
+        while not self._chunks.empty():
+            self._chunks.get_nowait()
+
+    async def _feed(self, data: bytes):
+        if not self._discarded:
+            await self._chunks.put(data)
+
+    async def _end(self):
+        if not self._discarded:
+            await self._chunks.put(b"")
+
+
+class MultipartUploadStream:
+    """
+    multipart/form-data request body parsed as it is received
+
+    Unlike Request.form(), nothing is spooled to temporary files: each file
+    part is handed out as a StreamedUpload as soon as its headers arrive,
+    and its data flows to whoever reads it. A caller that stops iterating,
+    e.g. because a quota was exceeded, stops receiving the body there.
+    Plain form fields are collected in fields.
+    """
+
+    def __init__(
+        self,
+        headers: Mapping[str, str],
+        stream: AsyncIterator[bytes],
+        max_fields: int = 100,
+        max_field_size: int = 64 * 1024
+    ):
+        self.headers = headers
+        self.stream = stream
+        self.max_fields = max_fields
+        self.max_field_size = max_field_size
+        self.fields: Dict[str, str] = {}
+
+    def _boundary(self) -> bytes:
+        content_type, options = parse_options_header(self.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in options:
+            raise ValueError("Expected a multipart/form-data body")
+        return options[b"boundary"]
+
+    async def uploads(self) -> AsyncIterator[StreamedUpload]:
+        """
+        Yield each file part as it begins, feeding it until the next one
+
+        Raises:
+            ValueError: The body is not valid multipart/form-data, or has
+                too many or too large form fields
+        """
+        # The parser's callbacks are synchronous, so they only record what
+        # happened; the events are acted on after each chunk
+        events: List[Tuple[str, Optional[bytes]]] = []
+        headers: Dict[bytes, bytes] = {}
+        header_name = bytearray()
+        header_value = bytearray()
+
+        def on_header_end():
+            headers[bytes(header_name).lower()] = bytes(header_value)
+            header_name.clear()
+            header_value.clear()
+
+        callbacks = {
+            "on_part_begin": lambda: headers.clear(),
+            "on_header_field": lambda data, start, end: header_name.extend(data[start:end]),
+            "on_header_value": lambda data, start, end: header_value.extend(data[start:end]),
+            "on_header_end": on_header_end,
+            "on_headers_finished": lambda: events.append(("part", headers.get(b"content-disposition", b""))),
+            "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+            "on_part_end": lambda: events.append(("end", None)),
+        }
+        parser = MultipartParser(self._boundary(), callbacks)
+
+        upload: Optional[StreamedUpload] = None
+        field_name: Optional[str] = None
+        field_value = bytearray()
+        try:
+            async for chunk in self.stream:
+                parser.write(chunk)
+                for event, data in events:
+                    if event == "part":
+                        _, options = parse_options_header(data)
+                        name = options.get(b"name", b"").decode("utf-8", errors="replace")
+                        if b"filename" in options:
+                            upload = StreamedUpload(options[b"filename"].decode("utf-8", errors="replace"))
+                            yield upload
+                        else:
+                            if len(self.fields) >= self.max_fields:
+                                raise ValueError(f"More than {self.max_fields} form fields")
+                            field_name = name
+                    elif event == "data":
+                        if upload is not None:
+                            await upload._feed(data)
+                        else:
+                            field_value.extend(data)
+                            if len(field_value) > self.max_field_size:
+                                raise ValueError(f"Form field {field_name!r} exceeds {self.max_field_size} bytes")
+                    elif upload is not None:
+                        await upload._end()
+                        upload = None
+                    else:
+                        self.fields[field_name] = field_value.decode("utf-8", errors="replace")
+                        field_value.clear()
+                events.clear()
+            parser.finalize()
+        except FormParserError as e:
+            raise ValueError(f"Invalid multipart body: {e}") from e
+        if upload is not None:
+            raise ValueError("Multipart body ended inside a file")
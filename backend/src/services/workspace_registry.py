@@ -0,0 +1,247 @@
+import os
+import stat
+import time
+import uuid
+import sqlite3
+import logging
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from collections.abc import MutableMapping
+from typing import Any, Callable, Iterator, List, Optional, Tuple, TypeVar
+
+from ..models import WorkspaceInfo
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workspaces (
+    workspace_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    file_count INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    total_bytes INTEGER NOT NULL DEFAULT 0,
+    reconciled_at REAL NOT NULL DEFAULT 0
+)
+"""
+
+# Added after the first release; applied to older databases on open
+_MIGRATIONS = {
+    "total_bytes": "ALTER TABLE workspaces ADD COLUMN total_bytes INTEGER NOT NULL DEFAULT 0",
+    "reconciled_at": "ALTER TABLE workspaces ADD COLUMN reconciled_at REAL NOT NULL DEFAULT 0",
+}
+
+_COLUMNS = "workspace_id, name, path, file_count, created_at, total_bytes"
+
+
+class WorkspaceRegistry(MutableMapping):
+    """
+    Durable workspace registry backed by SQLite in WAL mode
+
+    Behaves like the Dict[str, WorkspaceInfo] it replaces. Nothing is loaded
+    at startup: every lookup is a primary-key query, so all uvicorn workers
+    see the same workspaces and restarts lose nothing. Workspace directories
+    that predate the registry are adopted the first time they are looked up.
+    """
+
+    def __init__(self, db_path: Path, workspaces_dir: Path):
+        self.db_path = Path(db_path)
+        self.workspaces_dir = Path(workspaces_dir)
+        self._local = threading.local()
+        # Writes made from the event loop run here, one at a time, so the
+        # loop never blocks on the write lock or its busy timeout
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="registry-writer")
+        with self._connection() as conn:
+            # Workers open the registry together; taking the write lock before
+            # reading the columns stops two of them adding the same one
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(_SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(workspaces)")}
+            for column, statement in _MIGRATIONS.items():
+                if column not in existing:
+                    conn.execute(statement)
+        logger.info(f"Workspace registry opened at: {self.db_path.absolute()}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections can't be shared"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    async def write(self, method: Callable[..., T], *args: Any) -> T:
+        """Run a registry method, e.g. reserve_usage, on the writer thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, functools.partial(method, *args))
+
+    @staticmethod
+    def _to_info(row) -> WorkspaceInfo:
+        workspace_id, name, path, file_count, created_at, total_bytes = row
+        return WorkspaceInfo(
+            workspace_id=workspace_id,
+            name=name,
+            path=path,
+            file_count=file_count,
+            created_at=created_at,
+            total_bytes=total_bytes
+        )
+
+    def _rehydrate(self, workspace_id: str) -> Optional[WorkspaceInfo]:
+        """Register a workspace directory that exists on disk but not in the registry"""
+        try:
+            uuid.UUID(workspace_id)
+        except ValueError:
+            return None
+
+        workspace_path = self.workspaces_dir / workspace_id
+        if not workspace_path.is_dir():
+            return None
+
+        file_count, total_bytes = measure_tree(workspace_path)
+        workspace_info = WorkspaceInfo(
+            workspace_id=workspace_id,
+            name=workspace_id,
+            path=str(workspace_path),
+            file_count=file_count,
+            created_at=datetime.fromtimestamp(workspace_path.stat().st_ctime).isoformat(),
+            total_bytes=total_bytes
+        )
+        with self._connection() as conn:
+            conn.execute(
+                f"INSERT OR IGNORE INTO workspaces ({_COLUMNS}, reconciled_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (workspace_info.workspace_id, workspace_info.name, workspace_info.path,
+                 workspace_info.file_count, workspace_info.created_at, workspace_info.total_bytes,
+                 time.time())
+            )
+        logger.info(f"Rehydrated workspace from disk: {workspace_id}")
+        return workspace_info
+
+    def __getitem__(self, workspace_id: str) -> WorkspaceInfo:
+        row = self._connection().execute(
+            f"SELECT {_COLUMNS} FROM workspaces WHERE workspace_id = ?", (workspace_id,)
+        ).fetchone()
+        if row is not None:
+            return self._to_info(row)
+
+        workspace_info = self._rehydrate(workspace_id)
+        if workspace_info is None:
+            raise KeyError(workspace_id)
+        return workspace_info
+
+    def __setitem__(self, workspace_id: str, workspace_info: WorkspaceInfo):
+        with self._connection() as conn:
+            conn.execute(
+                f"""
+                INSERT INTO workspaces ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(workspace_id) DO UPDATE SET
+                    name = excluded.name,
+                    path = excluded.path,
+                    file_count = excluded.file_count,
+                    created_at = excluded.created_at,
+                    total_bytes = excluded.total_bytes
+                """,
+                (workspace_id, workspace_info.name, workspace_info.path,
+                 workspace_info.file_count, workspace_info.created_at, workspace_info.total_bytes)
+            )
+
+    def __delitem__(self, workspace_id: str):
+        with self._connection() as conn:
+            cursor = conn.execute("DELETE FROM workspaces WHERE workspace_id = ?", (workspace_id,))
+        if cursor.rowcount == 0:
+            raise KeyError(workspace_id)
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self._connection().execute("SELECT workspace_id FROM workspaces ORDER BY created_at").fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM workspaces").fetchone()[0]
+
+    def values(self) -> List[WorkspaceInfo]:
+        """All workspaces in one query"""
+        rows = self._connection().execute(f"SELECT {_COLUMNS} FROM workspaces ORDER BY created_at").fetchall()
+        return [self._to_info(row) for row in rows]
+
+    def reserve_usage(
+        self,
+        workspace_id: str,
+        bytes_delta: int,
+        files_delta: int,
+        max_bytes: int,
+        max_files: int
+    ) -> bool:
+        """
+        Atomically apply a usage change if it keeps the workspace within limits
+
+        Decreases always succeed. The check and the update are one UPDATE
+        statement, so concurrent writers in any worker process can't both
+        squeeze past the limit.
+        """
+        with self._connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE workspaces SET
+                    total_bytes = MAX(0, total_bytes + ?),
+                    file_count = MAX(0, file_count + ?)
+                WHERE workspace_id = ?
+                    AND (? <= 0 OR total_bytes + ? <= ?)
+                    AND (? <= 0 OR file_count + ? <= ?)
+                """,
+                (bytes_delta, files_delta, workspace_id,
+                 bytes_delta, bytes_delta, max_bytes,
+                 files_delta, files_delta, max_files)
+            )
+        return cursor.rowcount > 0
+
+    def adjust_usage(self, workspace_id: str, bytes_delta: int, files_delta: int):
+        """Apply a usage change unconditionally (deletes, refunds)"""
+        with self._connection() as conn:
+            conn.execute(
+                """
+                UPDATE workspaces SET
+                    total_bytes = MAX(0, total_bytes + ?),
+                    file_count = MAX(0, file_count + ?)
+                WHERE workspace_id = ?
+                """,
+                (bytes_delta, files_delta, workspace_id)
+            )
+
+    def set_usage(self, workspace_id: str, total_bytes: int, file_count: int):
+        """Overwrite usage with measured values and mark it reconciled"""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE workspaces SET total_bytes = ?, file_count = ?, reconciled_at = ? WHERE workspace_id = ?",
+                (total_bytes, file_count, time.time(), workspace_id)
+            )
+
+    def reconciled_at(self, workspace_id: str) -> float:
+        """When usage was last measured from disk (epoch seconds, 0 if never)"""
+        row = self._connection().execute(
+            "SELECT reconciled_at FROM workspaces WHERE workspace_id = ?", (workspace_id,)
+        ).fetchone()
+        return row[0] if row else 0.0
+
+
+def measure_tree(root: Path) -> Tuple[int, int]:
+    """Count regular files and their total size under root"""
+    file_count = 0
+    total_bytes = 0
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            try:
+                entry_stat = os.lstat(os.path.join(directory, filename))
+            except OSError:
+                continue
+            if stat.S_ISREG(entry_stat.st_mode):
+                file_count += 1
+                total_bytes += entry_stat.st_size
+    return file_count, total_bytes
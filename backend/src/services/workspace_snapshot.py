@@ -0,0 +1,154 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .directory_listing import ListingEntry
+
+logger = logging.getLogger(__name__)
+
+SNIPPET_WIDTH = 120
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count; about four characters per token for English and code"""
+    return (len(text) + 3) // 4
+
+
+def _format_size(size: Optional[int]) -> str:
+    size = size or 0
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _read_head(path: Path, max_lines: int) -> List[str]:
+    """First non-blank lines of a text file, trimmed; empty for binary files"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read(4096)
+    except OSError:
+        return []
+    if b"\0" in data:
+        return []
+    lines = [line.strip() for line in data.decode("utf-8", errors="replace").splitlines()]
+    return [line[:SNIPPET_WIDTH] for line in lines if line][:max_lines]
+
+
+def _add_snippets(files: List[Tuple[int, Path]], snippet_lines: int, budget: int) -> Dict[int, List[str]]:
+    """Read file heads in listing order until the remaining budget is spent"""
+    snippets = {}
+    for index, path in files:
+        rendered = [f"    | {line}" for line in _read_head(path, snippet_lines)]
+        cost = sum(estimate_tokens(line) + 1 for line in rendered)
+        if cost > budget:
+            break
+        if rendered:
+            snippets[index] = rendered
+            budget -= cost
+    return snippets
+
+
+async def build_snapshot(
+    root: Path,
+    list_directory: Callable[[Path], Awaitable[List[ListingEntry]]],
+    token_budget: int,
+    snippet_lines: int = 2
+) -> str:
+    """
+    Summarise a workspace as a file list with sizes and head snippets
+
+    Directories are walked breadth-first, so when the budget runs out the
+    summary still shows the top of the tree rather than one deep branch.
+    Whatever budget the list leaves is spent on the first lines of files.
+    list_directory is expected to be cached, so unchanged directories cost
+    nothing to revisit.
+    """
+    lines: List[str] = []
+    files: List[Tuple[int, Path]] = []
+    used = 0
+    truncated = False
+    directories = deque([(root, "")])
+
+    while directories and not truncated:
+        directory, prefix = directories.popleft()
+        try:
+            entries = await list_directory(directory)
+        except OSError:
+            continue
+        for entry in sorted(entries, key=lambda e: (not e.is_directory, e.name)):
+            relative_path = prefix + entry.name
+            line = f"{relative_path}/" if entry.is_directory else f"{relative_path} ({_format_size(entry.size)})"
+            cost = estimate_tokens(line) + 1
+            if used + cost > token_budget:
+                truncated = True
+                break
+            used += cost
+            lines.append(line)
+            if not entry.is_directory:
+                files.append((len(lines) - 1, directory / entry.name))
+            elif not entry.is_symlink:
+                directories.append((directory / entry.name, relative_path + "/"))
+
+    if not lines:
+        return "(empty workspace)"
+
+    snippets = {}
+    if snippet_lines > 0 and not truncated:
+        snippets = await asyncio.to_thread(_add_snippets, files, snippet_lines, token_budget - used)
+
+    rendered = []
+    for index, line in enumerate(lines):
+        rendered.append(line)
+        rendered.extend(snippets.get(index, ()))
+    if truncated:
+        rendered.append("... (more files not shown)")
+    return "\n".join(rendered)
+
+
+class SnapshotCache:
+    """
+    Rendered workspace summaries, reused until the workspace changes
+
+    Writes through FileSystemService drop a workspace's entry; the TTL
+    catches changes made behind the service's back.
+    """
+
+    def __init__(self, max_workspaces: int = 256, ttl_seconds: float = 60):
+        self.max_workspaces = max_workspaces
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Changes whenever anything is invalidated; see set()"""
+        return self._generation
+
+    def get(self, workspace_id: str) -> Optional[str]:
+        entry = self._entries.get(workspace_id)
+        if entry is None:
+            return None
+        stored_at, snapshot = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[workspace_id]
+            return None
+        self._entries.move_to_end(workspace_id)
+        return snapshot
+
+    def set(self, workspace_id: str, snapshot: str, generation: int):
+        """Store a snapshot unless a write invalidated anything while it was being built"""
+        if generation != self._generation or self.max_workspaces <= 0:
+            return
+        self._entries[workspace_id] = (time.monotonic(), snapshot)
+        self._entries.move_to_end(workspace_id)
+        while len(self._entries) > self.max_workspaces:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, workspace_id: str):
+        self._generation += 1
+        self._entries.pop(workspace_id, None)
@@ -13,10 +13,9 @@ def validate_file_extension(filename: str) -> bool:
     file_path = Path(filename)
     extension = file_path.suffix.lower()
     
-    return extension in settings.allowed_file_extensions
+    return extension in settings.allowed_extensions
 
 
 def validate_file_size(file_size_bytes: int) -> bool:
     """Validate if file size is within limits"""
-    max_size_bytes = settings.max_file_size_mb * 1024 * 1024
-    return file_size_bytes <= max_size_bytes 
\ No newline at end of file
+    return file_size_bytes <= settings.max_file_size 
\ No newline at end of file
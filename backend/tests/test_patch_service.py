@@ -0,0 +1,97 @@
+import io
+
+import pytest
+
+from src.services.patch_service import PatchError, apply_edits, line_range_edit, parse_unified_diff
+
+
+def apply(original: bytes, edits) -> bytes:
+    destination = io.BytesIO()
+    apply_edits(io.BytesIO(original), destination, edits)
+    return destination.getvalue()
+
+
+def test_diff_replaces_lines_and_keeps_the_rest():
+    diff = "--- a/f\n+++ b/f\n@@ -2,2 +2,2 @@\n b\n-c\n+C\n"
+    assert apply(b"a\nb\nc\nd\n", parse_unified_diff(diff)) == b"a\nb\nC\nd\n"
+
+
+def test_diff_can_drop_the_final_newline():
+    diff = "@@ -2 +2 @@\n-b\n+c\n\\ No newline at end of file\n"
+    assert apply(b"a\nb\n", parse_unified_diff(diff)) == b"a\nc"
+
+
+def test_diff_can_add_the_final_newline():
+    diff = "@@ -2 +2 @@\n-b\n\\ No newline at end of file\n+c\n"
+    assert apply(b"a\nb", parse_unified_diff(diff)) == b"a\nc\n"
+
+
+def test_diff_context_mismatch_is_rejected():
+    diff = "@@ -1,2 +1,2 @@\n a\n-b\n+c\n"
+    with pytest.raises(PatchError, match="does not match"):
+        apply(b"a\nx\n", parse_unified_diff(diff))
+
+
+def test_diff_inserts_at_end_of_file():
+    diff = "@@ -2,0 +3 @@\n+c\n"
+    assert apply(b"a\nb\n", parse_unified_diff(diff)) == b"a\nb\nc\n"
+
+
+def test_diff_deletes_at_end_of_file():
+    diff = "@@ -2,2 +2,0 @@\n-b\n-c\n"
+    assert apply(b"a\nb\nc\n", parse_unified_diff(diff)) == b"a\n"
+
+
+def test_diff_without_hunks_is_rejected():
+    with pytest.raises(PatchError, match="No hunks"):
+        parse_unified_diff("--- a/f\n+++ b/f\n")
+
+
+def test_truncated_hunk_is_rejected():
+    with pytest.raises(PatchError, match="truncated"):
+        parse_unified_diff("@@ -1,3 +1,3 @@\n a\n")
+
+
+def test_line_range_replaces_inclusive_range():
+    assert apply(b"1\n2\n3\n4\n", [line_range_edit(2, 3, "x\ny\nz")]) == b"1\nx\ny\nz\n4\n"
+
+
+def test_line_range_inserts_after_last_line():
+    assert apply(b"a\nb\n", [line_range_edit(3, 2, "c")]) == b"a\nb\nc\n"
+
+
+def test_line_range_inserts_after_unterminated_last_line():
+    assert apply(b"a\nb", [line_range_edit(3, 2, "c")]) == b"a\nb\nc\n"
+
+
+def test_line_range_deletes_last_line():
+    assert apply(b"a\nb\nc\n", [line_range_edit(3, 3, "")]) == b"a\nb\n"
+
+
+def test_line_range_keeps_missing_final_newline():
+    assert apply(b"a\nb", [line_range_edit(2, 2, "c")]) == b"a\nc"
+
+
+def test_crlf_line_endings_are_preserved():
+    assert apply(b"a\r\nb\r\nc\r\n", [line_range_edit(2, 2, "x")]) == b"a\r\nx\r\nc\r\n"
+
+
+def test_out_of_range_reports_one_based_line():
+    with pytest.raises(PatchError, match="^Line 10 is past the end of the file$"):
+        apply(b"a\nb\nc\n", [line_range_edit(10, 10, "x")])
+
+
+def test_invalid_range_is_rejected():
+    with pytest.raises(PatchError, match="Invalid line range"):
+        line_range_edit(3, 1, "x")
+
+
+def test_overlapping_edits_are_rejected():
+    with pytest.raises(PatchError, match="overlap"):
+        apply(b"a\nb\nc\n", [line_range_edit(1, 2, "x"), line_range_edit(2, 3, "y")])
+
+
+def test_line_range_checks_expected_text():
+    assert apply(b"a\nb\nc\n", [line_range_edit(2, 2, "B", expected="b")]) == b"a\nB\nc\n"
+    with pytest.raises(PatchError, match="does not match"):
+        apply(b"a\nb\nc\n", [line_range_edit(2, 2, "B", expected="c")])
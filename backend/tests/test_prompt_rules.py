@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from src.config import Settings
+from src.models.prompt import PromptRequest
+from src.routes.prompt import _run_prompt
+from src.services.file_system_service import FileSystemService
+from src.services.prompt_processor import PromptProcessor
+from src.services.prompt_rules import match_rules
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return Settings(workspaces_dir=str(tmp_path / "workspaces"), llm_provider="stub")
+
+
+@pytest.fixture
+def service(settings):
+    return FileSystemService(settings.workspaces_dir, settings=settings)
+
+
+def run(prompt: str, workspace_id: str, service: FileSystemService, settings: Settings):
+    request = PromptRequest(prompt=prompt, workspace_id=workspace_id)
+    return asyncio.run(_run_prompt(request, PromptProcessor(settings), service))
+
+
+@pytest.mark.parametrize("prompt", ["touch notes.txt", "create notes.txt", "make a new file called notes.txt"])
+def test_create_rule_leaves_existing_file_unchanged(prompt, service, settings):
+    workspace_id = asyncio.run(service.create_workspace("test")).workspace_id
+    content = "important notes\n" * 100
+    asyncio.run(service.create_file(workspace_id, "notes.txt", content))
+
+    response = run(prompt, workspace_id, service, settings)
+
+    assert response.method == "rules"
+    assert response.success
+    assert response.operations == ["File already exists, left unchanged: notes.txt"]
+    assert (service.get_workspace_path(workspace_id) / "notes.txt").read_text() == content
+
+
+def test_create_rule_creates_missing_file(service, settings):
+    workspace_id = asyncio.run(service.create_workspace("test")).workspace_id
+
+    response = run("touch notes.txt", workspace_id, service, settings)
+
+    assert response.operations == ["Created file: notes.txt"]
+    assert (service.get_workspace_path(workspace_id) / "notes.txt").read_text() == ""
+
+
+def test_rules_leave_prompts_with_detail_to_the_llm():
+    assert match_rules("delete notes.txt")["operations"][0]["type"] == "delete"
+    assert match_rules("create notes.txt containing a shopping list") is None
+    assert match_rules("delete everything") is None
+
+
+def test_rule_prompts_skip_the_workspace_snapshot(service, settings, monkeypatch):
+    workspace_id = asyncio.run(service.create_workspace("test")).workspace_id
+
+    async def fail(workspace_id):
+        raise AssertionError("workspace_snapshot called for a rule prompt")
+
+    monkeypatch.setattr(service, "workspace_snapshot", fail)
+    response = run("list files", workspace_id, service, settings)
+
+    assert response.method == "rules"
+    assert response.success
@@ -0,0 +1,21 @@
+from src.services.response_parser import validate_operations
+
+
+def patch(**fields):
+    return {"type": "patch", "target": "f.txt", **fields}
+
+
+def test_diff_patch_is_valid():
+    assert validate_operations([patch(content="@@ -1,2 +1,2 @@\n a\n-b\n+c\n")]) == []
+
+
+def test_line_range_patch_needs_expected_text():
+    assert validate_operations([patch(start_line=2, content="c", expected="b")]) == []
+    assert validate_operations([patch(start_line=2, content="c")]) == [
+        "operation 0: line-range patch without expected"
+    ]
+
+
+def test_patch_without_diff_or_range_is_invalid():
+    problems = validate_operations([patch(content="replace b with c")])
+    assert problems == ["operation 0: patch without a usable unified diff (No hunks found in diff)"]
@@ -0,0 +1,83 @@
+import asyncio
+from pathlib import Path
+
+from src.services.search_index import SearchIndex, SearchIndexCache
+
+
+def search(index: SearchIndex, query: str, scope: str = ""):
+    return asyncio.run(index.search(query, scope))
+
+
+def paths(result):
+    return sorted({match["path"] for match in result["matches"]})
+
+
+def test_finds_matches_case_insensitively(tmp_path):
+    (tmp_path / "a.py").write_text("def Hello():\n    pass\n")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.py").write_text("x = 1\nhello()\n")
+    (tmp_path / "c.txt").write_text("nothing here")
+    index = SearchIndex(tmp_path)
+
+    result = search(index, "HELLO")
+    assert paths(result) == ["a.py", "sub/b.py"]
+    assert result["candidates"] == 2
+    assert result["matches"][0] == {"path": "a.py", "line": 1, "column": 5, "snippet": "def Hello():"}
+    assert paths(search(index, "hello", "sub")) == ["sub/b.py"]
+
+
+def test_rewritten_and_deleted_files_are_reindexed(tmp_path):
+    (tmp_path / "a.txt").write_text("alpha")
+    (tmp_path / "b.txt").write_text("beta")
+    index = SearchIndex(tmp_path)
+    assert paths(search(index, "alpha")) == ["a.txt"]
+
+    for round_number in range(50):
+        (tmp_path / "a.txt").write_text(f"gamma {round_number}")
+        index.mark_dirty("a.txt")
+        assert paths(search(index, "gamma")) == ["a.txt"]
+    (tmp_path / "b.txt").unlink()
+    index.mark_dirty("b.txt")
+
+    assert paths(search(index, "alpha")) == []
+    assert paths(search(index, "beta")) == []
+    assert search(index, "gamma")["files_indexed"] == 1
+    # Compaction has dropped the ids of the old versions
+    assert len(index._paths) < 10
+
+
+def test_large_files_are_scanned_without_being_indexed(tmp_path):
+    (tmp_path / "big.txt").write_text("x" * 5000 + "\nneedle\n")
+    (tmp_path / "small.txt").write_text("needle")
+    index = SearchIndex(tmp_path, max_index_file_size=1000)
+
+    assert paths(search(index, "needle")) == ["big.txt", "small.txt"]
+    assert index.nbytes < 5000 * 4
+
+
+def test_index_over_budget_falls_back_to_scanning(tmp_path):
+    for number in range(20):
+        (tmp_path / f"{number}.txt").write_text(f"file {number} " + "abcdefghij" * number)
+    index = SearchIndex(tmp_path, max_bytes=2000)
+
+    assert paths(search(index, "file 7 ")) == ["7.txt"]
+    assert search(index, "file 7 ")["candidates"] == 20
+    assert index.nbytes <= 20 * 300
+
+
+def test_cache_evicts_least_recently_searched_over_budget(tmp_path):
+    roots = []
+    for name in ("one", "two", "three"):
+        root = tmp_path / name
+        root.mkdir()
+        (root / "file.txt").write_text(name * 100)
+        roots.append(root)
+    cache = SearchIndexCache(max_bytes=2500)
+
+    for name, root in zip(("one", "two", "three"), roots):
+        asyncio.run(cache.get(name, root).search(name))
+        cache.trim()
+
+    assert sum(index.nbytes for index in cache._indexes.values()) <= 2500
+    assert list(cache._indexes)[-1] == "three"
+    assert "one" not in cache._indexes
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from src.config import Settings
+from src.models import FileOperation, FileOperationType
+from src.models.prompt import PromptRequest
+from src.routes.prompt import _run_prompt
+from src.services import file_system_service
+from src.services.file_system_service import FileSystemService
+from src.services.prompt_processor import PromptProcessor
+from src.services.transaction import Transaction
+
+
+def snapshot_tree(root: Path):
+    """Every file and directory under root, with file contents and inode numbers"""
+    tree = {}
+    for directory, dirnames, filenames in os.walk(root):
+        for name in dirnames:
+            tree[os.path.relpath(os.path.join(directory, name), root) + "/"] = None
+        for name in filenames:
+            path = Path(directory, name)
+            tree[os.path.relpath(path, root)] = (path.read_bytes(), path.stat().st_ino)
+    return tree
+
+
+@pytest.fixture
+def service(tmp_path):
+    workspaces_dir = tmp_path / "workspaces"
+    return FileSystemService(str(workspaces_dir), settings=Settings(workspaces_dir=str(workspaces_dir)))
+
+
+@pytest.fixture
+def workspace(service):
+    workspace_id = asyncio.run(service.create_workspace("test")).workspace_id
+
+    async def populate():
+        await service.create_file(workspace_id, "keep.txt", "keep")
+        await service.create_file(workspace_id, "log.txt", "line 1\n")
+        await service.create_file(workspace_id, "old.txt", "old name")
+        await service.create_file(workspace_id, "overwrite.txt", "original")
+        await service.create_file(workspace_id, "gone.txt", "to be deleted")
+        await service.create_file(workspace_id, "dir/nested.txt", "nested")
+
+    asyncio.run(populate())
+    return workspace_id
+
+
+def op(operation: FileOperationType, path: str, **fields) -> FileOperation:
+    return FileOperation(operation=operation, path=path, **fields)
+
+
+def test_failed_atomic_batch_restores_tree_ledger_and_trash(service, workspace):
+    root = service.get_workspace_path(workspace)
+    tree_before = snapshot_tree(root)
+    usage_before = service.get_workspace_info(workspace)
+
+    operations = [
+        op(FileOperationType.CREATE, "new/deep/file.txt", content="new"),
+        op(FileOperationType.APPEND, "log.txt", content="line 2\n"),
+        op(FileOperationType.EDIT, "overwrite.txt", content="replaced with something longer"),
+        op(FileOperationType.DELETE, "gone.txt"),
+        op(FileOperationType.DELETE, "dir"),
+        op(FileOperationType.RENAME, "old.txt", new_path="renamed/new.txt"),
+        op(FileOperationType.EDIT, "does-not-exist.txt", content="fails"),
+    ]
+    results = asyncio.run(service.execute_operations(workspace, operations, atomic=True))
+
+    assert not any(result["success"] for result in results)
+    assert sum(1 for result in results if result.get("rolled_back")) == len(operations) - 1
+    assert snapshot_tree(root) == tree_before
+
+    usage_after = service.get_workspace_info(workspace)
+    assert (usage_after.total_bytes, usage_after.file_count) == (usage_before.total_bytes, usage_before.file_count)
+
+    trash = service.base_workspace_dir / ".trash"
+    assert not trash.exists() or not any(trash.iterdir())
+
+
+def test_failure_later_in_a_dependent_chain_is_rolled_back(service, workspace):
+    root = service.get_workspace_path(workspace)
+    tree_before = snapshot_tree(root)
+
+    # Same path, so these run in order; the last one fails after the others applied
+    operations = [
+        op(FileOperationType.APPEND, "log.txt", content="line 2\n"),
+        op(FileOperationType.RENAME, "log.txt", new_path="moved.txt"),
+        op(FileOperationType.DELETE, "moved.txt"),
+        op(FileOperationType.DELETE, "moved.txt"),
+    ]
+    results = asyncio.run(service.execute_operations(workspace, operations, atomic=True))
+
+    assert [result["success"] for result in results] == [False] * 4
+    assert snapshot_tree(root) == tree_before
+
+
+def test_non_atomic_batch_keeps_successful_operations(service, workspace):
+    root = service.get_workspace_path(workspace)
+    operations = [
+        op(FileOperationType.DELETE, "gone.txt"),
+        op(FileOperationType.EDIT, "does-not-exist.txt", content="fails"),
+    ]
+    results = asyncio.run(service.execute_operations(workspace, operations))
+
+    assert [result["success"] for result in results] == [True, False]
+    assert not (root / "gone.txt").exists()
+    trash = service.base_workspace_dir / ".trash"
+    assert not trash.exists() or not any(trash.iterdir())
+
+
+def test_transaction_rollback_restores_overwritten_inode(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("before")
+    inode = path.stat().st_ino
+
+    transaction = Transaction(tmp_path / ".trash")
+    transaction.record_overwrite(path)
+    path.unlink()
+    path.write_text("after")
+
+    assert transaction.rollback() == 0
+    assert path.read_text() == "before"
+    assert path.stat().st_ino == inode
+    assert not transaction.trash_dir.exists()
+
+
+def test_transaction_rollback_removes_created_parent_directories(tmp_path):
+    path = tmp_path / "a" / "b" / "file.txt"
+    transaction = Transaction(tmp_path / ".trash")
+    transaction.record_create(path)
+    path.parent.mkdir(parents=True)
+    path.write_text("new")
+
+    transaction.rollback()
+    assert not (tmp_path / "a").exists()
+
+
+def test_prompt_operations_share_one_group_commit(tmp_path, monkeypatch):
+    workspaces_dir = tmp_path / "workspaces"
+    operations = [
+        {"type": "create", "target": f"{name}.txt", "content": name}
+        for name in ("a", "b", "c")
+    ]
+    settings = Settings(
+        workspaces_dir=str(workspaces_dir),
+        llm_provider="stub",
+        llm_stub_response=json.dumps({"operations": operations, "confidence": 1.0, "reasoning": ""})
+    )
+    service = FileSystemService(str(workspaces_dir), settings=settings)
+    workspace_id = asyncio.run(service.create_workspace("test")).workspace_id
+
+    durable_writes = []
+    commits = []
+    write_atomic = file_system_service.write_atomic
+    commit = Transaction.commit
+    monkeypatch.setattr(
+        file_system_service, "write_atomic",
+        lambda path, data, durable: durable_writes.append(durable) or write_atomic(path, data, durable)
+    )
+    monkeypatch.setattr(Transaction, "commit", lambda self: commits.append(self) or commit(self))
+
+    request = PromptRequest(prompt="create three files named a, b and c", workspace_id=workspace_id)
+    response = asyncio.run(_run_prompt(request, PromptProcessor(settings), service))
+
+    assert response.success
+    assert sorted(path.name for path in service.get_workspace_path(workspace_id).iterdir()) == ["a.txt", "b.txt", "c.txt"]
+    assert durable_writes == [False, False, False]
+    assert len(commits) == 1
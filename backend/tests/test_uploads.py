@@ -0,0 +1,128 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.config import Settings
+from src.routes import workspace
+from src.services.file_system_service import FileSystemService
+from src.services.quota import QuotaExceededError
+from src.services.singleton import get_file_system_service
+from src.services.upload_stream import MultipartUploadStream
+
+
+class Upload:
+    """The part of UploadFile that save_uploads uses"""
+
+    def __init__(self, filename: str, data: bytes):
+        self.filename = filename
+        self._data = io.BytesIO(data)
+
+    async def read(self, size: int) -> bytes:
+        return self._data.read(size)
+
+    async def close(self):
+        self._data.close()
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return Settings(workspaces_dir=str(tmp_path / "workspaces"), max_file_size=10, upload_chunk_size=4)
+
+
+@pytest.fixture
+def service(settings):
+    return FileSystemService(settings.workspaces_dir, settings=settings)
+
+
+def test_upload_size_limit_comes_from_the_service_settings(service):
+    workspace_id = asyncio.run(service.create_workspace("test")).workspace_id
+
+    results = asyncio.run(service.save_uploads(workspace_id, [Upload("big.txt", b"x" * 11), Upload("ok.txt", b"x" * 10)]))
+
+    assert [(r["path"], r["success"]) for r in results] == [("big.txt", False), ("ok.txt", True)]
+    assert results[0]["message"] == "File exceeds the 10 byte limit"
+    assert not (service.get_workspace_path(workspace_id) / "big.txt").exists()
+
+
+def multipart_body(boundary: str, parts) -> bytes:
+    """Encode (name, filename or None, data) parts as multipart/form-data"""
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+
+@pytest.fixture
+def client(service):
+    app = FastAPI()
+    app.include_router(workspace.router)
+    app.dependency_overrides[get_file_system_service] = lambda: service
+    return TestClient(app)
+
+
+def test_upload_reads_workspace_name_after_the_files(client, service):
+    body = multipart_body("b0undary", [
+        ("files", "a.txt", b"hello"),
+        ("files", "dir/b.txt", b"world"),
+        ("workspace_name", None, b"uploaded")
+    ])
+    response = client.post(
+        "/workspace/upload",
+        content=body,
+        headers={"Content-Type": "multipart/form-data; boundary=b0undary"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["file_count"] == 2
+    workspace_id = response.json()["workspace_id"]
+    assert service.get_workspace_info(workspace_id).name == "uploaded"
+    assert (service.get_workspace_path(workspace_id) / "dir" / "b.txt").read_bytes() == b"world"
+
+
+def test_upload_over_the_workspace_limit_is_refused_by_content_length(client, service, settings):
+    settings.max_workspace_size = 100
+    settings.max_files_per_workspace = 1
+    body = multipart_body("b0undary", [("files", "a.txt", b"x" * 2000), ("workspace_name", None, b"big")])
+
+    response = client.post(
+        "/workspace/upload",
+        content=body,
+        headers={"Content-Type": "multipart/form-data; boundary=b0undary"}
+    )
+
+    assert response.status_code == 413
+    assert len(service.workspaces) == 0
+
+
+def test_streamed_upload_stops_reading_once_over_quota(service, settings):
+    settings.max_workspace_size = 10
+    workspace_id = asyncio.run(service.create_workspace("test")).workspace_id
+    body = multipart_body("b0undary", [("files", f"{n}.txt", b"x" * 8) for n in range(100)])
+    chunks_read = 0
+
+    async def stream():
+        nonlocal chunks_read
+        for start in range(0, len(body), 64):
+            chunks_read += 1
+            yield body[start:start + 64]
+
+    form = MultipartUploadStream({"content-type": "multipart/form-data; boundary=b0undary"}, stream())
+    with pytest.raises(QuotaExceededError):
+        asyncio.run(service.save_uploads(workspace_id, form.uploads()))
+
+    assert chunks_read < len(body) // 64 // 4
+
+
+def test_invalid_multipart_body_is_rejected(service):
+    workspace_id = asyncio.run(service.create_workspace("test")).workspace_id
+
+    async def stream():
+        yield b"not multipart at all"
+
+    form = MultipartUploadStream({"content-type": "text/plain"}, stream())
+    with pytest.raises(ValueError, match="multipart"):
+        asyncio.run(service.save_uploads(workspace_id, form.uploads()))